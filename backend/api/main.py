@@ -1,10 +1,54 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from community.router import router as community_router
 from auth.router import router as auth_router
 from marketplace.router import router as marketplace_router
 from marketplace.admin.router import router as marketplace_admin_router
+from auth.deps import get_admin_user
+from auth.password_pool import password_pool
+from storage.minio_service import get_minio_service
+from storage.derivatives import image_pipeline
+from storage.gc import run_periodically as run_storage_gc
+from storage.purge import purge_queue
+from marketplace.stats import run_periodically as run_sales_stats_refresh
+from marketplace.inventory import run_periodically as run_inventory_sweep
+from marketplace.webhooks import run_worker as run_payment_events
+from marketplace.payments import payment_client
+from marketplace.cart import cart_service
 from .config import settings
+from .metrics import metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create storage buckets and policies once, so upload paths never have to
+    try:
+        await run_in_threadpool(get_minio_service().ensure_ready)
+    except Exception as e:
+        # Storage may come up after the API; ensure_ready retries lazily on first upload
+        print(f"Warning: storage bootstrap failed, will retry on demand: {e}")
+    # A misconfigured cart store (e.g. a bad CART_REDIS_URL) fails the boot, not the first cart request
+    cart_service.store
+    gc_interval = int(os.getenv("STORAGE_GC_INTERVAL_SECONDS", str(6 * 3600)))
+    gc_task = asyncio.create_task(run_storage_gc(gc_interval)) if gc_interval > 0 else None
+    stats_interval = int(os.getenv("SALES_STATS_REFRESH_SECONDS", "3600"))
+    stats_task = asyncio.create_task(run_sales_stats_refresh(stats_interval)) if stats_interval > 0 else None
+    sweep_interval = int(os.getenv("INVENTORY_SWEEP_INTERVAL_SECONDS", "60"))
+    sweep_task = asyncio.create_task(run_inventory_sweep(sweep_interval)) if sweep_interval > 0 else None
+    payments_task = asyncio.create_task(run_payment_events(int(os.getenv("PAYMENT_EVENTS_POLL_SECONDS", "5"))))
+    yield
+    for task in (gc_task, stats_task, sweep_task, payments_task):
+        if task is not None:
+            task.cancel()
+    password_pool.shutdown()
+    image_pipeline.shutdown()
+    purge_queue.shutdown()
+    payment_client.shutdown()
 
 
 app = FastAPI(
@@ -15,7 +59,8 @@ app = FastAPI(
         "name": "OneTee",
         "url": "https://onetee.in",
         "email": "info@onetee.in"
-    }
+    },
+    lifespan=lifespan,
 )
 
 
@@ -25,6 +70,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(community_router, prefix="/community")
@@ -34,4 +80,9 @@ app.include_router(marketplace_admin_router, prefix="/marketplace/admin")
 
 @app.get("/")
 async def welcome():
-    return {"message": "Welcome to OneTee API"}
\ No newline at end of file
+    return {"message": "Welcome to OneTee API"}
+
+
+@app.get("/metrics")
+def read_metrics(admin=Depends(get_admin_user)):
+    return metrics.snapshot()
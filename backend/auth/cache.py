@@ -0,0 +1,73 @@
+"""
+In-process cache of authenticated principals.
+
+Every authenticated request used to load the full ``User`` row just to
+read a handful of flags. The cache keeps a compact ``Principal`` per user
+id with a TTL and an LRU bound, so the common case is a dictionary lookup.
+Admin endpoints that change a user call ``invalidate`` so the next request
+sees the new state; the TTL bounds staleness across worker processes.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from uuid import UUID
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Lightweight identity of the caller, used instead of an ORM ``User``."""
+
+    id: UUID
+    is_verified: bool
+    is_active: bool
+    is_admin: bool
+
+
+class PrincipalCache:
+    """Thread-safe TTL + LRU map of user id -> Principal."""
+
+    def __init__(self, *, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[UUID, tuple[float, Principal]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: UUID) -> Principal | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= now:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def put(self, principal: Principal) -> None:
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[principal.id] = (expires_at, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: UUID) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL_SECONDS", "60")),
+    max_entries=int(os.getenv("AUTH_PRINCIPAL_CACHE_MAX_ENTRIES", "10000")),
+)
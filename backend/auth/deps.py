@@ -1,9 +1,13 @@
 from fastapi import Depends, HTTPException, Request, status
 import os
+from uuid import UUID
+
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from database import get_db
 from .security import decode_token
+from .cache import Principal, principal_cache
 from community.models import User
 
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -16,31 +20,46 @@ load_dotenv()
 COOKIE_NAME = "access_token"
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+def load_principal(db: Session, user_id: UUID) -> Principal | None:
+    """Return the cached principal for ``user_id``, loading it on a miss."""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    row = db.execute(
+        select(User.id, User.is_verified, User.is_active, User.is_admin).where(User.id == user_id)
+    ).one_or_none()
+    if row is None:
+        return None
+    principal = Principal(id=row.id, is_verified=row.is_verified, is_active=row.is_active, is_admin=row.is_admin)
+    principal_cache.put(principal)
+    return principal
+
+
+def _principal_from_token(token: str, db: Session) -> Principal | None:
+    payload = decode_token(token)
+    return load_principal(db, UUID(str(payload.get("sub"))))
+
+
+def get_current_user(request: Request, db: Session = Depends(get_db)) -> Principal:
     # Cookie-only auth: read JWT from HttpOnly cookie
     token = request.cookies.get(COOKIE_NAME)
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     try:
-        payload = decode_token(token)
-        user_id = payload.get("sub")
-        user = db.get(User, user_id)
-        if not user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user")
-        return user
+        principal = _principal_from_token(token, db)
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if not principal:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user")
+    return principal
 
 
-def get_optional_user(request: Request, db: Session = Depends(get_db)) -> User | None:
+def get_optional_user(request: Request, db: Session = Depends(get_db)) -> Principal | None:
     token = request.cookies.get(COOKIE_NAME)
     if not token:
         return None
     try:
-        payload = decode_token(token)
-        user_id = payload.get("sub")
-        user = db.get(User, user_id)
-        return user
+        return _principal_from_token(token, db)
     except Exception:
         return None
 
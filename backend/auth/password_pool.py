@@ -0,0 +1,60 @@
+"""
+Dedicated worker pool for password hashing.
+
+bcrypt is deliberately slow. Running it on the shared request threadpool
+lets a burst of logins starve the DB-bound handlers, so hashing and
+verification run here instead, behind their own concurrency limit and a
+cap on queued work. bcrypt releases the GIL, so threads are sufficient.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from api.metrics import metrics
+
+
+T = TypeVar("T")
+
+
+class PasswordPoolBusy(RuntimeError):
+    """Raised when the pool already has ``max_pending`` jobs queued or running."""
+
+
+class PasswordWorkPool:
+    def __init__(self, *, max_workers: int, max_pending: int) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if not self._slots.acquire(blocking=False):
+            metrics.incr("password_pool.rejected")
+            raise PasswordPoolBusy("Password hashing pool is saturated")
+        submitted = time.perf_counter()
+
+        def job() -> T:
+            started = time.perf_counter()
+            metrics.observe("password_pool.queue_wait", started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                metrics.observe("password_pool.run", time.perf_counter() - started)
+
+        try:
+            return await asyncio.wrap_future(self._executor.submit(job))
+        finally:
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordWorkPool(
+    max_workers=int(os.getenv("AUTH_HASH_WORKERS", "4")),
+    max_pending=int(os.getenv("AUTH_HASH_MAX_PENDING", "64")),
+)
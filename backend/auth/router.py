@@ -5,6 +5,7 @@ from database import get_db
 from .service import AuthService
 from .schemas import SignupRequest, LoginRequest, UserInfo
 from .security import decode_token
+from .password_pool import PasswordPoolBusy
 from community.models import User
 
 
@@ -32,9 +33,9 @@ def clear_auth_cookie(response: Response) -> None:
 
 
 @router.post("/signup", response_model=UserInfo)
-def signup(payload: SignupRequest, db: Session = Depends(get_db)):
+async def signup(payload: SignupRequest, db: Session = Depends(get_db)):
     try:
-        user = service.signup(
+        user = await service.signup(
             db,
             username=payload.username,
             email=payload.email,
@@ -44,11 +45,16 @@ def signup(payload: SignupRequest, db: Session = Depends(get_db)):
         return user
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Too many requests, try again shortly")
 
 
 @router.post("/login", response_model=UserInfo)
-def login(payload: LoginRequest, response: Response, db: Session = Depends(get_db)):
-    user = service.authenticate(db, username_or_email=payload.username_or_email, password=payload.password)
+async def login(payload: LoginRequest, response: Response, db: Session = Depends(get_db)):
+    try:
+        user = await service.authenticate(db, username_or_email=payload.username_or_email, password=payload.password)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Too many requests, try again shortly")
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = service.issue_token(user_id=user.id)
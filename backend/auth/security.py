@@ -5,7 +5,19 @@ import jwt
 from passlib.context import CryptContext
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def get_bcrypt_rounds() -> int:
+    return int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+
+
+# Pinning min and max to the configured work factor makes any hash created
+# with a different factor report ``needs_update``, so it is rehashed on login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=get_bcrypt_rounds(),
+    bcrypt__min_rounds=get_bcrypt_rounds(),
+    bcrypt__max_rounds=get_bcrypt_rounds(),
+)
 
 
 def get_secret_key() -> str:
@@ -29,6 +41,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Verify a password and return a replacement hash if the stored one is outdated."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def create_access_token(subject: str, extra_claims: Optional[dict] = None) -> str:
     to_encode = {"sub": subject}
     if extra_claims:
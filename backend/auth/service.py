@@ -1,22 +1,61 @@
 from typing import Optional
 from uuid import UUID
 
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
 from community.models import User
-from .security import hash_password, verify_password, create_access_token
+from .password_pool import password_pool
+from .security import hash_password, verify_and_update_password, create_access_token
 
 
 class AuthService:
-    def signup(self, db: Session, *, username: str, email: str, password: str, display_name: Optional[str]) -> User:
-        existing = db.execute(select(User).where((User.username == username) | (User.email == email))).scalar_one_or_none()
-        if existing:
+    """Signup and login.
+
+    Both flows are async so that bcrypt work can be awaited on the dedicated
+    password pool; the blocking DB calls are pushed to the request threadpool.
+    """
+
+    async def signup(self, db: Session, *, username: str, email: str, password: str, display_name: Optional[str]) -> User:
+        # Reject duplicates before spending a bcrypt round on them
+        if await run_in_threadpool(self._user_exists, db, username, email):
+            raise ValueError("Username or email already exists")
+        password_hash = await password_pool.run(hash_password, password)
+        return await run_in_threadpool(
+            self._create_user,
+            db,
+            username=username,
+            email=email,
+            password_hash=password_hash,
+            display_name=display_name,
+        )
+
+    async def authenticate(self, db: Session, *, username_or_email: str, password: str) -> Optional[User]:
+        user = await run_in_threadpool(self._find_user, db, username_or_email)
+        if not user or not user.password_hash:
+            return None
+        ok, new_hash = await password_pool.run(verify_and_update_password, password, user.password_hash)
+        if not ok:
+            return None
+        if new_hash:
+            # Work factor changed since this hash was created: upgrade it transparently
+            await run_in_threadpool(self._store_password_hash, db, user, new_hash)
+        return user
+
+    def issue_token(self, *, user_id: UUID) -> str:
+        return create_access_token(str(user_id))
+
+    def _user_exists(self, db: Session, username: str, email: str) -> bool:
+        return db.execute(select(User.id).where((User.username == username) | (User.email == email)).limit(1)).first() is not None
+
+    def _create_user(self, db: Session, *, username: str, email: str, password_hash: str, display_name: Optional[str]) -> User:
+        if self._user_exists(db, username, email):
             raise ValueError("Username or email already exists")
         user = User(
             username=username,
             email=email,
-            password_hash=hash_password(password),
+            password_hash=password_hash,
             display_name=display_name or username,
         )
         db.add(user)
@@ -24,11 +63,10 @@ class AuthService:
         db.refresh(user)
         return user
 
-    def authenticate(self, db: Session, *, username_or_email: str, password: str) -> Optional[User]:
-        user = db.execute(select(User).where((User.username == username_or_email) | (User.email == username_or_email))).scalar_one_or_none()
-        if not user or not user.password_hash or not verify_password(password, user.password_hash):
-            return None
-        return user
+    def _find_user(self, db: Session, username_or_email: str) -> Optional[User]:
+        return db.execute(select(User).where((User.username == username_or_email) | (User.email == username_or_email))).scalar_one_or_none()
 
-    def issue_token(self, *, user_id: UUID) -> str:
-        return create_access_token(str(user_id))
+    def _store_password_hash(self, db: Session, user: User, password_hash: str) -> None:
+        user.password_hash = password_hash
+        db.commit()
+        db.refresh(user)
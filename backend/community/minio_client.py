@@ -1,19 +1,13 @@
-import os
 from datetime import timedelta
-from dotenv import load_dotenv
-
-load_dotenv()
 
 from minio import Minio
 
+from storage.minio_service import get_minio_service
+
 
 def get_minio_client() -> Minio:
-    endpoint = os.getenv("MINIO_ENDPOINT", "localhost:9000")
-    access_key = os.getenv("MINIO_ROOT_USER", "minioadmin")
-    secret_key = os.getenv("MINIO_ROOT_PASSWORD", "minioadmin")
-    secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
-    region = os.getenv("MINIO_REGION", "ap-south-1")
-    return Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure, region=region)
+    # Reuse the process-wide client and HTTP pool instead of building a new one
+    return get_minio_service().client
 
 
 def ensure_bucket(client: Minio, bucket_name: str) -> None:
@@ -23,4 +17,3 @@ def ensure_bucket(client: Minio, bucket_name: str) -> None:
 
 def create_presigned_put_url(client: Minio, bucket: str, object_key: str, content_type: str, expires_seconds: int = 900) -> str:
     return client.presigned_put_object(bucket, object_key, expires=timedelta(seconds=expires_seconds))
-
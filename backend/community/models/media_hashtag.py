@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 
 from sqlalchemy import Column, DateTime, ForeignKey, String, Text, UniqueConstraint
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -13,13 +13,19 @@ class Media(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     thread_id = Column(UUID(as_uuid=True), ForeignKey("community_threads.id", ondelete="CASCADE"), nullable=False, index=True)
-    url = Column(String(512), nullable=False)
+    url = Column(String(512), nullable=False, index=True)
     media_type = Column(String(20), nullable=False)  # image, video, gif
     alt_text = Column(String(300), nullable=True)
+    # Resized variants written by storage.derivatives: [{url, width, format}]
+    derivatives = Column(JSONB, nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
     thread = relationship("Thread", back_populates="media_items")
 
+    @property
+    def srcset(self) -> list[dict]:
+        return self.derivatives or []
+
 
 class Hashtag(Base):
     __tablename__ = "community_hashtags"
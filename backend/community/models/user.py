@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, String, Text, Boolean
+from sqlalchemy import Column, DateTime, String, Text, Boolean, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -27,7 +27,7 @@ class User(Base):
     is_verified = Column(Boolean, default=False, nullable=False)
     display_name = Column(String(80), nullable=True)
     bio = Column(Text, nullable=True)
-    avatar_url = Column(String(512), nullable=True)
+    avatar_url = Column(String(512), nullable=True, index=True)
 
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
@@ -62,3 +62,10 @@ class User(Base):
         cascade="all, delete-orphan",
     )
 
+
+    # Trigram indexes let admin substring search (ILIKE '%q%') use an index
+    __table_args__ = (
+        Index("ix_community_users_username_trgm", "username", postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"}),
+        Index("ix_community_users_email_trgm", "email", postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+        Index("ix_community_users_display_name_trgm", "display_name", postgresql_using="gin", postgresql_ops={"display_name": "gin_trgm_ops"}),
+    )
@@ -1,14 +1,16 @@
+import os
 from typing import List
-from uuid import UUID, uuid4
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select
 from sqlalchemy.orm import Session, joinedload
 
 from auth.deps import get_current_user, get_admin_user
+from auth.cache import principal_cache
 from auth.schemas import UserInfo
 from database import get_db
-from storage.minio_service import MinioService
+from storage.minio_service import MinioService, get_minio_service
 
 from .models import Thread, Like, Repost, User as CommunityUser, Hashtag, ThreadHashtag
 from .schemas import (
@@ -24,6 +26,12 @@ from .schemas import (
     PresignedUrlRequest,
     PresignedUrlResponse,
     AttachMediaRequest,
+    AvatarPresignRequest,
+    AvatarAttachRequest,
+    BatchPresignRequest,
+    BatchPresignResponse,
+    PresignedUploadOut,
+    BatchAttachMediaRequest,
     MediaItemOut,
     AuthorMini,
 )
@@ -33,9 +41,12 @@ router = APIRouter(
 	tags=["OneTee Community"],
 )
 
-minio_service = MinioService()
 service = CommunityService()
 
+# Upper bound for presigned POST uploads (bytes)
+MEDIA_UPLOAD_MAX_BYTES = int(os.getenv("MEDIA_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+
 # Threads
 @router.post("/threads", response_model=ThreadOut)
 def create_thread(payload: ThreadCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
@@ -64,8 +75,11 @@ def create_thread(payload: ThreadCreate, db: Session = Depends(get_db), user=Dep
 		in_reply_to_id=payload.in_reply_to_id,
 	)
 	if payload.media_keys:
-		for key in payload.media_keys:
-			service.attach_media_to_thread(db, thread_id=thread.id, object_key=key, media_type="image", alt_text=None)
+		service.attach_media_batch(
+			db,
+			thread_id=thread.id,
+			items=[(key, "image", None) for key in payload.media_keys],
+		)
 		db.refresh(thread)
 	return thread
 
@@ -124,7 +138,7 @@ def list_threads(limit: int = 50, offset: int = 0, tag: str | None = None, db: S
 		).first() is not None
 		
 		mi = [
-			{"id": m.id, "url": m.url, "media_type": getattr(m, "media_type", "image"), "alt_text": getattr(m, "alt_text", None)}
+			{"id": m.id, "url": m.url, "media_type": getattr(m, "media_type", "image"), "alt_text": getattr(m, "alt_text", None), "srcset": m.srcset}
 			for m in getattr(thread, "media_items", [])
 		]
 		result.append(
@@ -166,15 +180,12 @@ def bookmark_thread(thread_id: UUID, db: Session = Depends(get_db), user=Depends
 
 @router.delete("/threads/{thread_id}", response_model=ActionOut)
 def delete_own_thread(thread_id: UUID, db: Session = Depends(get_db), user=Depends(get_current_user)):
-	from sqlalchemy import delete
 	thread = db.get(Thread, thread_id)
 	if not thread:
 		raise HTTPException(status_code=404, detail="Not found")
 	if thread.author_id != user.id:
 		raise HTTPException(status_code=403, detail="Not allowed")
-	# Cascades remove related rows
-	db.execute(delete(Thread).where(Thread.id == thread_id))
-	db.commit()
+	service.delete_thread(db, thread_id=thread_id)
 	return {"success": True}
 
 
@@ -220,7 +231,7 @@ def profile_threads(username: str, limit: int = 50, offset: int = 0, db: Session
 		).first() is not None
 		
 		mi = [
-			{"id": m.id, "url": m.url, "media_type": getattr(m, "media_type", "image"), "alt_text": getattr(m, "alt_text", None)}
+			{"id": m.id, "url": m.url, "media_type": getattr(m, "media_type", "image"), "alt_text": getattr(m, "alt_text", None), "srcset": m.srcset}
 			for m in getattr(thread, "media_items", [])
 		]
 		result.append(
@@ -310,6 +321,7 @@ async def get_thread(
                 url=mi.url,
                 media_type=mi.media_type,
                 alt_text=mi.alt_text,
+                srcset=mi.srcset,
             ) for mi in thread.media_items
         ] if thread.media_items else [],
         author=AuthorMini(
@@ -415,6 +427,7 @@ async def get_thread_with_replies(
                     "url": mi.url,
                     "media_type": mi.media_type,
                     "alt_text": mi.alt_text,
+                    "srcset": mi.srcset,
                 } for mi in reply.media_items
             ] if reply.media_items else [],
             "author": {
@@ -444,6 +457,7 @@ async def get_thread_with_replies(
                     "url": mi.url,
                     "media_type": mi.media_type,
                     "alt_text": mi.alt_text,
+                    "srcset": mi.srcset,
                 } for mi in thread.media_items
             ] if thread.media_items else [],
             "author": {
@@ -517,6 +531,7 @@ async def get_thread_replies(
                     url=mi.url,
                     media_type=mi.media_type,
                     alt_text=mi.alt_text,
+                    srcset=mi.srcset,
                 ) for mi in thread.media_items
             ] if thread.media_items else [],
             author=AuthorMini(
@@ -536,14 +551,40 @@ async def get_thread_replies(
 
 
 @router.post("/media/presign", response_model=PresignedUrlResponse)
-def create_presigned_media_url(req: PresignedUrlRequest):
-	minio_service.ensure_all_buckets()
+def create_presigned_media_url(req: PresignedUrlRequest, minio_service: MinioService = Depends(get_minio_service)):
+	minio_service.ensure_ready()
 	bucket = minio_service.get_bucket_for("thread")
-	object_key = f"uploads/{req.filename}"
+	try:
+		object_key = minio_service.new_media_key("uploads/", req.filename, req.content_type)
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=str(e))
 	url = minio_service.presign_put(bucket, object_key)
 	return PresignedUrlResponse(url=url, object_key=object_key)
 
 
+@router.post("/media/presign/batch", response_model=BatchPresignResponse)
+def create_presigned_media_urls(req: BatchPresignRequest, user=Depends(get_current_user), minio_service: MinioService = Depends(get_minio_service)):
+	"""Presign uploads for every file of a multi-image post in one call."""
+	minio_service.ensure_ready()
+	bucket = minio_service.get_bucket_for("thread")
+	max_size = req.max_size_bytes or MEDIA_UPLOAD_MAX_BYTES
+	if max_size > MEDIA_UPLOAD_MAX_BYTES:
+		raise HTTPException(status_code=400, detail=f"max_size_bytes cannot exceed {MEDIA_UPLOAD_MAX_BYTES}")
+	items: list[PresignedUploadOut] = []
+	for f in req.files:
+		try:
+			object_key = minio_service.new_media_key("uploads/", f.filename, f.content_type)
+		except ValueError as e:
+			raise HTTPException(status_code=400, detail=str(e))
+		if req.use_post_policy:
+			url, fields = minio_service.presign_post(bucket, object_key, content_type=f.content_type, max_size_bytes=max_size)
+			items.append(PresignedUploadOut(object_key=object_key, url=url, method="POST", fields=fields))
+		else:
+			url = minio_service.presign_put(bucket, object_key)
+			items.append(PresignedUploadOut(object_key=object_key, url=url, method="PUT"))
+	return BatchPresignResponse(items=items)
+
+
 @router.post("/media/attach", response_model=MediaItemOut)
 def attach_media(req: AttachMediaRequest, db: Session = Depends(get_db)):
 	media = service.attach_media_to_thread(
@@ -556,6 +597,20 @@ def attach_media(req: AttachMediaRequest, db: Session = Depends(get_db)):
 	return media
 
 
+@router.post("/media/attach/batch", response_model=List[MediaItemOut])
+def attach_media_batch(req: BatchAttachMediaRequest, db: Session = Depends(get_db), user=Depends(get_current_user)):
+	thread = db.get(Thread, req.thread_id)
+	if not thread:
+		raise HTTPException(status_code=404, detail="Thread not found")
+	if thread.author_id != user.id:
+		raise HTTPException(status_code=403, detail="Not allowed")
+	return service.attach_media_batch(
+		db,
+		thread_id=req.thread_id,
+		items=[(i.object_key, i.media_type, i.alt_text) for i in req.items],
+	)
+
+
 @router.get("/trending", response_model=list[dict])
 def trending_hashtags(limit: int = 10, db: Session = Depends(get_db)):
 	from sqlalchemy import select, func
@@ -573,38 +628,43 @@ def trending_hashtags(limit: int = 10, db: Session = Depends(get_db)):
 # Admin moderation
 @router.delete("/admin/threads/{thread_id}", response_model=ActionOut)
 def admin_delete_thread(thread_id: UUID, db: Session = Depends(get_db), admin=Depends(get_admin_user)):
-	from sqlalchemy import delete
-	db.execute(delete(Thread).where(Thread.id == thread_id))
-	db.commit()
+	service.delete_thread(db, thread_id=thread_id)
 	return {"success": True}
 
 
 @router.delete("/admin/users/{user_id}")
 def admin_delete_user(user_id: UUID, db: Session = Depends(get_db), admin=Depends(get_admin_user)):
-	from sqlalchemy import delete
-	# Deleting user will cascade to threads and relations
-	db.execute(delete(CommunityUser).where(CommunityUser.id == user_id))
-	db.commit()
+	service.delete_user(db, user_id=user_id)
+	principal_cache.invalidate(user_id)
 	return {"success": True}
 
 
 @router.post("/profiles/me/avatar/presign", response_model=PresignedUrlResponse)
-def presign_avatar(file: UploadFile = File(...), user=Depends(get_current_user)):
+def presign_avatar(req: AvatarPresignRequest, user=Depends(get_current_user), minio_service: MinioService = Depends(get_minio_service)):
     """Generate a presigned URL so the client can upload the avatar directly to MinIO.
+    Only file metadata is sent here; the image itself goes straight to storage.
     Returns both url and object_key.
     """
-    minio_service.ensure_all_buckets()
+    if req.size_bytes > AVATAR_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Avatar must be at most {AVATAR_MAX_BYTES} bytes")
+    minio_service.ensure_ready()
     bucket = minio_service.get_bucket_for("avatar")
-    ext = minio_service.pick_image_extension(file.filename, file.content_type)
-    object_key = f"avatars/{user.id}/{uuid4().hex}.{ext}"
+    object_key = minio_service.new_object_key(f"avatars/{user.id}/", req.filename, req.content_type)
     url = minio_service.presign_put(bucket, object_key)
     return PresignedUrlResponse(url=url, object_key=object_key)
 
 
 @router.post("/profiles/me/avatar/attach")
-def attach_avatar(req: AttachMediaRequest, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def attach_avatar(req: AvatarAttachRequest, db: Session = Depends(get_db), user=Depends(get_current_user), minio_service: MinioService = Depends(get_minio_service)):
     """Finalize an avatar upload by saving the public URL to the user's profile."""
+    if not req.object_key.startswith(f"avatars/{user.id}/"):
+        raise HTTPException(status_code=403, detail="Not allowed")
     bucket = minio_service.get_bucket_for("avatar")
+    stat = minio_service.stat_object(bucket=bucket, object_key=req.object_key)
+    if stat is None:
+        raise HTTPException(status_code=400, detail="Upload not found")
+    if stat.size is not None and stat.size > AVATAR_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Avatar must be at most {AVATAR_MAX_BYTES} bytes")
     public_url = minio_service.build_public_url(bucket=bucket, object_key=req.object_key)
     subject = db.get(CommunityUser, user.id)
     if not subject:
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -32,11 +32,18 @@ class UserOut(ORMModel):
 
 
 # Thread
+class ImageVariantOut(BaseModel):
+    url: str
+    width: int
+    format: str
+
+
 class MediaItemOut(ORMModel):
     id: UUID
     url: str
     media_type: str
     alt_text: Optional[str]
+    srcset: List[ImageVariantOut] = []
 
 
 class ThreadCreate(BaseModel):
@@ -110,9 +117,48 @@ class PresignedUrlResponse(BaseModel):
     object_key: str
 
 
+class AvatarPresignRequest(BaseModel):
+    filename: str
+    content_type: str = Field(pattern=r"^image/")
+    size_bytes: int = Field(gt=0)
+
+
+class AvatarAttachRequest(BaseModel):
+    object_key: str
+
+
 class AttachMediaRequest(BaseModel):
     thread_id: UUID
     object_key: str
     media_type: str
     alt_text: Optional[str] = None
 
+
+
+class BatchPresignRequest(BaseModel):
+    files: List[PresignedUrlRequest] = Field(min_length=1, max_length=10)
+    # Presigned POST policies let storage enforce content type and size
+    use_post_policy: bool = False
+    max_size_bytes: Optional[int] = Field(default=None, gt=0)
+
+
+class PresignedUploadOut(BaseModel):
+    object_key: str
+    url: str
+    method: str  # PUT or POST
+    fields: Optional[Dict[str, str]] = None  # form fields for POST uploads
+
+
+class BatchPresignResponse(BaseModel):
+    items: List[PresignedUploadOut]
+
+
+class AttachMediaItem(BaseModel):
+    object_key: str
+    media_type: str = "image"
+    alt_text: Optional[str] = None
+
+
+class BatchAttachMediaRequest(BaseModel):
+    thread_id: UUID
+    items: List[AttachMediaItem] = Field(min_length=1, max_length=10)
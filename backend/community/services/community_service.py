@@ -10,7 +10,7 @@ evolve.
 from typing import Optional
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 
 from ..models import Thread, Like, Repost, Bookmark, Notification, Media
@@ -68,22 +68,86 @@ class CommunityService:
         media_type: str,
         alt_text: Optional[str],
     ) -> Media:
+        return self.attach_media_batch(
+            db,
+            thread_id=thread_id,
+            items=[(object_key, media_type, alt_text)],
+        )[0]
+
+    def attach_media_batch(
+        self,
+        db: Session,
+        *,
+        thread_id: UUID,
+        items: list[tuple[str, str, Optional[str]]],
+    ) -> list[Media]:
+        """Attach several uploaded objects to a thread in one transaction.
+
+        ``items`` are (object_key, media_type, alt_text) tuples.
+        """
         # Import here to avoid circular imports
-        from storage.minio_service import MinioService
-        minio_service = MinioService()
+        from storage.minio_service import get_minio_service
+        minio_service = get_minio_service()
         bucket = minio_service.get_bucket_for("thread")
-        public_url = minio_service.build_public_url(bucket=bucket, object_key=object_key)
 
-        media = Media(
-            thread_id=thread_id,
-            url=public_url,
-            media_type=media_type,
-            alt_text=alt_text,
-        )
-        db.add(media)
+        media_items = [
+            Media(
+                thread_id=thread_id,
+                url=minio_service.build_public_url(bucket=bucket, object_key=object_key),
+                media_type=media_type,
+                alt_text=alt_text,
+            )
+            for object_key, media_type, alt_text in items
+        ]
+        db.add_all(media_items)
+        db.commit()
+        for media in media_items:
+            db.refresh(media)
+        image_ids = [m.id for m in media_items if m.media_type == "image"]
+        if image_ids:
+            from storage.derivatives import image_pipeline
+            image_pipeline.enqueue(Media, image_ids)
+        return media_items
+
+    def delete_thread(self, db: Session, *, thread_id: UUID) -> None:
+        """Delete a thread and its reply tree; their media is purged from
+        storage in the background after the commit."""
+        self._delete_threads(db, Thread.id == thread_id)
+
+    def delete_user(self, db: Session, *, user_id: UUID) -> None:
+        """Delete a user with their threads (and replies to them) and purge
+        their media and avatar from storage in the background."""
+        from storage.purge import purge_queue
+        from ..models import User
+
+        avatar_url = db.execute(select(User.avatar_url).where(User.id == user_id)).scalar_one_or_none()
+        doomed = self._release_thread_media(db, Thread.author_id == user_id)
+        doomed += purge_queue.release(db, [(avatar_url, None)])
+        # Cascades remove threads and relations
+        db.execute(delete(User).where(User.id == user_id))
+        db.commit()
+        purge_queue.enqueue(doomed)
+
+    def _delete_threads(self, db: Session, condition) -> None:
+        from storage.purge import purge_queue
+
+        doomed = self._release_thread_media(db, condition)
+        # Cascades remove replies, media rows and relations
+        db.execute(delete(Thread).where(condition))
         db.commit()
-        db.refresh(media)
-        return media
+        purge_queue.enqueue(doomed)
+
+    def _release_thread_media(self, db: Session, condition) -> list[tuple[str, str]]:
+        from storage.purge import purge_queue
+
+        # Threads matching ``condition`` plus every reply below them, which the
+        # in_reply_to_id cascade deletes along with them
+        tree = select(Thread.id).where(condition).cte("doomed_threads", recursive=True)
+        tree = tree.union(select(Thread.id).where(Thread.in_reply_to_id == tree.c.id))
+        rows = db.execute(
+            select(Media.url, Media.derivatives).where(Media.thread_id.in_(select(tree.c.id)))
+        ).all()
+        return purge_queue.release(db, rows)
 
     def like_thread(self, db: Session, *, user_id: UUID, thread_id: UUID) -> bool:
         existing = db.execute(
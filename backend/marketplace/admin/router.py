@@ -2,27 +2,37 @@ from typing import List, Dict, Any
 from uuid import UUID
 import os
 import base64
+import json
+import shutil
+import tempfile
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, desc, asc
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Response, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
 from database import get_db
 from auth.deps import get_admin_user
+from auth.cache import principal_cache
+from ..bulk_import import FORMATS, CatalogImporter, detect_format
+from ..bulk_update import bulk_updater
+from ..catalog import bump_catalog_version
+from ..search import match_and_score
 from ..service import MarketplaceService
 from ..schemas import TagCreate, TagOut, ProductCreate, ProductOut, CollectionCreate, CollectionOut
-from ..models import Product, ProductTag, ProductTagLink, Collection, ProductCollectionLink, Order, OrderItem, ProductVariant
-from storage.minio_service import MinioService
+from ..models import Product, ProductTag, ProductTagLink, Collection, ProductCollectionLink, Order, ProductVariant, ProductSalesStats
+from storage.minio_service import MinioService, get_minio_service
 from community.models.user import User
 from community.models.thread import Thread
 from community.models.social import Like, Repost, Bookmark, Follow
+from community.services.community_service import CommunityService
 
 
 router = APIRouter(tags=["MarketplaceAdmin"])
 service = MarketplaceService()
-minio = MinioService()
+community_service = CommunityService()
 
 # Login endpoint 
 @router.post('/login', response_model=bool)
@@ -108,6 +118,7 @@ def delete_tag(tag_id: UUID, request: Request, db: Session = Depends(get_db)):
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
     db.execute(delete(ProductTag).where(ProductTag.id == tag_id))
+    bump_catalog_version(db)
     db.commit()
     return {"success": True}
 
@@ -126,6 +137,7 @@ def update_tag(tag_id: UUID, payload: TagCreate, request: Request, db: Session =
             raise HTTPException(status_code=400, detail="Tag name already exists")
     tag.name = payload.name or tag.name
     tag.description = payload.description
+    bump_catalog_version(db)
     db.commit()
     db.refresh(tag)
     return tag
@@ -146,10 +158,11 @@ def create_product(
     images: List[UploadFile] = File(default_factory=list), # list of images
     request: Request = None, # request for admin auth
     db: Session = Depends(get_db), # database session
+    minio: MinioService = Depends(get_minio_service), # shared storage client
 ):
     admin = get_admin_user(request)
     # Upload images to MinIO and collect URLs
-    image_urls = minio.upload_product_uploadfiles(sku, images)
+    image_urls = minio.upload_product_uploadfiles(sku, images, db=db)
 
     size_list = [s.strip() for s in (sizes or "").split(",") if s.strip()]
     color_list = [c.strip() for c in (colors or "").split(",") if c.strip()]
@@ -185,15 +198,40 @@ def create_product(
     }
 
 
+@router.post("/products/import")
+def import_products(
+    file: UploadFile = File(...), # CSV (with header) or JSONL
+    format: str | None = Form(None), # csv|jsonl, defaults to the file extension
+    request: Request = None,
+):
+    admin = get_admin_user(request)
+    fmt = format or detect_format(file.filename)
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"format must be one of {', '.join(FORMATS)}")
+    # The upload is closed once this handler returns, before the import has run
+    staged = tempfile.TemporaryFile()
+    shutil.copyfileobj(file.file, staged)
+    staged.seek(0)
+
+    def progress():
+        # One JSON line per batch; the last one has done=true and the errors
+        with staged:
+            for report in CatalogImporter().run(staged, fmt):
+                summary = report.as_dict()
+                if not report.done:
+                    summary.pop("errors")
+                yield json.dumps(summary, default=str) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+
 @router.delete("/products/{product_id}")
 def delete_product(product_id: UUID, request: Request, db: Session = Depends(get_db)):
     admin = get_admin_user(request)
-    # delete product from minio
     product = db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-    for image in product.images:
-        minio.delete_object(image)
+    # Image objects are purged from storage in the background
     service.delete_product(db, product_id=product_id)
     return {"success": True}
 
@@ -211,6 +249,7 @@ def assign_tag_to_product(product_id: UUID, tag_id: UUID, request: Request, db:
     if exists:
         return {"success": True}
     db.add(ProductTagLink(product_id=product_id, tag_id=tag_id))
+    bump_catalog_version(db)
     db.commit()
     return {"success": True}
 
@@ -247,6 +286,7 @@ def update_collection(collection_id: UUID, payload: CollectionCreate, request: R
             raise HTTPException(status_code=400, detail="Collection name exists")
     col.name = payload.name or col.name
     col.description = payload.description
+    bump_catalog_version(db)
     db.commit()
     db.refresh(col)
     return col
@@ -257,6 +297,7 @@ def delete_collection(collection_id: UUID, request: Request, db: Session = Depen
     admin = get_admin_user(request)
     from sqlalchemy import delete
     db.execute(delete(Collection).where(Collection.id == collection_id))
+    bump_catalog_version(db)
     db.commit()
     return {"success": True}
 
@@ -272,6 +313,7 @@ def assign_collection_to_product(product_id: UUID, collection_id: UUID, request:
     if exists:
         return {"success": True}
     db.add(ProductCollectionLink(product_id=product_id, collection_id=collection_id))
+    bump_catalog_version(db)
     db.commit()
     return {"success": True}
 
@@ -399,21 +441,23 @@ def get_top_products(
         Product.id,
         Product.name,
         Product.sku,
-        func.sum(OrderItem.quantity).label('total_sold'),
-        func.sum(OrderItem.total_cents).label('total_revenue')
-    ).join(OrderItem, Product.id == OrderItem.product_id).join(
-        Order, OrderItem.order_id == Order.id
-    ).filter(Order.status == "paid").group_by(
-        Product.id, Product.name, Product.sku
-    ).order_by(desc(func.sum(OrderItem.quantity))).limit(limit).all()
+        ProductSalesStats.units_sold,
+        ProductSalesStats.revenue_cents,
+        ProductSalesStats.units_7d,
+        ProductSalesStats.units_30d,
+    ).join(ProductSalesStats, ProductSalesStats.product_id == Product.id).filter(
+        ProductSalesStats.units_sold > 0
+    ).order_by(desc(ProductSalesStats.units_sold)).limit(limit).all()
     
     return [
         {
             "id": str(product.id),
             "name": product.name,
             "sku": product.sku,
-            "total_sold": product.total_sold or 0,
-            "total_revenue_cents": product.total_revenue or 0
+            "total_sold": product.units_sold,
+            "total_revenue_cents": product.revenue_cents,
+            "sold_7d": product.units_7d,
+            "sold_30d": product.units_30d,
         }
         for product in top_products
     ]
@@ -481,6 +525,7 @@ def update_user_status(
     
     user.is_active = is_active
     db.commit()
+    principal_cache.invalidate(user_id)
     
     return {"success": True, "user_id": str(user_id), "is_active": is_active}
 
@@ -501,6 +546,7 @@ def update_user_admin_status(
     
     user.is_admin = is_admin
     db.commit()
+    principal_cache.invalidate(user_id)
     
     return {"success": True, "user_id": str(user_id), "is_admin": is_admin}
 
@@ -522,11 +568,9 @@ def list_products_admin(
     query = db.query(Product)
     
     if search:
-        query = query.filter(
-            Product.name.ilike(f"%{search}%") |
-            Product.sku.ilike(f"%{search}%") |
-            Product.description.ilike(f"%{search}%")
-        )
+        # Same ranked full-text/trigram match as the storefront, plus SKU prefix
+        condition, score = match_and_score(search)
+        query = query.filter(condition | Product.sku.ilike(f"{search}%")).order_by(score.desc(), Product.id.desc())
     
     if is_active is not None:
         query = query.filter(Product.is_active == is_active)
@@ -556,7 +600,7 @@ def list_products_admin(
             "is_active": p.is_active,
             "created_at": p.created_at.isoformat(),
             "updated_at": p.updated_at.isoformat(),
-            "images": [{"url": img.url, "alt_text": img.alt_text} for img in p.images],
+            "images": [{"url": img.url, "alt_text": img.alt_text, "srcset": img.srcset} for img in p.images],
             "variants": [
                 {
                     "id": str(v.id),
@@ -612,6 +656,7 @@ def update_product(
         product.is_active = is_active
     
     product.updated_at = datetime.utcnow()
+    bump_catalog_version(db)
     db.commit()
     db.refresh(product)
     
@@ -629,16 +674,31 @@ def update_variant_stock(
     """Update product variant stock quantity"""
     admin = get_admin_user(request)
     
-    variant = db.get(ProductVariant, variant_id)
+    # Locked so a hold can't land between the check and the write
+    variant = db.get(ProductVariant, variant_id, with_for_update=True)
     if not variant or variant.product_id != product_id:
         raise HTTPException(status_code=404, detail="Variant not found")
+    if stock_quantity < variant.held_quantity:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Stock below held quantity ({variant.held_quantity} units held by pending orders)",
+        )
     
     variant.stock_quantity = stock_quantity
+    bump_catalog_version(db)
     db.commit()
     
     return {"success": True, "variant_id": str(variant_id), "stock_quantity": stock_quantity}
 
 
+@router.post("/products/bulk-update")
+async def bulk_update_products(request: Request):
+    """Apply stock/price changes sent as NDJSON (one change per line); see marketplace.bulk_update"""
+    admin = get_admin_user(request)
+    report = await bulk_updater.apply_stream(request.stream())
+    return report.as_dict()
+
+
 @router.post("/products/{product_id}/variants")
 def add_product_variant(
     product_id: UUID,
@@ -674,6 +734,7 @@ def add_product_variant(
         stock_quantity=stock_quantity
     )
     db.add(variant)
+    bump_catalog_version(db)
     db.commit()
     db.refresh(variant)
     
@@ -748,15 +809,15 @@ def update_order_status(
     """Update order status"""
     admin = get_admin_user(request)
     
-    order = db.get(Order, order_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
     valid_statuses = ["pending", "paid", "shipped", "delivered", "cancelled", "refunded"]
     if status not in valid_statuses:
         raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
     
-    order.status = status
+    order = db.get(Order, order_id, with_for_update=True)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    service.set_order_status(db, order, status)
     order.updated_at = datetime.utcnow()
     db.commit()
     
@@ -841,7 +902,6 @@ def delete_thread(
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found")
     
-    db.delete(thread)
-    db.commit()
+    community_service.delete_thread(db, thread_id=thread_id)
     
     return {"success": True, "thread_id": str(thread_id)}
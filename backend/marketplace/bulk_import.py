@@ -0,0 +1,616 @@
+"""
+Bulk catalog import from CSV or JSONL.
+
+Seasonal drops are thousands of SKUs, which the one-product multipart
+endpoint (with a commit per tag) can't keep up with. The importer streams
+the file in batches of ``IMPORT_BATCH_SIZE`` rows; for each batch:
+
+1. Image URLs of products that have no images yet are fetched
+   concurrently and hashed.
+2. The rows are ``COPY``-ed into temporary staging tables.
+3. Set-based statements merge them: products are upserted by SKU, tags and
+   collections are created by name, variants (size x color) and tag and
+   collection links are added where missing, variant stock is set when
+   the row has one (unless it is below the units held by pending orders,
+   which is reported and skipped), and images are attached to products
+   without images.
+   The attached images are referenced in the blob index in one upsert and
+   only bytes it doesn't have yet are uploaded (content-addressed).
+
+A batch is one transaction (serialized with other imports by an advisory
+lock) that also bumps the catalog version. A failing batch is reported and
+skipped, earlier ones stay, and re-running a file is harmless because
+every step merges. Progress is reported after each batch.
+
+Image URLs are fetched server-side, so hosts that resolve to private,
+loopback, link-local or otherwise internal addresses are refused, also
+when reached through a redirect; the connection goes to the address that
+was checked.
+
+Rows have ``sku``, ``name``, ``gender`` and ``price_cents`` and optionally
+``description``, ``sizes``, ``colors``, ``tags``, ``collections``,
+``image_urls`` (lists; ``|``-separated in CSV), ``stock`` (per variant)
+and ``is_active``.
+"""
+
+import csv
+import hashlib
+import io
+import ipaddress
+import json
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import BinaryIO, Iterator
+from urllib.parse import urlparse
+
+import urllib3
+from sqlalchemy import select, text, update
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .catalog import bump_catalog_version
+from .models import Product, ProductImage
+
+
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMAGE_CONCURRENCY = int(os.getenv("IMPORT_IMAGE_CONCURRENCY", "8"))
+IMAGE_MAX_BYTES = int(os.getenv("IMPORT_IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+# Errors kept in the report; the count keeps going past it
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("csv", "jsonl")
+
+
+@dataclass(slots=True)
+class ImportRow:
+    line: int
+    sku: str
+    name: str
+    description: str | None
+    gender: str
+    price_cents: int
+    sizes: list[str]
+    colors: list[str]
+    tags: list[str]
+    collections: list[str]
+    image_urls: list[str]
+    stock: int | None
+    is_active: bool | None
+
+
+@dataclass(slots=True)
+class ImportReport:
+    rows: int = 0
+    rows_failed: int = 0
+    products_created: int = 0
+    products_updated: int = 0
+    variants_created: int = 0
+    variants_restocked: int = 0
+    variants_below_held: int = 0
+    tags_created: int = 0
+    collections_created: int = 0
+    images_attached: int = 0
+    images_failed: int = 0
+    done: bool = False
+    errors: list[dict] = field(default_factory=list)
+
+    def error(self, line: int | None, sku: str | None, message: str, *, row_failed: bool = True) -> None:
+        if row_failed:
+            self.rows_failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "sku": sku, "error": message})
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def detect_format(filename: str | None) -> str:
+    if filename and filename.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+def read_records(stream: BinaryIO, fmt: str) -> Iterator[tuple[int, dict]]:
+    """(line number, raw record) pairs from a CSV (with header) or JSONL stream."""
+    textual = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "jsonl":
+        for line_no, line in enumerate(textual, start=1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError:
+                    yield line_no, {"__error__": "Invalid JSON"}
+    else:
+        reader = csv.DictReader(textual)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def _text(record: dict, key: str, *, max_length: int, required: bool = False) -> str | None:
+    value = record.get(key)
+    value = str(value).strip() if value is not None else ""
+    if not value:
+        if required:
+            raise ValueError(f"{key} is required")
+        return None
+    if len(value) > max_length:
+        raise ValueError(f"{key} is longer than {max_length} characters")
+    return value
+
+
+def _list(record: dict, key: str, *, max_length: int) -> list[str]:
+    value = record.get(key)
+    if value is None or value == "":
+        return []
+    items = value if isinstance(value, list) else str(value).split("|")
+    out: list[str] = []
+    for item in items:
+        item = str(item).strip()
+        if not item:
+            continue
+        if len(item) > max_length:
+            raise ValueError(f"{key} value {item[:20]!r}... is longer than {max_length} characters")
+        if item not in out:
+            out.append(item)
+    return out
+
+
+def _int(record: dict, key: str, *, required: bool = False) -> int | None:
+    value = record.get(key)
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{key} is required")
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be an integer")
+    if number < 0:
+        raise ValueError(f"{key} must not be negative")
+    return number
+
+
+def _bool(record: dict, key: str) -> bool | None:
+    value = record.get(key)
+    if value is None or isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if not value:
+        return None
+    if value in {"true", "1", "yes"}:
+        return True
+    if value in {"false", "0", "no"}:
+        return False
+    raise ValueError(f"{key} must be true or false")
+
+
+def parse_record(line: int, record: dict) -> ImportRow:
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object")
+    if "__error__" in record:
+        raise ValueError(record["__error__"])
+    gender = _text(record, "gender", max_length=16, required=True).lower()
+    if gender not in {"men", "women"}:
+        raise ValueError("gender must be men or women")
+    image_urls = _list(record, "image_urls", max_length=2048)
+    for url in image_urls:
+        if urlparse(url).scheme not in {"http", "https"}:
+            raise ValueError(f"image URL {url[:40]!r} is not http(s)")
+    return ImportRow(
+        line=line,
+        sku=_text(record, "sku", max_length=64, required=True),
+        name=_text(record, "name", max_length=200, required=True),
+        description=_text(record, "description", max_length=100_000),
+        gender=gender,
+        price_cents=_int(record, "price_cents", required=True),
+        sizes=_list(record, "sizes", max_length=16),
+        colors=_list(record, "colors", max_length=32),
+        tags=_list(record, "tags", max_length=64),
+        collections=_list(record, "collections", max_length=120),
+        image_urls=image_urls,
+        stock=_int(record, "stock"),
+        is_active=_bool(record, "is_active"),
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class FetchedImage:
+    url: str
+    bucket: str
+    sha256: str
+    object_key: str
+    data: bytes
+    content_type: str | None
+
+
+def public_address(host: str, port: int) -> str:
+    """Resolve ``host`` and return an address to connect to, refusing
+    hosts with any internal address (so an admin-supplied URL can't reach
+    the metadata service or anything else on the private network)."""
+    addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"{host} resolves to an internal address ({ip})")
+    return addresses[0]
+
+
+class _PublicConnectionMixin:
+    """Connects to the address vetted by ``public_address``; TLS still checks the hostname."""
+
+    def _new_conn(self):
+        try:
+            address = public_address(self.host, self.port)
+        except socket.gaierror as e:
+            raise urllib3.exceptions.NameResolutionError(self.host, self, e) from e
+        try:
+            return urllib3.util.connection.create_connection(
+                (address, self.port), self.timeout, source_address=self.source_address, socket_options=self.socket_options,
+            )
+        except OSError as e:
+            raise urllib3.exceptions.NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+
+class _PublicHTTPConnection(_PublicConnectionMixin, urllib3.connection.HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicConnectionMixin, urllib3.connection.HTTPSConnection):
+    pass
+
+
+class _PublicHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class _PublicPoolManager(urllib3.PoolManager):
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        # Redirects open their pools here too, so every hop is checked
+        self.pool_classes_by_scheme = {"http": _PublicHTTPConnectionPool, "https": _PublicHTTPSConnectionPool}
+
+
+class ImageFetcher:
+    """Downloads remote images concurrently and picks their content-addressed keys."""
+
+    def __init__(self, *, concurrency: int, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="import-images")
+        self._http = _PublicPoolManager(
+            maxsize=concurrency,
+            timeout=urllib3.Timeout(connect=5, read=30),
+            retries=urllib3.Retry(total=2, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504]),
+        )
+
+    def fetch(self, db: Session, urls: list[str]) -> dict[str, FetchedImage | str]:
+        """Source URL -> FetchedImage, or an error message for failures."""
+        from storage.dedup import content_key
+        from storage.minio_service import get_minio_service
+        from storage.models import StoredBlob
+
+        storage = get_minio_service()
+        bucket = storage.get_bucket_for("product")
+        fetched = dict(zip(urls, self._executor.map(self._fetch, urls)))
+        hashes = {f[0] for f in fetched.values() if isinstance(f, tuple)}
+        # Content already indexed keeps its key (and extension); acquire() confirms it under lock
+        known = dict(db.execute(
+            select(StoredBlob.sha256, StoredBlob.object_key).where(StoredBlob.bucket == bucket, StoredBlob.sha256.in_(hashes))
+        ).all()) if hashes else {}
+
+        results: dict[str, FetchedImage | str] = {}
+        for url, f in fetched.items():
+            if isinstance(f, str):
+                results[url] = f
+                continue
+            sha256, data, content_type = f
+            object_key = known.get(sha256) or content_key(sha256, storage.pick_image_extension(urlparse(url).path, content_type))
+            results[url] = FetchedImage(
+                url=storage.build_public_url(bucket=bucket, object_key=object_key),
+                bucket=bucket,
+                sha256=sha256,
+                object_key=object_key,
+                data=data,
+                content_type=content_type,
+            )
+        return results
+
+    def _fetch(self, url: str) -> tuple[str, bytes, str | None] | str:
+        try:
+            response = self._http.request("GET", url, preload_content=False)
+            try:
+                if response.status != 200:
+                    return f"HTTP {response.status}"
+                content_type = (response.headers.get("Content-Type") or "").split(";")[0].strip() or None
+                if content_type and not content_type.startswith("image/"):
+                    return f"not an image ({content_type})"
+                data = response.read(self.max_bytes + 1)
+            finally:
+                response.release_conn()
+        except Exception as e:
+            return f"fetch failed: {e}"
+        if len(data) > self.max_bytes:
+            return "image too large"
+        return hashlib.sha256(data).hexdigest(), data, content_type
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._http.clear()
+
+
+_STAGING = """
+CREATE TEMP TABLE import_products (sku text, name text, description text, gender text, price_cents int, is_active bool) ON COMMIT DROP;
+CREATE TEMP TABLE import_variants (sku text, size text, color text, stock int) ON COMMIT DROP;
+CREATE TEMP TABLE import_tags (sku text, name text) ON COMMIT DROP;
+CREATE TEMP TABLE import_collections (sku text, name text) ON COMMIT DROP;
+CREATE TEMP TABLE import_images (sku text, position int, url text) ON COMMIT DROP;
+"""
+
+_UPDATE_PRODUCTS = """
+UPDATE shop_products p SET
+    name = i.name,
+    description = COALESCE(i.description, p.description),
+    gender = i.gender,
+    price_cents = i.price_cents,
+    is_active = COALESCE(i.is_active, p.is_active),
+    updated_at = now()
+FROM import_products i
+WHERE p.sku = i.sku
+    AND (p.name, p.description, p.gender, p.price_cents, p.is_active)
+        IS DISTINCT FROM (i.name, COALESCE(i.description, p.description), i.gender, i.price_cents, COALESCE(i.is_active, p.is_active))
+"""
+
+_INSERT_PRODUCTS = """
+INSERT INTO shop_products (id, sku, name, description, gender, price_cents, currency, is_active, created_at, updated_at)
+SELECT gen_random_uuid(), sku, name, description, gender, price_cents, 'INR', COALESCE(is_active, true), now(), now()
+FROM import_products
+ON CONFLICT (sku) DO NOTHING
+"""
+
+# Locks the variants about to be restocked (in id order, like inventory holds)
+# so the held quantities checked here can't move before the UPDATE
+_LOCK_RESTOCKED_VARIANTS = """
+SELECT v.sku, x.size, x.color, v.stock, x.held_quantity
+FROM shop_product_variants x
+JOIN shop_products p ON p.id = x.product_id
+JOIN import_variants v ON v.sku = p.sku AND v.size = x.size AND v.color IS NOT DISTINCT FROM x.color
+WHERE v.stock IS NOT NULL AND x.stock_quantity <> v.stock
+ORDER BY x.id
+FOR UPDATE OF x
+"""
+
+_RESTOCK_VARIANTS = """
+UPDATE shop_product_variants x SET stock_quantity = v.stock
+FROM import_variants v JOIN shop_products p ON p.sku = v.sku
+WHERE x.product_id = p.id AND x.size = v.size AND x.color IS NOT DISTINCT FROM v.color
+    AND v.stock IS NOT NULL AND x.stock_quantity <> v.stock AND v.stock >= x.held_quantity
+"""
+
+_MERGE_VARIANTS = """
+INSERT INTO shop_product_variants (id, product_id, size, color, stock_quantity, held_quantity, created_at)
+SELECT gen_random_uuid(), p.id, v.size, v.color, COALESCE(v.stock, 0), 0, now()
+FROM import_variants v JOIN shop_products p ON p.sku = v.sku
+WHERE NOT EXISTS (
+    SELECT 1 FROM shop_product_variants x
+    WHERE x.product_id = p.id AND x.size = v.size AND x.color IS NOT DISTINCT FROM v.color
+)
+"""
+
+_MERGE_NAMES = """
+INSERT INTO {table} (id, name, created_at)
+SELECT gen_random_uuid(), name, now() FROM (SELECT DISTINCT name FROM {staging}) n
+ON CONFLICT (name) DO NOTHING
+"""
+
+_MERGE_LINKS = """
+INSERT INTO {links} (id, product_id, {fk}, created_at)
+SELECT gen_random_uuid(), p.id, t.id, now()
+FROM {staging} i JOIN shop_products p ON p.sku = i.sku JOIN {table} t ON t.name = i.name
+ON CONFLICT ON CONSTRAINT {constraint} DO NOTHING
+"""
+
+_MERGE_IMAGES = """
+INSERT INTO shop_product_images (id, product_id, url, position, created_at)
+SELECT gen_random_uuid(), p.id, i.url, i.position, now()
+FROM import_images i JOIN shop_products p ON p.sku = i.sku
+WHERE NOT EXISTS (SELECT 1 FROM shop_product_images x WHERE x.product_id = p.id)
+RETURNING id, url
+"""
+
+
+def _copy(db: Session, table: str, columns: tuple[str, ...], rows) -> None:
+    raw = db.connection().connection.driver_connection
+    with raw.cursor() as cursor:
+        with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+class CatalogImporter:
+    def __init__(self, *, batch_size: int = BATCH_SIZE, image_concurrency: int = IMAGE_CONCURRENCY) -> None:
+        self.batch_size = batch_size
+        self.image_concurrency = image_concurrency
+
+    def run(self, stream: BinaryIO, fmt: str) -> Iterator[ImportReport]:
+        """Import ``stream``, yielding the running report after every batch
+        and once more (with ``done``) at the end."""
+        from database import SessionLocal
+
+        report = ImportReport()
+        fetcher = ImageFetcher(concurrency=self.image_concurrency, max_bytes=IMAGE_MAX_BYTES)
+        try:
+            with SessionLocal() as db:
+                batch: dict[str, ImportRow] = {}
+                for line, record in read_records(stream, fmt):
+                    report.rows += 1
+                    try:
+                        row = parse_record(line, record)
+                    except ValueError as e:
+                        sku = record.get("sku") if isinstance(record, dict) else None
+                        report.error(line, sku, str(e))
+                        continue
+                    # A SKU repeated within a batch: the later row wins
+                    batch[row.sku] = row
+                    if len(batch) >= self.batch_size:
+                        self._import_batch(db, list(batch.values()), fetcher, report)
+                        batch = {}
+                        yield report
+                if batch:
+                    self._import_batch(db, list(batch.values()), fetcher, report)
+        except (UnicodeDecodeError, csv.Error) as e:
+            report.error(None, None, f"Unreadable file: {e}")
+        finally:
+            fetcher.shutdown()
+        report.done = True
+        yield report
+
+    def _import_batch(self, db: Session, rows: list[ImportRow], fetcher: ImageFetcher, report: ImportReport) -> None:
+        from storage.derivatives import image_pipeline
+
+        try:
+            with metrics.timer("catalog.import.batch"):
+                image_ids = self._merge(db, rows, fetcher, report)
+                bump_catalog_version(db)
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            metrics.incr("catalog.import.batch_failed")
+            for row in rows:
+                report.error(row.line, row.sku, f"batch failed: {e}")
+            return
+        if image_ids:
+            image_pipeline.enqueue(ProductImage, image_ids, on_update=bump_catalog_version)
+
+    def _merge(self, db: Session, rows: list[ImportRow], fetcher: ImageFetcher, report: ImportReport) -> list:
+        # Downloads happen before taking the lock so concurrent imports only wait on the merge
+        fetched = self._fetch_images(db, rows, fetcher, report)
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext('shop_catalog_import'))"))
+
+        for statement in _STAGING.strip().split(";\n"):
+            db.execute(text(statement))
+        _copy(db, "import_products", ("sku", "name", "description", "gender", "price_cents", "is_active"), (
+            (r.sku, r.name, r.description, r.gender, r.price_cents, r.is_active) for r in rows
+        ))
+        _copy(db, "import_variants", ("sku", "size", "color", "stock"), (
+            (r.sku, size, color, r.stock) for r in rows for size in r.sizes for color in (r.colors or [None])
+        ))
+        _copy(db, "import_tags", ("sku", "name"), ((r.sku, name) for r in rows for name in r.tags))
+        _copy(db, "import_collections", ("sku", "name"), ((r.sku, name) for r in rows for name in r.collections))
+        _copy(db, "import_images", ("sku", "position", "url"), (
+            (r.sku, position, image.url)
+            for r in rows
+            for position, image in enumerate(i for i in (fetched.get(u) for u in r.image_urls) if isinstance(i, FetchedImage))
+        ))
+
+        report.products_updated += db.execute(text(_UPDATE_PRODUCTS)).rowcount
+        report.products_created += db.execute(text(_INSERT_PRODUCTS)).rowcount
+        self._report_below_held(db, rows, report)
+        report.variants_restocked += db.execute(text(_RESTOCK_VARIANTS)).rowcount
+        report.variants_created += db.execute(text(_MERGE_VARIANTS)).rowcount
+        for table, staging, links, fk, constraint, counter in (
+            ("shop_tags", "import_tags", "shop_product_tags", "tag_id", "uq_product_tag", "tags_created"),
+            ("shop_collections", "import_collections", "shop_product_collections", "collection_id", "uq_product_collection", "collections_created"),
+        ):
+            names = db.execute(text(_MERGE_NAMES.format(table=table, staging=staging))).rowcount
+            setattr(report, counter, getattr(report, counter) + names)
+            db.execute(text(_MERGE_LINKS.format(links=links, fk=fk, staging=staging, table=table, constraint=constraint)))
+
+        attached = db.execute(text(_MERGE_IMAGES)).all()
+        report.images_attached += len(attached)
+        self._store_images(db, attached, {i.url: i for i in fetched.values() if isinstance(i, FetchedImage)})
+        return [image_id for image_id, _ in attached]
+
+    def _report_below_held(self, db: Session, rows: list[ImportRow], report: ImportReport) -> None:
+        # Stock below the held units would oversell pending orders; the rest of the row still applies
+        lines = {r.sku: r.line for r in rows}
+        for sku, size, color, stock, held in db.execute(text(_LOCK_RESTOCKED_VARIANTS)):
+            if stock < held:
+                report.variants_below_held += 1
+                variant = f"{size}/{color}" if color else size
+                report.error(lines.get(sku), sku, f"stock {stock} for {variant} is below held quantity ({held})", row_failed=False)
+
+    def _fetch_images(self, db: Session, rows: list[ImportRow], fetcher: ImageFetcher, report: ImportReport) -> dict[str, FetchedImage | str]:
+        wanted = [r for r in rows if r.image_urls]
+        if not wanted:
+            return {}
+        # Images are only attached to products without any, so skip fetching the rest
+        has_images = set(db.execute(
+            select(Product.sku).where(Product.sku.in_([r.sku for r in wanted]), Product.images.any())
+        ).scalars())
+        urls = list(dict.fromkeys(u for r in wanted if r.sku not in has_images for u in r.image_urls))
+        if not urls:
+            return {}
+        fetched = fetcher.fetch(db, urls)
+        for r in wanted:
+            for u in r.image_urls:
+                if isinstance(fetched.get(u), str):
+                    report.images_failed += 1
+                    report.error(r.line, r.sku, f"image {u}: {fetched[u]}", row_failed=False)
+        return fetched
+
+    def _store_images(self, db: Session, attached: list, images: dict[str, FetchedImage]) -> None:
+        """Reference the attached images in the blob index (one upsert, rows
+        locked until commit) and upload only bytes it doesn't hold yet."""
+        from storage.dedup import Blob, blob_index
+        from storage.minio_service import get_minio_service, get_upload_executor
+
+        if not attached:
+            return
+        storage = get_minio_service()
+        storage.ensure_ready()
+        bucket = storage.get_bucket_for("product")
+        blobs = [
+            Blob(sha256=i.sha256, object_key=i.object_key, size_bytes=len(i.data), content_type=i.content_type)
+            for i in (images[url] for _, url in attached)
+        ]
+        stored = blob_index.acquire(db, bucket=bucket, blobs=blobs)
+
+        uploads: dict[str, FetchedImage] = {}
+        for image in {images[url].sha256: images[url] for _, url in attached}.values():
+            object_key, must_upload = stored[image.sha256]
+            if object_key != image.object_key:
+                # Indexed under another key since the images were fetched
+                db.execute(
+                    update(ProductImage)
+                    .where(ProductImage.id.in_([image_id for image_id, url in attached if url == image.url]))
+                    .values(url=storage.build_public_url(bucket=bucket, object_key=object_key))
+                )
+            if must_upload:
+                uploads[object_key] = image
+        metrics.incr("storage.dedup.hit", len(stored) - len(uploads))
+
+        def upload(job) -> None:
+            object_key, image = job
+            storage.put_object_from_bytes(bucket=bucket, object_key=object_key, data=image.data, content_type=image.content_type)
+
+        if uploads:
+            metrics.incr("storage.dedup.miss", len(uploads))
+            list(get_upload_executor().map(upload, uploads.items()))
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Import products from a CSV or JSONL file.")
+    parser.add_argument("path", help="file to import ('-' for stdin)")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension (.jsonl/.ndjson, else csv)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    importer = CatalogImporter(batch_size=args.batch_size)
+    fmt = args.format or detect_format(args.path)
+    stream = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    with stream:
+        for progress in importer.run(stream, fmt):
+            summary = progress.as_dict()
+            if not progress.done:
+                summary.pop("errors")
+            print(json.dumps(summary, indent=2 if progress.done else None), flush=True)
@@ -0,0 +1,339 @@
+"""
+Bulk stock and price updates.
+
+Warehouse syncs send tens of thousands of changes at once, one JSON object
+per line:
+
+- ``{"variant_id": ..., "stock_quantity": 12}``
+- ``{"sku": "TEE-001", "size": "M", "color": "black", "stock_quantity": 12}``
+- ``{"sku": "TEE-001", "price_cents": 1799}`` (or ``product_id``)
+
+Prices are per product, so a variant line with ``price_cents`` reprices
+the variant's product. The body is read as it arrives and applied in
+batches of ``BULK_UPDATE_BATCH_SIZE`` lines, each in its own transaction:
+the targets are resolved with one lookup per key kind, then one ``UPDATE
+... FROM (VALUES ...)`` per table writes the rows whose value actually
+changed. The catalog version is bumped once at the end, if anything
+changed.
+
+Every line gets a result: ``updated``, ``unchanged``, ``not_found``,
+``invalid`` or ``superseded`` (a later line in the same batch changes the
+same variant or product). A stock level below the variant's held quantity
+(units reserved by pending orders) is rejected as ``invalid`` rather than
+applied, together with any price on the same line, as are lines longer
+than ``BULK_UPDATE_MAX_LINE_BYTES``.
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+from uuid import UUID
+
+from sqlalchemy import Integer, column, func, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PGUUID
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .catalog import bump_catalog_version
+from .models import Product, ProductVariant
+
+
+@dataclass(slots=True)
+class Change:
+    line: int
+    variant_id: UUID | None = None
+    product_id: UUID | None = None
+    sku: str | None = None
+    size: str | None = None
+    color: str | None = None
+    stock_quantity: int | None = None
+    price_cents: int | None = None
+
+
+@dataclass(slots=True)
+class BulkUpdateReport:
+    updated: int = 0
+    unchanged: int = 0
+    not_found: int = 0
+    invalid: int = 0
+    superseded: int = 0
+    results: list[dict] = field(default_factory=list)
+
+    def add(self, line: int, status: str, error: str | None = None) -> None:
+        setattr(self, status, getattr(self, status) + 1)
+        result = {"line": line, "status": status}
+        if error:
+            result["error"] = error
+        self.results.append(result)
+
+    def as_dict(self) -> dict:
+        return {
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "not_found": self.not_found,
+            "invalid": self.invalid,
+            "superseded": self.superseded,
+            "results": self.results,
+        }
+
+
+def _count(data: dict, key: str) -> int | None:
+    value = data.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"{key} must be a non-negative integer")
+    return value
+
+
+def parse_change(line: int, raw: bytes) -> Change:
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        raise ValueError("Invalid JSON")
+    if not isinstance(data, dict):
+        raise ValueError("Expected an object")
+    change = Change(
+        line=line,
+        sku=data.get("sku") or None,
+        size=data.get("size") or None,
+        color=data.get("color") or None,
+        stock_quantity=_count(data, "stock_quantity"),
+        price_cents=_count(data, "price_cents"),
+    )
+    try:
+        change.variant_id = UUID(data["variant_id"]) if data.get("variant_id") else None
+        change.product_id = UUID(data["product_id"]) if data.get("product_id") else None
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError("variant_id/product_id must be UUIDs")
+    if change.stock_quantity is None and change.price_cents is None:
+        raise ValueError("stock_quantity or price_cents is required")
+    if change.variant_id is None and change.product_id is None and change.sku is None:
+        raise ValueError("variant_id, product_id or sku is required")
+    if change.stock_quantity is not None and change.variant_id is None and change.size is None:
+        raise ValueError("stock_quantity needs variant_id or sku with size")
+    return change
+
+
+def _new_values(name: str, key_type, rows: dict):
+    return values(column("id", key_type), column("value", Integer), name=name).data(sorted(rows.items()))
+
+
+class BulkUpdater:
+    def __init__(self, *, batch_size: int, max_line_bytes: int) -> None:
+        self.batch_size = batch_size
+        self.max_line_bytes = max_line_bytes
+
+    async def apply_stream(self, chunks: AsyncIterator[bytes]) -> BulkUpdateReport:
+        """Apply NDJSON changes from ``chunks`` (e.g. ``request.stream()``),
+        one transaction per batch, and bump the catalog version once."""
+        from fastapi.concurrency import run_in_threadpool
+
+        report = BulkUpdateReport()
+        batch: list[Change] = []
+        changed = False
+        try:
+            async for line, raw in _lines(chunks, self.max_line_bytes):
+                if raw is None:
+                    report.add(line, "invalid", "Line too long")
+                    continue
+                try:
+                    batch.append(parse_change(line, raw))
+                except ValueError as e:
+                    report.add(line, "invalid", str(e))
+                if len(batch) >= self.batch_size:
+                    changed |= await run_in_threadpool(self._apply_in_session, batch, report)
+                    batch = []
+            if batch:
+                changed |= await run_in_threadpool(self._apply_in_session, batch, report)
+        finally:
+            # Once, after every batch, so caches rebuild a single time
+            if changed:
+                await run_in_threadpool(self._bump_version)
+        report.results.sort(key=lambda r: r["line"])
+        return report
+
+    def _apply_in_session(self, batch: list[Change], report: BulkUpdateReport) -> bool:
+        from database import SessionLocal
+
+        with SessionLocal() as db:
+            try:
+                with metrics.timer("catalog.bulk_update.batch"):
+                    results = self.apply(db, batch)
+                    db.commit()
+            except Exception as e:
+                db.rollback()
+                metrics.incr("catalog.bulk_update.batch_failed")
+                print(f"Warning: bulk update batch failed: {e}")
+                for c in batch:
+                    report.add(c.line, "invalid", f"batch failed: {e}")
+                return False
+        for line, status, error in results:
+            report.add(line, status, error)
+        return any(status == "updated" for _, status, _ in results)
+
+    def _bump_version(self) -> None:
+        from database import SessionLocal
+
+        with SessionLocal() as db:
+            bump_catalog_version(db)
+            db.commit()
+
+    def apply(self, db: Session, changes: list[Change]) -> list[tuple[int, str, str | None]]:
+        """Apply one batch without committing. Returns (line, status, error) triples."""
+        variants, products = self._resolve(db, changes)
+
+        # Last line wins per target; earlier ones are superseded
+        stock: dict[UUID, tuple[int, int]] = {}
+        prices: dict[UUID, tuple[int, int]] = {}
+        superseded: set[int] = set()
+        missing: set[int] = set()
+        for c in changes:
+            variant_id, product_id = variants.get(c.line), products.get(c.line)
+            if (c.stock_quantity is not None and variant_id is None) or (c.price_cents is not None and product_id is None):
+                missing.add(c.line)
+                continue
+            if c.stock_quantity is not None:
+                if variant_id in stock:
+                    superseded.add(stock[variant_id][0])
+                stock[variant_id] = (c.line, c.stock_quantity)
+            if c.price_cents is not None:
+                if product_id in prices:
+                    superseded.add(prices[product_id][0])
+                prices[product_id] = (c.line, c.price_cents)
+
+        changed_lines: set[int] = set()
+        below_held: set[int] = set()
+        if stock:
+            # Row locks in id order, like inventory holds, so concurrent orders can't deadlock with a sync
+            held = dict(db.execute(
+                select(ProductVariant.id, ProductVariant.held_quantity)
+                .where(ProductVariant.id.in_(list(stock)))
+                .order_by(ProductVariant.id)
+                .with_for_update()
+            ).all())
+            # Held units are already promised to orders; dropping stock under them would oversell
+            for variant_id, (line, value) in list(stock.items()):
+                if value < held.get(variant_id, 0):
+                    below_held.add(line)
+                    del stock[variant_id]
+            # A rejected line is rejected whole, including any price it carries
+            for product_id, (line, _) in list(prices.items()):
+                if line in below_held:
+                    del prices[product_id]
+        if stock:
+            wanted = _new_values("wanted_stock", PGUUID(as_uuid=True), {k: v for k, (_, v) in stock.items()})
+            updated = db.execute(
+                update(ProductVariant)
+                .where(ProductVariant.id == wanted.c.id, ProductVariant.stock_quantity != wanted.c.value)
+                .values(stock_quantity=wanted.c.value)
+                .returning(ProductVariant.id)
+            ).scalars().all()
+            changed_lines.update(stock[v][0] for v in updated)
+        if prices:
+            wanted = _new_values("wanted_prices", PGUUID(as_uuid=True), {k: v for k, (_, v) in prices.items()})
+            db.execute(select(Product.id).where(Product.id.in_(list(prices))).order_by(Product.id).with_for_update())
+            updated = db.execute(
+                update(Product)
+                .where(Product.id == wanted.c.id, Product.price_cents != wanted.c.value)
+                .values(price_cents=wanted.c.value, updated_at=func.now())
+                .returning(Product.id)
+            ).scalars().all()
+            changed_lines.update(prices[p][0] for p in updated)
+
+        metrics.incr("catalog.bulk_update.rows", len(changes))
+        results = []
+        for c in changes:
+            if c.line in missing:
+                results.append((c.line, "not_found", None))
+            elif c.line in below_held:
+                results.append((c.line, "invalid", "below held quantity"))
+            elif c.line in changed_lines:
+                results.append((c.line, "updated", None))
+            elif c.line in superseded:
+                results.append((c.line, "superseded", None))
+            else:
+                results.append((c.line, "unchanged", None))
+        return results
+
+    def _resolve(self, db: Session, changes: list[Change]) -> tuple[dict[int, UUID], dict[int, UUID]]:
+        """Line -> variant id and line -> product id, with one query per key kind."""
+        by_variant = {c.variant_id for c in changes if c.variant_id}
+        by_product = {c.product_id for c in changes if c.product_id and not c.variant_id}
+        by_sku = {c.sku for c in changes if c.sku and not c.variant_id and not c.product_id}
+
+        variant_products: dict[UUID, UUID] = dict(db.execute(
+            select(ProductVariant.id, ProductVariant.product_id).where(ProductVariant.id.in_(by_variant))
+        ).all()) if by_variant else {}
+        sku_products: dict[str, UUID] = dict(db.execute(
+            select(Product.sku, Product.id).where(Product.sku.in_(by_sku))
+        ).all()) if by_sku else {}
+        known_products = set(db.execute(
+            select(Product.id).where(Product.id.in_(by_product))
+        ).scalars()) if by_product else set()
+
+        products: dict[int, UUID] = {}
+        for c in changes:
+            if c.variant_id:
+                product_id = variant_products.get(c.variant_id)
+            elif c.product_id:
+                product_id = c.product_id if c.product_id in known_products else None
+            else:
+                product_id = sku_products.get(c.sku)
+            if product_id is not None:
+                products[c.line] = product_id
+
+        keyed = [c for c in changes if not c.variant_id and c.size and c.line in products]
+        options: dict[tuple[UUID, str, str | None], UUID] = {}
+        if keyed:
+            rows = db.execute(
+                select(ProductVariant.id, ProductVariant.product_id, ProductVariant.size, ProductVariant.color)
+                .where(ProductVariant.product_id.in_({products[c.line] for c in keyed}))
+            ).all()
+            options = {(product_id, size, color): variant_id for variant_id, product_id, size, color in rows}
+
+        variants: dict[int, UUID] = {}
+        for c in changes:
+            if c.variant_id:
+                if c.variant_id in variant_products:
+                    variants[c.line] = c.variant_id
+            elif c.size and c.line in products:
+                variant_id = options.get((products[c.line], c.size, c.color))
+                if variant_id is not None:
+                    variants[c.line] = variant_id
+        return variants, products
+
+
+async def _lines(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[tuple[int, bytes | None]]:
+    """Non-blank (line number, bytes) pairs from a chunked NDJSON body.
+
+    A line longer than ``max_bytes`` is yielded once as ``None`` and the rest
+    of it is discarded as it arrives, so memory stays bounded."""
+    pending = b""
+    line_no = 0
+    skipping = False
+    async for chunk in chunks:
+        pending += chunk
+        *complete, pending = pending.split(b"\n")
+        for raw in complete:
+            line_no += 1
+            if skipping:
+                skipping = False
+            elif len(raw) > max_bytes:
+                yield line_no, None
+            elif raw.strip():
+                yield line_no, raw
+        if len(pending) > max_bytes:
+            if not skipping:
+                skipping = True
+                yield line_no + 1, None
+            pending = b""
+    if pending.strip() and not skipping:
+        yield line_no + 1, pending
+
+
+bulk_updater = BulkUpdater(
+    batch_size=int(os.getenv("BULK_UPDATE_BATCH_SIZE", "1000")),
+    max_line_bytes=int(os.getenv("BULK_UPDATE_MAX_LINE_BYTES", "65536")),
+)
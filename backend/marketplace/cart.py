@@ -0,0 +1,267 @@
+"""
+Server-side shopping carts.
+
+A cart is a small JSON document per user in a key-value store, not in
+Postgres. Each line keeps a snapshot of the product's name and price
+taken from the in-memory catalog snapshot, so reading or editing a cart
+costs a store round trip plus dictionary lookups. When the catalog version
+moves on, the snapshots are refreshed from the new catalog snapshot on the
+next read. Availability comes from the snapshot's stock map, which follows
+holds and payments through the separate stock counter, so it is current
+as of the last version check without a query of its own.
+
+Checkout revalidates every line in one query (``create_order`` with the
+cart's prices): changed prices are written back to the cart and reported
+instead of silently charging a different amount, and stock is held
+atomically as for any other order.
+
+``CART_STORE`` picks the store: ``memory`` (default, per process, so only
+for a single API process) or ``redis`` for any Redis-protocol server
+(Redis, Valkey, ...) at ``CART_REDIS_URL``. The store is created when the
+API starts, so a bad configuration fails the boot.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .catalog import CatalogSnapshot, catalog
+from .inventory import OutOfStock
+from .models import Order
+from .service import MarketplaceService, PriceChanged
+
+
+@dataclass(slots=True)
+class CartLine:
+    product_id: UUID
+    variant_id: UUID | None
+    quantity: int
+    name: str
+    unit_price_cents: int
+    # Units available when the cart was last read (None: product has no variants)
+    available_quantity: int | None
+
+
+@dataclass(slots=True)
+class Cart:
+    lines: list[CartLine] = field(default_factory=list)
+    catalog_version: int = 0
+
+    @property
+    def total_cents(self) -> int:
+        return sum(line.unit_price_cents * line.quantity for line in self.lines)
+
+    def find(self, product_id: UUID, variant_id: UUID | None) -> CartLine | None:
+        for line in self.lines:
+            if line.product_id == product_id and line.variant_id == variant_id:
+                return line
+        return None
+
+    def dumps(self) -> bytes:
+        data = asdict(self)
+        for line in data["lines"]:
+            line["product_id"] = str(line["product_id"])
+            line["variant_id"] = str(line["variant_id"]) if line["variant_id"] else None
+        return json.dumps(data, separators=(",", ":")).encode()
+
+    @classmethod
+    def loads(cls, raw: bytes) -> "Cart":
+        data = json.loads(raw)
+        lines = [
+            CartLine(**{**line, "product_id": UUID(line["product_id"]), "variant_id": UUID(line["variant_id"]) if line["variant_id"] else None})
+            for line in data["lines"]
+        ]
+        return cls(lines=lines, catalog_version=data["catalog_version"])
+
+
+class MemoryCartStore:
+    """Per-process store with a TTL and an LRU bound."""
+
+    def __init__(self, *, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisCartStore:
+    """Store on a Redis-protocol server, shared by all API processes."""
+
+    def __init__(self, *, url: str, ttl_seconds: int, timeout: float) -> None:
+        import redis
+
+        self.ttl_seconds = ttl_seconds
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(f"cart:{key}")
+
+    def put(self, key: str, value: bytes) -> None:
+        self._client.set(f"cart:{key}", value, ex=self.ttl_seconds)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(f"cart:{key}")
+
+
+def _build_store():
+    ttl = int(os.getenv("CART_TTL_SECONDS", str(7 * 24 * 3600)))
+    if os.getenv("CART_STORE", "memory") == "redis":
+        return RedisCartStore(
+            url=os.getenv("CART_REDIS_URL", "redis://127.0.0.1:6379/0"),
+            ttl_seconds=ttl,
+            timeout=float(os.getenv("CART_REDIS_TIMEOUT_SECONDS", "0.5")),
+        )
+    return MemoryCartStore(ttl_seconds=ttl, max_entries=int(os.getenv("CART_MAX_ENTRIES", "100000")))
+
+
+class CartService:
+    def __init__(self, store=None) -> None:
+        self._store = store
+        self._store_lock = threading.Lock()
+        self._orders = MarketplaceService()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._store = _build_store()
+        return self._store
+
+    def get(self, db: Session, *, user_id: UUID) -> Cart:
+        cart = self._load(user_id)
+        snapshot = catalog.get(db)
+        changed = False
+        if cart.catalog_version != snapshot.version:
+            self._refresh(cart, snapshot)
+            changed = True
+        changed |= self._refresh_stock(cart, snapshot)
+        if changed and cart.lines:
+            self._save(user_id, cart)
+        return cart
+
+    def set_item(self, db: Session, *, user_id: UUID, product_id: UUID, variant_id: UUID | None, quantity: int, add: bool = False) -> Cart:
+        """Set (or with ``add``, increase) a line's quantity; 0 removes it.
+        Raises ValueError for products not on sale or invalid variants and
+        OutOfStock when fewer units are available."""
+        cart = self.get(db, user_id=user_id)
+        line = cart.find(product_id, variant_id)
+        if add and line is not None:
+            quantity += line.quantity
+        if quantity <= 0:
+            if line is not None:
+                cart.lines.remove(line)
+                self._save(user_id, cart)
+            return cart
+
+        snapshot = catalog.get(db)
+        product = snapshot.get(product_id)
+        if product is None:
+            raise ValueError(f"Product {product_id} is not available")
+        if variant_id is None:
+            if product.variants:
+                raise ValueError(f"Choose a size/color for product {product_id}")
+        elif not any(v.id == variant_id for v in product.variants):
+            raise ValueError(f"Variant {variant_id} does not belong to product {product_id}")
+        available = snapshot.available(variant_id) if variant_id is not None else None
+        if available is not None and quantity > available:
+            raise OutOfStock([variant_id])
+
+        if line is None:
+            line = CartLine(product_id=product_id, variant_id=variant_id, quantity=quantity, name=product.name, unit_price_cents=product.price_cents, available_quantity=available)
+            cart.lines.append(line)
+        else:
+            line.quantity = quantity
+            line.name, line.unit_price_cents, line.available_quantity = product.name, product.price_cents, available
+        self._save(user_id, cart)
+        return cart
+
+    def clear(self, *, user_id: UUID) -> None:
+        self.store.delete(str(user_id))
+
+    def checkout(self, db: Session, *, user_id: UUID) -> Order:
+        """Turn the cart into a pending order and empty it. Raises
+        PriceChanged (after updating the cart's prices) when any price moved
+        since it was added, plus everything ``create_order`` raises."""
+        cart = self._load(user_id)
+        if not cart.lines:
+            raise ValueError("Cart is empty")
+        try:
+            order = self._orders.create_order(
+                db,
+                user_id=user_id,
+                items=[(line.product_id, line.variant_id, line.quantity) for line in cart.lines],
+                expected_prices={line.product_id: line.unit_price_cents for line in cart.lines},
+            )
+        except PriceChanged as e:
+            for line in cart.lines:
+                line.unit_price_cents = e.prices.get(line.product_id, line.unit_price_cents)
+            self._save(user_id, cart)
+            raise
+        self.clear(user_id=user_id)
+        metrics.incr("cart.checkouts")
+        return order
+
+    def _refresh(self, cart: Cart, snapshot: CatalogSnapshot) -> None:
+        lines = []
+        for line in cart.lines:
+            product = snapshot.get(line.product_id)
+            if product is None:
+                # No longer on sale
+                continue
+            line.name = product.name
+            line.unit_price_cents = product.price_cents
+            lines.append(line)
+        cart.lines = lines
+        cart.catalog_version = snapshot.version
+
+    def _refresh_stock(self, cart: Cart, snapshot: CatalogSnapshot) -> bool:
+        """Set each line's current availability. Returns whether any changed."""
+        changed = False
+        for line in cart.lines:
+            if line.variant_id is None:
+                continue
+            available = snapshot.available(line.variant_id)
+            if line.available_quantity != available:
+                line.available_quantity = available
+                changed = True
+        return changed
+
+    def _load(self, user_id: UUID) -> Cart:
+        raw = self.store.get(str(user_id))
+        return Cart.loads(raw) if raw else Cart()
+
+    def _save(self, user_id: UUID, cart: Cart) -> None:
+        self.store.put(str(user_id), cart.dumps())
+
+
+cart_service = CartService()
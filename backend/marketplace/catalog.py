@@ -0,0 +1,308 @@
+"""
+In-process snapshot of the storefront catalog.
+
+Active products change only when admins edit them, so each process keeps
+an immutable snapshot of them (already shaped as ``ProductOut``) plus
+per-facet posting bitsets (gender, size, color, tag, collection, price
+bucket) and pre-sorted orders, and answers ``GET /marketplace/products``
+and the faceted browse from memory: filters and facet counts are bitwise
+ANDs/ORs and popcounts.
+
+Admin writes call ``bump_catalog_version`` inside their transaction. Readers
+compare the shared counter (at most every ``CATALOG_VERSION_CHECK_SECONDS``)
+with the snapshot's version and rebuild on change; the new snapshot is
+swapped in with a single reference assignment, so requests always see a
+complete catalog.
+
+Stock moves with every order, hold expiry and payment, far more often than
+the catalog, so inventory bumps a separate ``stock_version`` counter
+(``bump_stock_version``) instead. The same periodic check reads both
+counters; when only stock moved, just the snapshot's variant -> (stock,
+available) map is reloaded with one query, and ``with_stock`` overlays it
+onto the page being served. Listings still don't query Postgres between
+changes.
+"""
+
+import bisect
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .models import CatalogVersion, Product, ProductVariant
+from .pagination import comparable, sort_values
+from .schemas import ProductOut
+
+
+SORTS = ("newest", "price_asc", "price_desc")
+
+
+def bump_catalog_version(db: Session) -> None:
+    """Mark the catalog as changed. Does not commit: the bump lands with
+    the caller's write, so readers never rebuild from half-applied edits."""
+    stmt = (
+        insert(CatalogVersion)
+        .values(id=1, version=1, updated_at=datetime.utcnow())
+        .on_conflict_do_update(
+            index_elements=[CatalogVersion.id],
+            set_={"version": CatalogVersion.version + 1, "updated_at": datetime.utcnow()},
+        )
+    )
+    db.execute(stmt)
+    # Skip the check interval in this process; others notice within it
+    catalog.invalidate()
+
+
+def bump_stock_version(db: Session) -> None:
+    """Mark variant stock or holds as changed. Does not commit, like
+    ``bump_catalog_version``; only the stock map is reloaded."""
+    stmt = (
+        insert(CatalogVersion)
+        .values(id=1, version=0, stock_version=1, updated_at=datetime.utcnow())
+        .on_conflict_do_update(
+            index_elements=[CatalogVersion.id],
+            set_={"stock_version": CatalogVersion.stock_version + 1},
+        )
+    )
+    db.execute(stmt)
+    catalog.invalidate()
+
+
+def read_versions(db: Session) -> tuple[int, int]:
+    """(catalog version, stock version)."""
+    row = db.execute(
+        select(CatalogVersion.version, CatalogVersion.stock_version).where(CatalogVersion.id == 1)
+    ).one_or_none()
+    return (row.version, row.stock_version) if row else (0, 0)
+
+
+def load_stock_levels(db: Session) -> dict[UUID, tuple[int, int]]:
+    """Variant id -> (stock_quantity, available_quantity) for active products."""
+    rows = db.execute(
+        select(
+            ProductVariant.id,
+            ProductVariant.stock_quantity,
+            func.greatest(ProductVariant.stock_quantity - ProductVariant.held_quantity, 0),
+        )
+        .join(Product, Product.id == ProductVariant.product_id)
+        .where(Product.is_active == True)
+    ).all()
+    return {variant_id: (stock, available) for variant_id, stock, available in rows}
+
+
+def product_out(p: Product) -> dict:
+    return {
+        "id": p.id,
+        "sku": p.sku,
+        "name": p.name,
+        "description": p.description,
+        "gender": p.gender,
+        "price_cents": p.price_cents,
+        "currency": p.currency,
+        "is_active": p.is_active,
+        "created_at": p.created_at,
+        "updated_at": p.updated_at,
+        "images": p.images,
+        "variants": p.variants,
+        "tag_names": [link.tag.name for link in p.tags],
+        "collection_names": [link.collection.name for link in p.collections],
+    }
+
+
+def _parse_buckets(value: str) -> tuple[int, ...]:
+    return tuple(sorted(int(v) for v in value.split(",") if v.strip()))
+
+
+# Upper bounds (exclusive, in cents) of the price facet's buckets
+PRICE_BUCKETS = _parse_buckets(os.getenv("CATALOG_PRICE_BUCKETS", "100000,200000,500000"))
+
+
+def price_bucket(price_cents: int) -> str:
+    lower = 0
+    for upper in PRICE_BUCKETS:
+        if price_cents < upper:
+            return f"{lower}-{upper}"
+        lower = upper
+    return f"{lower}-"
+
+
+FACETS = ("gender", "size", "color", "tag", "collection", "price")
+
+
+def _facet_values(p: ProductOut) -> dict[str, set[str]]:
+    return {
+        "gender": {p.gender},
+        "size": {v.size for v in p.variants},
+        "color": {v.color for v in p.variants if v.color},
+        "tag": set(p.tag_names),
+        "collection": set(p.collection_names),
+        "price": {price_bucket(p.price_cents)},
+    }
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogSnapshot:
+    version: int
+    products: tuple[ProductOut, ...]
+    # facet -> value -> bitset of positions into ``products``
+    facets: Mapping[str, Mapping[str, int]]
+    orders: Mapping[str, tuple[int, ...]]
+    # sort -> ``comparable`` sort key of each entry of ``orders[sort]``
+    order_keys: Mapping[str, tuple[tuple, ...]]
+    # product id -> position in ``products``
+    positions: Mapping[UUID, int]
+    stock_version: int = 0
+    # variant id -> (stock_quantity, available_quantity), newer than ``products`` after a stock reload
+    stock: Mapping[UUID, tuple[int, int]] = MappingProxyType({})
+
+    @classmethod
+    def build(cls, version: int, products: list[Product], *, stock_version: int = 0) -> "CatalogSnapshot":
+        items = tuple(ProductOut.model_validate(product_out(p)) for p in products)
+        postings: dict[str, dict[str, int]] = {f: {} for f in FACETS}
+        for pos, p in enumerate(items):
+            bit = 1 << pos
+            for facet, values in _facet_values(p).items():
+                index = postings[facet]
+                for value in values:
+                    index[value] = index.get(value, 0) | bit
+
+        # Same full keys (ending with the id) as the SQL listing, so cursors work on both
+        orders, order_keys = {}, {}
+        for sort in SORTS:
+            keyed = sorted((comparable(sort, sort_values(sort, p)), i) for i, p in enumerate(items))
+            orders[sort] = tuple(i for _, i in keyed)
+            order_keys[sort] = tuple(k for k, _ in keyed)
+        return cls(
+            version=version,
+            products=items,
+            facets=MappingProxyType({f: MappingProxyType(v) for f, v in postings.items()}),
+            orders=MappingProxyType(orders),
+            order_keys=MappingProxyType(order_keys),
+            positions=MappingProxyType({p.id: pos for pos, p in enumerate(items)}),
+            stock_version=stock_version,
+            stock=MappingProxyType({v.id: (v.stock_quantity, v.available_quantity) for p in items for v in p.variants}),
+        )
+
+    def get(self, product_id: UUID) -> ProductOut | None:
+        pos = self.positions.get(product_id)
+        return None if pos is None else self.products[pos]
+
+    def available(self, variant_id: UUID) -> int:
+        return self.stock.get(variant_id, (0, 0))[1]
+
+    def with_stock(self, products: list[ProductOut]) -> list[ProductOut]:
+        """``products`` with the current stock map applied. Entries are shared
+        between requests, so changed ones are copied rather than edited."""
+        result = []
+        for p in products:
+            variants = [
+                v if (level := self.stock.get(v.id)) is None or level == (v.stock_quantity, v.available_quantity)
+                else v.model_copy(update={"stock_quantity": level[0], "available_quantity": level[1]})
+                for v in p.variants
+            ]
+            changed = any(new is not old for new, old in zip(variants, p.variants))
+            result.append(p.model_copy(update={"variants": variants}) if changed else p)
+        return result
+
+    @property
+    def everything(self) -> int:
+        return (1 << len(self.products)) - 1
+
+    def match(self, filters: Mapping[str, list[str]], *, exclude: str | None = None) -> int:
+        """Bitset of products matching ``filters``: values within a facet are
+        OR-ed, facets are AND-ed. ``exclude`` skips one facet's own filter."""
+        bits = self.everything
+        for facet, values in filters.items():
+            if facet == exclude or not values:
+                continue
+            index = self.facets.get(facet, {})
+            union = 0
+            for value in values:
+                union |= index.get(value, 0)
+            bits &= union
+        return bits
+
+    def counts(self, filters: Mapping[str, list[str]]) -> dict[str, dict[str, int]]:
+        """Per-facet value counts. Each facet is counted against the other
+        facets' filters only, so selecting "M" still shows how many are "L"."""
+        result: dict[str, dict[str, int]] = {}
+        for facet, index in self.facets.items():
+            base = self.match(filters, exclude=facet)
+            result[facet] = {value: n for value, posting in index.items() if (n := (posting & base).bit_count())}
+        return result
+
+    def page(self, bits: int, *, sort: str | None, limit: int, offset: int = 0, after: tuple | None = None) -> list[ProductOut]:
+        """Up to ``limit`` products in ``bits``, skipping ``offset`` of them
+        or, with ``after`` (a decoded cursor), starting after that key."""
+        sort = sort if sort in SORTS else "newest"
+        order = self.orders[sort]
+        if after is not None:
+            order = order[bisect.bisect_right(self.order_keys[sort], comparable(sort, after)):]
+            offset = 0
+        limit, offset = max(limit, 0), max(offset, 0)
+        if bits == self.everything:
+            return [self.products[i] for i in order[offset:offset + limit]]
+        matched = (i for i in order if bits >> i & 1)
+        return [self.products[i] for i in itertools.islice(matched, offset, offset + limit)]
+
+    def query(self, *, gender: str | None, tag: str | None, collection: str | None, sort: str | None, limit: int, offset: int = 0, after: tuple | None = None) -> list[ProductOut]:
+        filters = {
+            "gender": [gender] if gender in {"men", "women"} else [],
+            "tag": [tag] if tag else [],
+            "collection": [collection] if collection else [],
+        }
+        return self.page(self.match(filters), sort=sort, limit=limit, offset=offset, after=after)
+
+
+class CatalogCache:
+    def __init__(self, *, check_interval: float) -> None:
+        self.check_interval = check_interval
+        self._snapshot: CatalogSnapshot | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        version, stock_version = read_versions(db)
+        if snapshot is not None and (snapshot.version, snapshot.stock_version) == (version, stock_version):
+            self._checked_at = time.monotonic()
+            return snapshot
+        with self._lock:
+            # Another request may have rebuilt it while we waited
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._build(db, version, stock_version)
+            elif snapshot.stock_version != stock_version:
+                # Only stock moved: keep the products, swap the stock map
+                with metrics.timer("catalog.stock_reload"):
+                    snapshot = replace(snapshot, stock_version=stock_version, stock=MappingProxyType(load_stock_levels(db)))
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def invalidate(self) -> None:
+        self._checked_at = 0.0
+
+    def _build(self, db: Session, version: int, stock_version: int) -> CatalogSnapshot:
+        from .service import catalog_loaders
+
+        with metrics.timer("catalog.rebuild"):
+            products = db.execute(
+                select(Product).where(Product.is_active == True).options(*catalog_loaders())
+            ).scalars().all()
+            return CatalogSnapshot.build(version, products, stock_version=stock_version)
+
+
+catalog = CatalogCache(check_interval=float(os.getenv("CATALOG_VERSION_CHECK_SECONDS", "1")))
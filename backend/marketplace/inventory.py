@@ -0,0 +1,228 @@
+"""
+Time-limited inventory holds.
+
+Placing an order does not sell stock yet; it holds it. Each (order,
+variant) hold is a row in ``shop_inventory_holds`` with an expiry, and
+``ProductVariant.held_quantity`` carries the running total so
+available-to-sell is ``stock_quantity - held_quantity`` on the variant row,
+with no aggregation.
+
+- ``hold`` takes holds with one conditional UPDATE that only succeeds for
+  variants with enough available stock (locking just those rows, in id
+  order).
+- ``convert`` turns an order's holds into a real stock decrement when the
+  payment succeeds.
+- ``release`` gives an order's holds back (cancellation), and
+  ``release_expired`` does the same in bulk for holds past their expiry;
+  the API runs it every ``INVENTORY_SWEEP_INTERVAL_SECONDS``.
+
+Each of these bumps the catalog's ``stock_version`` (not the catalog
+version) in the same transaction, so the in-process catalog snapshot
+reloads its stock map instead of rebuilding.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import Integer, column, delete, func, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PGUUID
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .catalog import bump_stock_version
+from .models import InventoryHold, OrderItem, ProductVariant
+
+
+class OutOfStock(ValueError):
+    """Raised when one or more variants can't cover the requested quantity."""
+
+    def __init__(self, variant_ids: list[UUID]) -> None:
+        super().__init__("Not enough stock")
+        self.variant_ids = variant_ids
+
+
+def _quantities(quantities: dict[UUID, int]):
+    return values(column("id", PGUUID(as_uuid=True)), column("qty", Integer), name="wanted").data(
+        sorted(quantities.items())
+    )
+
+
+def _locked(variant_ids):
+    """Lock just these variants, in id order, so concurrent orders, payments
+    and the sweeper touching overlapping variants can't deadlock."""
+    return (
+        select(ProductVariant.id)
+        .where(ProductVariant.id.in_(list(variant_ids)))
+        .order_by(ProductVariant.id)
+        .with_for_update()
+        .cte("locked")
+    )
+
+
+class Inventory:
+    def __init__(self, *, hold_ttl_seconds: int, sweep_batch_size: int) -> None:
+        self.hold_ttl = timedelta(seconds=hold_ttl_seconds)
+        self.sweep_batch_size = sweep_batch_size
+
+    def hold(self, db: Session, *, order_id: UUID, quantities: dict[UUID, int]) -> datetime:
+        """Hold ``quantities`` (variant id -> units) for ``order_id``.
+
+        Does not commit. On shortage the transaction is rolled back and
+        OutOfStock lists the variants that could not be held. Returns the
+        expiry of the new holds.
+        """
+        wanted = _quantities(quantities)
+        locked = _locked(quantities)
+        held = set(db.execute(
+            update(ProductVariant)
+            .where(
+                ProductVariant.id == wanted.c.id,
+                ProductVariant.id.in_(select(locked.c.id)),
+                ProductVariant.stock_quantity - ProductVariant.held_quantity >= wanted.c.qty,
+            )
+            .values(held_quantity=ProductVariant.held_quantity + wanted.c.qty)
+            .returning(ProductVariant.id)
+        ).scalars())
+        short = [vid for vid in quantities if vid not in held]
+        if short:
+            db.rollback()
+            metrics.incr("inventory.hold_rejected")
+            raise OutOfStock(short)
+        expires_at = datetime.now(timezone.utc) + self.hold_ttl
+        db.add_all([
+            InventoryHold(order_id=order_id, variant_id=vid, quantity=qty, expires_at=expires_at)
+            for vid, qty in quantities.items()
+        ])
+        bump_stock_version(db)
+        metrics.incr("inventory.holds_created", len(quantities))
+        return expires_at
+
+    def extend(self, db: Session, *, order_id: UUID) -> None:
+        """Push the expiry of an order's holds (e.g. when checkout starts).
+
+        Re-holds stock if the holds already expired, raising OutOfStock
+        (rolled back) when it is gone. Does not commit.
+        """
+        expires_at = datetime.now(timezone.utc) + self.hold_ttl
+        extended = set(db.execute(
+            update(InventoryHold)
+            .where(InventoryHold.order_id == order_id)
+            .values(expires_at=expires_at)
+            .returning(InventoryHold.variant_id)
+        ).scalars())
+        missing = {vid: qty for vid, qty in self._order_quantities(db, order_id).items() if vid not in extended}
+        if missing:
+            self.hold(db, order_id=order_id, quantities=missing)
+
+    def convert(self, db: Session, *, order_id: UUID) -> None:
+        """Payment succeeded: turn the order's holds into sold stock. Does not commit."""
+        holds = dict(db.execute(
+            delete(InventoryHold)
+            .where(InventoryHold.order_id == order_id)
+            .returning(InventoryHold.variant_id, InventoryHold.quantity)
+        ).all())
+        if holds:
+            wanted = _quantities(holds)
+            locked = _locked(holds)
+            db.execute(
+                update(ProductVariant)
+                .where(ProductVariant.id == wanted.c.id, ProductVariant.id.in_(select(locked.c.id)))
+                .values(
+                    stock_quantity=ProductVariant.stock_quantity - wanted.c.qty,
+                    held_quantity=ProductVariant.held_quantity - wanted.c.qty,
+                )
+            )
+        # Lines whose hold expired before the payment arrived are sold anyway:
+        # the customer has paid, so stock may go negative and needs attention
+        unheld = {vid: qty for vid, qty in self._order_quantities(db, order_id).items() if vid not in holds}
+        if unheld:
+            metrics.incr("inventory.paid_without_hold", len(unheld))
+            wanted = _quantities(unheld)
+            locked = _locked(unheld)
+            db.execute(
+                update(ProductVariant)
+                .where(ProductVariant.id == wanted.c.id, ProductVariant.id.in_(select(locked.c.id)))
+                .values(stock_quantity=ProductVariant.stock_quantity - wanted.c.qty)
+            )
+        if holds or unheld:
+            bump_stock_version(db)
+
+    def release(self, db: Session, *, order_id: UUID) -> None:
+        """Give back an unpaid order's holds. Does not commit."""
+        holds = db.execute(
+            delete(InventoryHold)
+            .where(InventoryHold.order_id == order_id)
+            .returning(InventoryHold.variant_id, InventoryHold.quantity)
+        ).all()
+        self._unhold(db, holds)
+
+    def release_expired(self, db: Session) -> int:
+        """Release holds past their expiry in batches. Returns how many were released."""
+        released = 0
+        while True:
+            batch = (
+                select(InventoryHold.id)
+                .where(InventoryHold.expires_at < func.now())
+                .limit(self.sweep_batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            holds = db.execute(
+                delete(InventoryHold)
+                .where(InventoryHold.id.in_(batch.scalar_subquery()))
+                .returning(InventoryHold.variant_id, InventoryHold.quantity)
+            ).all()
+            self._unhold(db, holds)
+            db.commit()
+            released += len(holds)
+            if len(holds) < self.sweep_batch_size:
+                break
+        if released:
+            metrics.incr("inventory.holds_expired", released)
+        return released
+
+    def _unhold(self, db: Session, holds) -> None:
+        per_variant: dict[UUID, int] = {}
+        for variant_id, quantity in holds:
+            per_variant[variant_id] = per_variant.get(variant_id, 0) + quantity
+        if not per_variant:
+            return
+        wanted = _quantities(per_variant)
+        locked = _locked(per_variant)
+        db.execute(
+            update(ProductVariant)
+            .where(ProductVariant.id == wanted.c.id, ProductVariant.id.in_(select(locked.c.id)))
+            .values(held_quantity=func.greatest(ProductVariant.held_quantity - wanted.c.qty, 0))
+        )
+        bump_stock_version(db)
+
+    def _order_quantities(self, db: Session, order_id: UUID) -> dict[UUID, int]:
+        rows = db.execute(
+            select(OrderItem.variant_id, func.sum(OrderItem.quantity))
+            .where(OrderItem.order_id == order_id, OrderItem.variant_id.is_not(None))
+            .group_by(OrderItem.variant_id)
+        ).all()
+        return {variant_id: int(qty) for variant_id, qty in rows}
+
+
+inventory = Inventory(
+    hold_ttl_seconds=int(os.getenv("INVENTORY_HOLD_TTL_SECONDS", str(30 * 60))),
+    sweep_batch_size=int(os.getenv("INVENTORY_SWEEP_BATCH_SIZE", "500")),
+)
+
+
+async def run_periodically(interval_seconds: int) -> None:
+    from fastapi.concurrency import run_in_threadpool
+    from database import SessionLocal
+
+    def sweep() -> int:
+        with SessionLocal() as db:
+            return inventory.release_expired(db)
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(sweep)
+        except Exception as e:
+            print(f"Warning: inventory hold sweep failed: {e}")
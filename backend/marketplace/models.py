@@ -1,9 +1,9 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, String, Text, Boolean, ForeignKey, Integer, Numeric, UniqueConstraint
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Date, DateTime, String, Text, Boolean, ForeignKey, Index, Integer, Numeric, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
+from sqlalchemy.orm import deferred, relationship
 
 from database import Base
 
@@ -32,11 +32,17 @@ class Product(Base):
     is_active = Column(Boolean, nullable=False, default=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    # Weighted name/tags/description document maintained by DB triggers (see marketplace.search)
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
 
     images = relationship("ProductImage", back_populates="product", cascade="all, delete-orphan")
     variants = relationship("ProductVariant", back_populates="product", cascade="all, delete-orphan")
     tags = relationship("ProductTagLink", back_populates="product", cascade="all, delete-orphan")
     collections = relationship("ProductCollectionLink", back_populates="product", cascade="all, delete-orphan")
+    __table_args__ = (
+        Index("ix_shop_products_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_shop_products_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
 
 
 class ProductImage(Base):
@@ -44,13 +50,19 @@ class ProductImage(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     product_id = Column(UUID(as_uuid=True), ForeignKey("shop_products.id", ondelete="CASCADE"), nullable=False, index=True)
-    url = Column(String(512), nullable=False)
+    url = Column(String(512), nullable=False, index=True)
     alt_text = Column(String(300), nullable=True)
     position = Column(Integer, nullable=False, default=0)
+    # Resized variants written by storage.derivatives: [{url, width, format}]
+    derivatives = Column(JSONB, nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
     product = relationship("Product", back_populates="images")
 
+    @property
+    def srcset(self) -> list[dict]:
+        return self.derivatives or []
+
 
 class ProductVariant(Base):
     __tablename__ = "shop_product_variants"
@@ -60,9 +72,16 @@ class ProductVariant(Base):
     size = Column(String(16), nullable=False)  # XS/S/M/L/XL/XXL
     color = Column(String(32), nullable=True)
     stock_quantity = Column(Integer, nullable=False, default=0)
+    # Units held by unpaid orders (sum of active InventoryHold rows)
+    held_quantity = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
     product = relationship("Product", back_populates="variants")
+
+    @property
+    def available_quantity(self) -> int:
+        return max(0, self.stock_quantity - (self.held_quantity or 0))
+
     __table_args__ = (
         UniqueConstraint("product_id", "size", "color", name="uq_variant_unique"),
     )
@@ -119,6 +138,12 @@ class Order(Base):
     payment_id = Column(String(64), nullable=True)  # stripe payment intent id
     total_cents = Column(Integer, nullable=False, default=0)
     currency = Column(String(8), nullable=False, default="INR")
+    # When the order was first counted as sold (see marketplace.stats)
+    paid_at = Column(DateTime(timezone=True), nullable=True)
+    # Open hosted checkout session, reused when checkout is retried
+    checkout_session_id = Column(String(255), nullable=True)
+    checkout_url = Column(Text, nullable=True)
+    checkout_expires_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
 
@@ -141,3 +166,74 @@ class OrderItem(Base):
     product = relationship("Product")
     variant = relationship("ProductVariant")
 
+
+class InventoryHold(Base):
+    """Stock set aside for a pending order until it is paid or expires."""
+    __tablename__ = "shop_inventory_holds"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    order_id = Column(UUID(as_uuid=True), ForeignKey("shop_orders.id", ondelete="CASCADE"), nullable=False)
+    variant_id = Column(UUID(as_uuid=True), ForeignKey("shop_product_variants.id", ondelete="CASCADE"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("order_id", "variant_id", name="uq_inventory_hold_order_variant"),
+    )
+
+
+class PaymentEvent(Base):
+    """Payment provider webhook event, stored on receipt (keyed by the
+    provider's event id so redeliveries are ignored) and applied to its
+    order by marketplace.webhooks."""
+    __tablename__ = "shop_payment_events"
+
+    id = Column(String(255), primary_key=True)
+    provider = Column(String(32), nullable=False, default="stripe")
+    type = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # The worker only ever scans unprocessed events
+        Index("ix_shop_payment_events_pending", "received_at", postgresql_where=processed_at.is_(None)),
+    )
+
+
+class ProductSalesStats(Base):
+    """Per-product sales totals, maintained by marketplace.stats when orders
+    become paid (or are cancelled/refunded after that)."""
+    __tablename__ = "shop_product_sales_stats"
+
+    product_id = Column(UUID(as_uuid=True), ForeignKey("shop_products.id", ondelete="CASCADE"), primary_key=True)
+    units_sold = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(BigInteger, nullable=False, default=0)
+    # Rolling windows, recomputed from shop_product_sales_daily
+    units_7d = Column(Integer, nullable=False, default=0, index=True)
+    units_30d = Column(Integer, nullable=False, default=0, index=True)
+    last_sold_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+
+class ProductSalesDaily(Base):
+    __tablename__ = "shop_product_sales_daily"
+
+    product_id = Column(UUID(as_uuid=True), ForeignKey("shop_products.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(BigInteger, nullable=False, default=0)
+
+
+class CatalogVersion(Base):
+    """Single-row counters: ``version`` is bumped by every storefront-visible
+    admin write, ``stock_version`` by every inventory hold, payment and release."""
+    __tablename__ = "shop_catalog_version"
+
+    id = Column(Integer, primary_key=True, default=1)
+    version = Column(BigInteger, nullable=False, default=0)
+    stock_version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
@@ -0,0 +1,100 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+Every sort mode orders by a full key that ends with the product id, so the
+order is total. A cursor carries the key of the last row returned and the
+next page starts strictly after it, so nothing counts past ``offset`` rows
+(a binary search in the catalog snapshot; a keyset WHERE clause for the
+bestseller sort, the one that still runs in SQL) and pages don't shift
+when rows before them are added or repriced.
+"""
+
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Sequence
+from uuid import UUID
+
+from sqlalchemy import and_, or_, tuple_
+
+
+# Sort mode -> (key, descending) from most to least significant
+SORT_KEYS: dict[str, tuple[tuple[str, bool], ...]] = {
+    "newest": (("created_at", True), ("id", True)),
+    "price_asc": (("price_cents", False), ("created_at", True), ("id", True)),
+    "price_desc": (("price_cents", True), ("created_at", True), ("id", True)),
+    "bestseller": (("units_30d", True), ("units_sold", True), ("created_at", True), ("id", True)),
+}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def sort_mode(sort: str | None) -> str:
+    return sort if sort in SORT_KEYS else "newest"
+
+
+def sort_values(sort: str, obj: Any) -> tuple:
+    """The sort key of ``obj`` (anything with the key attributes)."""
+    return tuple(getattr(obj, name) for name, _ in SORT_KEYS[sort])
+
+
+def encode_cursor(sort: str, values: Sequence[Any]) -> str:
+    encoded = [v.isoformat() if isinstance(v, datetime) else str(v) if isinstance(v, UUID) else v for v in values]
+    raw = json.dumps({"s": sort, "k": encoded}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["s"] != sort or len(data["k"]) != len(SORT_KEYS[sort]):
+            raise ValueError("cursor belongs to another sort")
+        return tuple(_decode(name, value) for (name, _), value in zip(SORT_KEYS[sort], data["k"]))
+    except Exception as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def _decode(name: str, value: Any) -> Any:
+    if name == "id":
+        return UUID(value)
+    if name == "created_at":
+        return datetime.fromisoformat(value)
+    return int(value)
+
+
+def keyset_after(columns: Sequence[tuple[Any, bool]], values: Sequence[Any]):
+    """WHERE clause for rows strictly after ``values`` in the order given by
+    ``columns`` ((expression, descending) pairs).
+
+    Runs of keys in the same direction become one row comparison, and each
+    direction change is written as ``k >= v AND (k > v OR <rest>)`` so the
+    leading key stays usable as an index bound.
+    """
+    (column, descending), value = columns[0], values[0]
+    same = 1
+    while same < len(columns) and columns[same][1] == descending:
+        same += 1
+    if same == len(columns):
+        left, right = tuple_(*(c for c, _ in columns)), tuple_(*values)
+        return left < right if descending else left > right
+    strict = column < value if descending else column > value
+    loose = column <= value if descending else column >= value
+    return and_(loose, or_(strict, keyset_after(columns[1:], values[1:])))
+
+
+def comparable(sort: str, values: Sequence[Any]) -> tuple:
+    """Ascending-sortable form of a sort key, for ordering in Python the
+    same way as in SQL (descending parts are negated)."""
+    out = []
+    for (name, descending), value in zip(SORT_KEYS[sort], values):
+        if isinstance(value, datetime):
+            value = (value if value.tzinfo else value.replace(tzinfo=timezone.utc)) - _EPOCH
+            value = value.days * 86_400_000_000 + value.seconds * 1_000_000 + value.microseconds
+        elif isinstance(value, UUID):
+            value = value.int
+        out.append(-value if descending else value)
+    return tuple(out)
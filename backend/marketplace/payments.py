@@ -0,0 +1,187 @@
+"""
+Payment provider client.
+
+Creating a hosted checkout session is a network call to the provider. It
+runs on a dedicated worker pool, behind its own concurrency limit and a cap
+on queued calls, with a request timeout, so a slow provider cannot tie up
+the request threadpool. Stripe calls go through one ``StripeClient`` per
+process with a pooled HTTP session; the API key is passed to the client
+instead of being set on the global ``stripe`` module.
+
+``PAYMENT_PROVIDER=fake`` swaps in ``FakeProvider``, which hands out local
+sessions (with optional simulated latency) for tests and benchmarks.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from api.metrics import metrics
+
+
+class PaymentNotConfigured(RuntimeError):
+    pass
+
+
+class PaymentProviderBusy(RuntimeError):
+    """Raised when ``max_pending`` provider calls are already queued or running."""
+
+
+class PaymentProviderError(RuntimeError):
+    """The provider failed or did not answer in time."""
+
+
+@dataclass(frozen=True, slots=True)
+class CheckoutSessionInfo:
+    id: str
+    url: str
+    expires_at: datetime
+    payment_intent: str | None = None
+
+
+class StripeProvider:
+    name = "stripe"
+
+    def __init__(self, *, api_key: str, timeout: float, pool_size: int, max_retries: int) -> None:
+        import requests
+        import stripe
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        client = stripe.StripeClient(
+            api_key,
+            http_client=stripe.RequestsClient(timeout=timeout, session=session),
+            max_network_retries=max_retries,
+        )
+        # stripe>=12.4 moved the resources under ``v1``
+        self._sessions = getattr(client, "v1", client).checkout.sessions
+
+    def create_checkout_session(self, *, order_id: str, line_items: list[dict], success_url: str, cancel_url: str, idempotency_key: str) -> CheckoutSessionInfo:
+        session = self._sessions.create(
+            params={
+                "mode": "payment",
+                "line_items": line_items,
+                "success_url": success_url,
+                "cancel_url": cancel_url,
+                "metadata": {"order_id": order_id},
+            },
+            options={"idempotency_key": idempotency_key},
+        )
+        return CheckoutSessionInfo(
+            id=session.id,
+            url=session.url,
+            expires_at=datetime.fromtimestamp(session.expires_at, timezone.utc),
+            payment_intent=session.get("payment_intent"),
+        )
+
+
+class FakeProvider:
+    """In-process stand-in for the provider: no network, same idempotency
+    semantics (a repeated key returns the same session)."""
+
+    name = "fake"
+
+    def __init__(self, *, latency: float = 0.0, session_ttl: timedelta = timedelta(hours=24)) -> None:
+        self.latency = latency
+        self.session_ttl = session_ttl
+        self.calls = 0
+        self._sessions: dict[str, CheckoutSessionInfo] = {}
+        self._lock = threading.Lock()
+
+    def create_checkout_session(self, *, order_id: str, line_items: list[dict], success_url: str, cancel_url: str, idempotency_key: str) -> CheckoutSessionInfo:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            session = self._sessions.get(idempotency_key)
+            if session is None:
+                session_id = f"cs_fake_{uuid.uuid4().hex}"
+                session = CheckoutSessionInfo(
+                    id=session_id,
+                    url=f"{success_url.split('?')[0]}?fake_session={session_id}",
+                    expires_at=datetime.now(timezone.utc) + self.session_ttl,
+                )
+                self._sessions[idempotency_key] = session
+            return session
+
+
+def _build_provider():
+    name = os.getenv("PAYMENT_PROVIDER", "stripe")
+    if name == "fake":
+        return FakeProvider(latency=float(os.getenv("PAYMENT_FAKE_LATENCY_MS", "0")) / 1000)
+    secret = os.getenv("STRIPE_SECRET_KEY")
+    if not secret:
+        raise PaymentNotConfigured("Payment not configured")
+    return StripeProvider(
+        api_key=secret,
+        timeout=float(os.getenv("PAYMENT_CLIENT_TIMEOUT_SECONDS", "10")),
+        pool_size=int(os.getenv("PAYMENT_CLIENT_WORKERS", "8")),
+        max_retries=int(os.getenv("PAYMENT_CLIENT_MAX_RETRIES", "1")),
+    )
+
+
+class PaymentClient:
+    def __init__(self, *, max_workers: int, max_pending: int, timeout: float, provider=None) -> None:
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._provider = provider
+        self._provider_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="payments")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    @property
+    def provider(self):
+        if self._provider is None:
+            with self._provider_lock:
+                if self._provider is None:
+                    self._provider = _build_provider()
+        return self._provider
+
+    async def create_checkout_session(self, **kwargs) -> CheckoutSessionInfo:
+        provider = self.provider
+        if not self._slots.acquire(blocking=False):
+            metrics.incr("payments.client.rejected")
+            raise PaymentProviderBusy("Payment provider pool is saturated")
+        submitted = time.perf_counter()
+
+        def job() -> CheckoutSessionInfo:
+            started = time.perf_counter()
+            metrics.observe("payments.client.queue_wait", started - submitted)
+            try:
+                return provider.create_checkout_session(**kwargs)
+            finally:
+                metrics.observe("payments.client.call", time.perf_counter() - started)
+
+        try:
+            future = self._executor.submit(job)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the call itself finishes, not until we stop
+        # waiting, so timed-out calls still count against ``max_pending``
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError as e:
+            metrics.incr("payments.client.timeout")
+            raise PaymentProviderError("Payment provider timed out") from e
+        except Exception as e:
+            metrics.incr("payments.client.failed")
+            raise PaymentProviderError(f"Payment provider error: {e}") from e
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+payment_client = PaymentClient(
+    max_workers=int(os.getenv("PAYMENT_CLIENT_WORKERS", "8")),
+    max_pending=int(os.getenv("PAYMENT_CLIENT_MAX_PENDING", "64")),
+    # Covers the provider's own timeout and retries, so those fire first
+    timeout=float(os.getenv("PAYMENT_CLIENT_TIMEOUT_SECONDS", "10")) * (int(os.getenv("PAYMENT_CLIENT_MAX_RETRIES", "1")) + 1) + 2,
+)
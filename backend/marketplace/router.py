@@ -1,14 +1,19 @@
 from typing import List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 
 from database import get_db
 from auth.deps import get_current_user
-from .service import MarketplaceService
-from .schemas import ProductOut, TagOut, OrderOut, CreateOrderRequest, CheckoutSession
-from .models import Product, Order
+from .catalog import catalog, product_out
+from .payments import PaymentNotConfigured, PaymentProviderBusy, PaymentProviderError
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, sort_mode, sort_values
+from .cart import cart_service
+from .service import MarketplaceService, OutOfStock, PriceChanged
+from .suggest import suggester
+from .webhooks import InvalidWebhook, parse_event, payment_events
+from .schemas import BrowseResponse, CartItem, CartItemUpdate, CartOut, ProductOut, SuggestionOut, TagOut, OrderOut, CreateOrderRequest, CheckoutSession
 
 
 router = APIRouter(prefix="/marketplace", tags=["Marketplace"])
@@ -16,56 +21,89 @@ service = MarketplaceService()
 
 
 @router.get("/products", response_model=List[ProductOut])
-def list_products(gender: str | None = None, tag: str | None = None, collection: str | None = None, sort: str | None = None, limit: int = 50, offset: int = 0, db: Session = Depends(get_db)):
-    products = service.list_products(db, gender=gender, tag=tag, collection=collection, sort=sort, limit=limit, offset=offset)
-    # adapt tag names
-    result: list[dict] = []
-    for p in products:
-        tag_names = [link.tag.name for link in p.tags]
-        collection_names = [link.collection.name for link in p.collections]
-        result.append({
-            "id": p.id,
-            "sku": p.sku,
-            "name": p.name,
-            "description": p.description,
-            "gender": p.gender,
-            "price_cents": p.price_cents,
-            "currency": p.currency,
-            "is_active": p.is_active,
-            "created_at": p.created_at,
-            "updated_at": p.updated_at,
-            "images": p.images,
-            "variants": p.variants,
-            "tag_names": tag_names,
-            "collection_names": collection_names,
-        })
-    return result
+def list_products(response: Response, gender: str | None = None, tag: str | None = None, collection: str | None = None, sort: str | None = None, limit: int = 50, offset: int = 0, cursor: str | None = None, db: Session = Depends(get_db)):
+    """Pass the X-Next-Cursor header of a page as ``cursor`` to get the next
+    one; ``offset`` is kept for older clients."""
+    mode = sort_mode(sort)
+    try:
+        if mode != "bestseller":
+            # Served from the in-memory snapshot; bestseller depends on orders, not the catalog
+            after = decode_cursor(cursor, mode) if cursor else None
+            snapshot = catalog.get(db)
+            items = snapshot.query(gender=gender, tag=tag, collection=collection, sort=mode, limit=limit + 1, offset=offset, after=after)
+            if len(items) > limit:
+                items = items[:limit]
+                if items:
+                    response.headers["X-Next-Cursor"] = encode_cursor(mode, sort_values(mode, items[-1]))
+            return snapshot.with_stock(items)
+        products, next_cursor = service.list_products(db, gender=gender, tag=tag, collection=collection, sort=mode, limit=limit, offset=offset, cursor=cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [product_out(p) for p in products]
+
+
+@router.get("/products/browse", response_model=BrowseResponse)
+def browse_products(
+    response: Response,
+    gender: List[str] = Query(default=[]),
+    size: List[str] = Query(default=[]),
+    color: List[str] = Query(default=[]),
+    tag: List[str] = Query(default=[]),
+    collection: List[str] = Query(default=[]),
+    price: List[str] = Query(default=[], description="Price buckets as returned in facets, e.g. 100000-200000"),
+    sort: str | None = None,
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Filter the catalog by any combination of facet values (OR within a
+    facet, AND across facets) and return per-facet counts for the UI.
+    Pages continue from the X-Next-Cursor header like /products."""
+    mode = sort_mode(sort)
+    if mode == "bestseller":
+        mode = "newest"
+    try:
+        after = decode_cursor(cursor, mode) if cursor else None
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    snapshot = catalog.get(db)
+    filters = {"gender": gender, "size": size, "color": color, "tag": tag, "collection": collection, "price": price}
+    bits = snapshot.match(filters)
+    counts = snapshot.counts(filters)
+    items = snapshot.page(bits, sort=mode, limit=limit + 1, offset=offset, after=after)
+    if len(items) > limit:
+        items = items[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(mode, sort_values(mode, items[-1]))
+    return {
+        "items": snapshot.with_stock(items),
+        "total": bits.bit_count(),
+        "facets": {
+            facet: [{"value": v, "count": n} for v, n in sorted(values.items(), key=lambda kv: (-kv[1], kv[0]))]
+            for facet, values in counts.items()
+        },
+    }
+
+
+@router.get("/suggest", response_model=List[SuggestionOut])
+def suggest(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(8, ge=1, le=20), db: Session = Depends(get_db)):
+    """Typeahead over product, tag and collection names, most popular first."""
+    return suggester.get(db).lookup(q, limit)
 
 
 @router.get("/products/search", response_model=List[ProductOut])
-def search_products(q: str, limit: int = 50, offset: int = 0, db: Session = Depends(get_db)):
-    products = service.search_products(db, query=q, limit=limit, offset=offset)
-    result: list[dict] = []
-    for p in products:
-        tag_names = [link.tag.name for link in p.tags]
-        collection_names = [link.collection.name for link in p.collections]
-        result.append({
-            "id": p.id,
-            "sku": p.sku,
-            "name": p.name,
-            "description": p.description,
-            "gender": p.gender,
-            "price_cents": p.price_cents,
-            "currency": p.currency,
-            "is_active": p.is_active,
-            "created_at": p.created_at,
-            "updated_at": p.updated_at,
-            "images": p.images,
-            "variants": p.variants,
-            "tag_names": tag_names,
-            "collection_names": collection_names,
-        })
-    return result
+def search_products(response: Response, q: str = Query(..., min_length=1, max_length=200), limit: int = Query(50, ge=1, le=100), offset: int = 0, cursor: str | None = None, db: Session = Depends(get_db)):
+    """Ranked search. Pass the X-Next-Cursor header of a page as ``cursor``
+    to get the next one (``offset`` is kept for older clients)."""
+    try:
+        products, next_cursor = service.search_products(db, query=q, limit=limit, offset=offset, cursor=cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [product_out(p) for p in products]
 
 
 @router.get("/products/{product_id}", response_model=ProductOut)
@@ -73,21 +111,7 @@ def get_product(product_id: UUID, db: Session = Depends(get_db)):
     p = service.get_product(db, product_id=product_id)
     if not p:
         raise HTTPException(status_code=404, detail="Not found")
-    return {
-        "id": p.id,
-        "sku": p.sku,
-        "name": p.name,
-        "description": p.description,
-        "gender": p.gender,
-        "price_cents": p.price_cents,
-        "currency": p.currency,
-        "is_active": p.is_active,
-        "created_at": p.created_at,
-        "updated_at": p.updated_at,
-        "images": p.images,
-        "variants": p.variants,
-        "tag_names": [link.tag.name for link in p.tags],
-    }
+    return product_out(p)
 
 
 # Admin endpoints moved to a dedicated admin router
@@ -104,53 +128,85 @@ def list_tags(db: Session = Depends(get_db)):
 # Admin endpoints moved to a dedicated admin router
 
 
+def _cart_out(cart) -> dict:
+    return {"items": cart.lines, "total_cents": cart.total_cents}
+
+
+@router.get("/cart", response_model=CartOut)
+def get_cart(db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return _cart_out(cart_service.get(db, user_id=user.id))
+
+
+@router.post("/cart/items", response_model=CartOut)
+def add_cart_item(payload: CartItem, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return _set_cart_item(db, user, payload, add=True)
+
+
+@router.put("/cart/items", response_model=CartOut)
+def update_cart_item(payload: CartItemUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return _set_cart_item(db, user, payload, add=False)
+
+
+def _set_cart_item(db: Session, user, payload, *, add: bool) -> dict:
+    try:
+        cart = cart_service.set_item(db, user_id=user.id, product_id=payload.product_id, variant_id=payload.variant_id, quantity=payload.quantity, add=add)
+    except OutOfStock as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "variant_ids": [str(v) for v in e.variant_ids]})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _cart_out(cart)
+
+
+@router.delete("/cart")
+def clear_cart(user=Depends(get_current_user)):
+    cart_service.clear(user_id=user.id)
+    return {"success": True}
+
+
+@router.post("/cart/checkout", response_model=OrderOut)
+def checkout_cart(db: Session = Depends(get_db), user=Depends(get_current_user)):
+    try:
+        return cart_service.checkout(db, user_id=user.id)
+    except PriceChanged as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "product_ids": [str(p) for p in e.prices]})
+    except OutOfStock as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "variant_ids": [str(v) for v in e.variant_ids]})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/orders", response_model=OrderOut)
 def create_order(payload: CreateOrderRequest, db: Session = Depends(get_db), user=Depends(get_current_user)):
     items = [(i.product_id, i.variant_id, i.quantity) for i in payload.items]
-    order = service.create_order(db, user_id=user.id, items=items)
+    try:
+        order = service.create_order(db, user_id=user.id, items=items)
+    except OutOfStock as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "variant_ids": [str(v) for v in e.variant_ids]})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return order
 
 
 # Stripe integration - create checkout session
 @router.post("/orders/{order_id}/checkout", response_model=CheckoutSession)
-def start_checkout(order_id: UUID, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    order = db.get(Order, order_id)
-    if not order or order.user_id != user.id:
-        raise HTTPException(status_code=404, detail="Order not found")
+async def start_checkout(order_id: UUID, db: Session = Depends(get_db), user=Depends(get_current_user)):
     import os
-    import stripe
-    secret = os.getenv("STRIPE_SECRET_KEY")
     public_url = os.getenv("PUBLIC_URL") or "http://localhost:5173"
-    if not secret:
+    try:
+        checkout_url = await service.start_checkout(db, order_id=order_id, user_id=user.id, public_url=public_url)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Order not found")
+    except OutOfStock as e:
+        raise HTTPException(status_code=409, detail={"message": "Some items are no longer in stock", "variant_ids": [str(v) for v in e.variant_ids]})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PaymentNotConfigured:
         raise HTTPException(status_code=500, detail="Payment not configured")
-    stripe.api_key = secret
-
-    line_items = []
-    for item in order.items:
-        product = db.get(Product, item.product_id) if item.product_id else None
-        name = product.name if product else "Item"
-        line_items.append({
-            "quantity": item.quantity,
-            "price_data": {
-                "currency": "inr",  # Enforce INR currency for all payments
-                "product_data": {"name": name},
-                "unit_amount": item.unit_price_cents,
-            },
-        })
-
-    session = stripe.checkout.Session.create(
-        mode="payment",
-        line_items=line_items,
-        success_url=f"{public_url}/community?checkout=success",
-        cancel_url=f"{public_url}/community?checkout=cancel",
-        metadata={"order_id": str(order.id)},
-    )
-
-    order.payment_provider = "stripe"
-    order.payment_id = session.get("payment_intent") or session.get("id")
-    db.commit()
-
-    return {"checkout_url": session.url}
+    except PaymentProviderBusy:
+        raise HTTPException(status_code=503, detail="Too many requests, try again shortly")
+    except PaymentProviderError:
+        raise HTTPException(status_code=502, detail="Payment provider unavailable, try again shortly")
+    return {"checkout_url": checkout_url}
 
 
 # Admin endpoints moved to a dedicated admin router
@@ -159,44 +215,16 @@ def start_checkout(order_id: UUID, db: Session = Depends(get_db), user=Depends(g
 @router.post("/webhook/stripe")
 async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
     import os
-    import stripe
+    from fastapi.concurrency import run_in_threadpool
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature") or request.headers.get("Stripe-Signature")
-    secret = os.getenv("STRIPE_WEBHOOK_SECRET")
-    event = None
-    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
     try:
-        if secret and sig_header:
-            event = stripe.Webhook.construct_event(payload, sig_header, secret)
-        else:
-            event = stripe.Event.construct_from(await request.json(), stripe.api_key)
-    except Exception:
+        event = parse_event(payload, sig_header, os.getenv("STRIPE_WEBHOOK_SECRET"))
+    except InvalidWebhook:
         raise HTTPException(status_code=400, detail="Invalid webhook")
 
-    type_ = event.get("type")
-    data = event.get("data", {}).get("object", {})
-    order_id = None
-    if type_ == "checkout.session.completed":
-        order_id = (data.get("metadata") or {}).get("order_id")
-        payment_intent = data.get("payment_intent")
-        status = "paid"
-    elif type_ == "payment_intent.succeeded":
-        order_id = (data.get("metadata") or {}).get("order_id")
-        payment_intent = data.get("id")
-        status = "paid"
-    else:
-        return {"received": True}
-
-    if not order_id:
-        return {"received": True}
-
-    order = db.get(Order, order_id)
-    if order:
-        order.status = status
-        order.payment_provider = "stripe"
-        if payment_intent:
-            order.payment_id = payment_intent
-        db.commit()
-
+    # Store and acknowledge; the payment events worker updates the order
+    if await run_in_threadpool(payment_events.record, db, event):
+        payment_events.notify()
     return {"received": True}
 
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 from uuid import UUID
 from datetime import datetime
 
@@ -21,11 +21,18 @@ class TagOut(ORMModel):
     created_at: datetime
 
 
+class ImageVariantOut(BaseModel):
+    url: str
+    width: int
+    format: str
+
+
 class ProductImageOut(ORMModel):
     id: UUID
     url: str
     alt_text: Optional[str]
     position: int
+    srcset: List[ImageVariantOut] = []
 
 
 class ProductVariantOut(ORMModel):
@@ -33,6 +40,8 @@ class ProductVariantOut(ORMModel):
     size: str
     color: Optional[str]
     stock_quantity: int
+    # stock_quantity minus units held by unpaid orders
+    available_quantity: int = 0
 
 
 class ProductCreate(BaseModel):
@@ -65,6 +74,24 @@ class ProductOut(ORMModel):
     collection_names: List[str] = []
 
 
+class FacetValueOut(BaseModel):
+    value: str
+    count: int
+
+
+class BrowseResponse(BaseModel):
+    items: List[ProductOut]
+    total: int
+    # facet name (gender, size, color, tag, collection, price) -> values with counts
+    facets: Dict[str, List[FacetValueOut]]
+
+
+class SuggestionOut(BaseModel):
+    text: str
+    kind: str  # product, tag, collection
+    product_id: Optional[UUID] = None
+
+
 class CollectionCreate(BaseModel):
     name: str
     description: Optional[str] = None
@@ -86,6 +113,27 @@ class CreateOrderRequest(BaseModel):
     items: List[CartItem]
 
 
+class CartItemUpdate(BaseModel):
+    product_id: UUID
+    variant_id: Optional[UUID] = None
+    quantity: int = Field(ge=0)  # 0 removes the line
+
+
+class CartLineOut(ORMModel):
+    product_id: UUID
+    variant_id: Optional[UUID]
+    quantity: int
+    name: str
+    unit_price_cents: int
+    available_quantity: Optional[int]
+
+
+class CartOut(ORMModel):
+    items: List[CartLineOut]
+    total_cents: int
+    currency: str = "INR"
+
+
 class OrderItemOut(ORMModel):
     id: UUID
     product_id: Optional[UUID]
@@ -0,0 +1,90 @@
+"""
+Ranked product search.
+
+``shop_products.search_vector`` holds a weighted tsvector (name A, tag
+names B, description C) kept current by database triggers and indexed
+with GIN; ``name`` also has a pg_trgm GIN index for typo tolerance. A
+product matches when the full-text query matches or its name is
+trigram-similar to the input, and results are ordered by
+``ts_rank_cd + similarity`` with the id as tie-breaker.
+
+Paging is keyset-based: the cursor carries the (score, id) of the last row
+returned, so deep pages cost the same as the first one.
+"""
+
+import base64
+import json
+from uuid import UUID
+
+from sqlalchemy import Float, cast, func, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.orm import Session
+
+from .models import Product
+from .pagination import InvalidCursor
+
+
+SEARCH_CONFIG = "english"
+# How much a close trigram match on the name counts against text rank
+SIMILARITY_WEIGHT = 0.5
+
+
+def encode_cursor(score: float, product_id: UUID) -> str:
+    raw = json.dumps({"s": score, "id": str(product_id)}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[float, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return float(data["s"]), UUID(data["id"])
+    except Exception as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def match_and_score(query: str):
+    """(WHERE clause, score expression) for ``query`` over Product."""
+    tsquery = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), query)
+    condition = or_(
+        Product.search_vector.op("@@")(tsquery),
+        Product.name.op("%")(query),
+    )
+    score = cast(
+        func.ts_rank_cd(Product.search_vector, tsquery) + func.similarity(Product.name, query) * SIMILARITY_WEIGHT,
+        Float,
+    )
+    return condition, score
+
+
+def search_products(db: Session, *, query: str, limit: int, cursor: str | None = None, offset: int = 0) -> tuple[list[Product], str | None]:
+    """Active products matching ``query``, best first.
+
+    Returns the page and the cursor for the next one (None on the last page).
+    """
+    from .service import catalog_loaders
+
+    condition, score = match_and_score(query)
+    ranked = (
+        select(Product.id.label("id"), score.label("score"))
+        .where(Product.is_active == True, condition)
+        .subquery()
+    )
+    page = select(ranked.c.id, ranked.c.score)
+    if cursor:
+        last_score, last_id = decode_cursor(cursor)
+        page = page.where(tuple_(ranked.c.score, ranked.c.id) < tuple_(last_score, last_id))
+    elif offset:
+        page = page.offset(offset)
+    rows = db.execute(page.order_by(ranked.c.score.desc(), ranked.c.id.desc()).limit(limit + 1)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    ids = [r.id for r in rows]
+    loaded = {
+        p.id: p
+        for p in db.execute(select(Product).where(Product.id.in_(ids)).options(*catalog_loaders())).scalars()
+    } if ids else {}
+    products = [loaded[i] for i in ids if i in loaded]
+    next_cursor = encode_cursor(rows[-1].score, rows[-1].id) if has_more else None
+    return products, next_cursor
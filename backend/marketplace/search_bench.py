@@ -0,0 +1,117 @@
+"""
+Search benchmark on a seeded catalog.
+
+Seeds synthetic products (SKUs ``BENCH-000000`` ...; the search triggers
+fill their vectors), then times ``search_products`` for a few query shapes:
+first page, a deep page reached through cursors (should cost about the
+same as the first), and a price-only UPDATE of every seeded row (the
+search trigger must not fire for it). Run from backend/ against a scratch
+database:
+
+    python -m marketplace.search_bench --seed 100000
+    python -m marketplace.search_bench            # re-run on the seeded rows
+    python -m marketplace.search_bench --cleanup  # drop the seeded rows
+"""
+
+import random
+import statistics
+import time
+
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.orm import Session
+
+from .models import Product
+from .search import search_products
+
+
+SKU_PREFIX = "BENCH-"
+QUERIES = ("black tee", "oversized linen shirt", "blak hoodie", "graphic print cotton", "olive")
+
+COLORS = ("black", "white", "olive", "navy", "sand", "rust", "grey", "cream", "maroon", "teal", "charcoal", "sky")
+FABRICS = ("cotton", "linen", "jersey", "fleece", "denim", "pique", "modal", "bamboo")
+FITS = ("oversized", "slim", "relaxed", "boxy", "regular", "cropped")
+GARMENTS = ("tee", "hoodie", "shirt", "polo", "sweatshirt", "tank", "henley", "jacket", "overshirt", "crewneck")
+DETAILS = ("graphic print", "embroidered logo", "garment dyed", "pocket", "ribbed collar", "raw hem", "heavyweight", "washed")
+
+
+def seed(db: Session, count: int, *, batch_size: int = 5000) -> None:
+    rng = random.Random(42)
+    start = db.execute(select(func.count()).where(Product.sku.like(f"{SKU_PREFIX}%"))).scalar_one()
+    for offset in range(start, start + count, batch_size):
+        rows = []
+        for i in range(offset, min(offset + batch_size, start + count)):
+            color, fabric, fit, garment = rng.choice(COLORS), rng.choice(FABRICS), rng.choice(FITS), rng.choice(GARMENTS)
+            rows.append({
+                "sku": f"{SKU_PREFIX}{i:06d}",
+                "name": f"{fit.title()} {color.title()} {garment.title()}",
+                "description": f"{fabric} {garment}, {', '.join(rng.sample(DETAILS, 2))}",
+                "gender": rng.choice(("men", "women")),
+                "price_cents": rng.randrange(49900, 499900, 100),
+            })
+        db.execute(insert(Product), rows)
+        db.commit()
+        print(f"seeded {offset + len(rows) - start}/{count}", flush=True)
+    db.execute(text("ANALYZE shop_products"))
+    db.commit()
+
+
+def _timed(fn, runs: int) -> list[float]:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _summary(label: str, samples: list[float]) -> str:
+    p95 = sorted(samples)[max(0, int(len(samples) * 0.95) - 1)]
+    return f"{label:<40} p50 {statistics.median(samples):8.2f} ms  p95 {p95:8.2f} ms"
+
+
+def bench(db: Session, *, runs: int, limit: int, depth: int) -> None:
+    seeded = db.execute(select(func.count()).where(Product.sku.like(f"{SKU_PREFIX}%"))).scalar_one()
+    print(f"{seeded} seeded products, {runs} runs per measurement")
+    for query in QUERIES:
+        first, cursor = search_products(db, query=query, limit=limit)
+        print(_summary(f"{query!r} page 1 ({len(first)})", _timed(lambda: search_products(db, query=query, limit=limit), runs)))
+        page = 1
+        while cursor and page < depth:
+            _, next_cursor = search_products(db, query=query, limit=limit, cursor=cursor)
+            if not next_cursor:
+                break
+            cursor, page = next_cursor, page + 1
+        if cursor and page > 1:
+            deep = cursor
+            print(_summary(f"{query!r} page {page + 1} (cursor)", _timed(lambda: search_products(db, query=query, limit=limit, cursor=deep), runs)))
+        db.rollback()
+
+    # A bulk reprice must not recompute search vectors
+    started = time.perf_counter()
+    db.execute(update(Product).where(Product.sku.like(f"{SKU_PREFIX}%")).values(price_cents=Product.price_cents + 100))
+    print(f"{'price-only UPDATE of seeded rows':<40} {(time.perf_counter() - started) * 1000:8.2f} ms (rolled back)")
+    db.rollback()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Seed synthetic products and benchmark search.")
+    parser.add_argument("--seed", type=int, default=0, help="add this many synthetic products first")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=24, help="page size")
+    parser.add_argument("--depth", type=int, default=10, help="page reached through cursors")
+    parser.add_argument("--cleanup", action="store_true", help="delete the synthetic products and exit")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        if args.cleanup:
+            deleted = db.execute(delete(Product).where(Product.sku.like(f"{SKU_PREFIX}%"))).rowcount
+            db.commit()
+            print(f"deleted {deleted} products")
+        else:
+            if args.seed:
+                seed(db, args.seed)
+            bench(db, runs=args.runs, limit=args.limit, depth=args.depth)
@@ -4,38 +4,74 @@ from typing import List
 from uuid import UUID
 
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
-from .models import Product, ProductImage, ProductVariant, ProductTag, ProductTagLink, Order, OrderItem
+from .catalog import bump_catalog_version
+from .inventory import OutOfStock, inventory
+from .models import Product, ProductImage, ProductVariant, ProductTag, ProductTagLink, ProductCollectionLink, Order, OrderItem
+
+
+class PriceChanged(ValueError):
+    """Raised when products no longer cost what the caller expected."""
+
+    def __init__(self, prices: dict[UUID, int]) -> None:
+        super().__init__("Prices changed")
+        # product id -> current price in cents
+        self.prices = prices
+
+
+def catalog_loaders() -> tuple:
+    """Eager-load everything ProductOut needs: one extra query per
+    relationship for the whole page instead of several per product."""
+    return (
+        selectinload(Product.images),
+        selectinload(Product.variants),
+        selectinload(Product.tags).selectinload(ProductTagLink.tag),
+        selectinload(Product.collections).selectinload(ProductCollectionLink.collection),
+    )
 
 
 class MarketplaceService:
-    def list_products(self, db: Session, *, gender: str | None = None, tag: str | None = None, collection: str | None = None, sort: str | None = None, limit: int = 50, offset: int = 0) -> List[Product]:
-        from sqlalchemy import desc, asc
-        stmt = select(Product).where(Product.is_active == True).offset(offset).limit(limit)
+    def list_products(self, db: Session, *, gender: str | None = None, tag: str | None = None, collection: str | None = None, sort: str | None = None, limit: int = 50, offset: int = 0, cursor: str | None = None) -> tuple[List[Product], str | None]:
+        """Active products in ``sort`` order; returns (page, next cursor).
+
+        Sorts end with the product id, so ``cursor`` (from a previous page)
+        resumes exactly after its last row; ``offset`` is only used without
+        one. Raises InvalidCursor for a malformed cursor.
+        """
+        from sqlalchemy import func
+        from .models import ProductSalesStats
+        from .pagination import SORT_KEYS, decode_cursor, encode_cursor, keyset_after, sort_mode
+
+        mode = sort_mode(sort)
+        stmt = select(Product).where(Product.is_active == True).options(*catalog_loaders())
         if gender in {"men", "women"}:
             stmt = stmt.where(Product.gender == gender)
         if tag:
-            from sqlalchemy import exists
             tag_subq = select(ProductTagLink.product_id).join(ProductTag, ProductTag.id == ProductTagLink.tag_id).where(ProductTag.name == tag)
             stmt = stmt.where(Product.id.in_(tag_subq))
         if collection:
-            from .models import Collection, ProductCollectionLink
+            from .models import Collection
             col_subq = select(ProductCollectionLink.product_id).join(Collection, Collection.id == ProductCollectionLink.collection_id).where(Collection.name == collection)
             stmt = stmt.where(Product.id.in_(col_subq))
-        # sorting: newest|price_asc|price_desc|bestseller
-        if sort == "price_asc":
-            stmt = stmt.order_by(asc(Product.price_cents), desc(Product.created_at))
-        elif sort == "price_desc":
-            stmt = stmt.order_by(desc(Product.price_cents), desc(Product.created_at))
-        elif sort == "bestseller":
-            # naive bestseller: products with most order items
-            from sqlalchemy import func
-            items_count = select(OrderItem.product_id, func.count(OrderItem.id).label("cnt")).group_by(OrderItem.product_id).subquery()
-            stmt = stmt.outerjoin(items_count, items_count.c.product_id == Product.id).order_by(desc(items_count.c.cnt.nullslast()), desc(Product.created_at))
-        else:
-            stmt = stmt.order_by(desc(Product.created_at))
-        return db.execute(stmt).scalars().all()
+
+        columns = {"price_cents": Product.price_cents, "created_at": Product.created_at, "id": Product.id}
+        if mode == "bestseller":
+            # Units sold in the last 30 days, then all-time, from the materialized stats
+            stmt = stmt.outerjoin(ProductSalesStats, ProductSalesStats.product_id == Product.id)
+            columns["units_30d"] = func.coalesce(ProductSalesStats.units_30d, 0)
+            columns["units_sold"] = func.coalesce(ProductSalesStats.units_sold, 0)
+        keys = [(columns[name], descending) for name, descending in SORT_KEYS[mode]]
+        stmt = stmt.add_columns(*(column for column, _ in keys))
+        if cursor:
+            stmt = stmt.where(keyset_after(keys, decode_cursor(cursor, mode)))
+        elif offset:
+            stmt = stmt.offset(offset)
+        stmt = stmt.order_by(*(column.desc() if descending else column.asc() for column, descending in keys)).limit(limit + 1)
+
+        rows = db.execute(stmt).all()
+        next_cursor = encode_cursor(mode, tuple(rows[limit - 1][1:])) if len(rows) > limit and limit > 0 else None
+        return [row[0] for row in rows[:limit]], next_cursor
 
     def create_tag(self, db: Session, *, name: str, description: str | None) -> ProductTag:
         existing = db.execute(select(ProductTag).where(ProductTag.name == name)).scalar_one_or_none()
@@ -71,56 +107,92 @@ class MarketplaceService:
         for t in tags:
             tag = self.create_tag(db, name=t, description=None)
             db.add(ProductTagLink(product_id=product.id, tag_id=tag.id))
+        bump_catalog_version(db)
         db.commit()
         db.refresh(product)
+        if product.images:
+            from storage.derivatives import image_pipeline
+            image_pipeline.enqueue(ProductImage, [img.id for img in product.images], on_update=bump_catalog_version)
         return product
 
     def get_product(self, db: Session, *, product_id: UUID) -> Product | None:
-        return db.get(Product, product_id)
+        return db.get(Product, product_id, options=catalog_loaders())
 
     def delete_product(self, db: Session, *, product_id: UUID) -> bool:
         from sqlalchemy import delete
+        from storage.purge import purge_queue
+        images = db.execute(
+            select(ProductImage.url, ProductImage.derivatives).where(ProductImage.product_id == product_id)
+        ).all()
+        doomed = purge_queue.release(db, images)
         db.execute(delete(Product).where(Product.id == product_id))
+        bump_catalog_version(db)
         db.commit()
+        purge_queue.enqueue(doomed)
         return True
 
-    def search_products(self, db: Session, *, query: str, limit: int = 50, offset: int = 0) -> List[Product]:
-        from sqlalchemy import or_
-        # Simple ILIKE-based search over name, description, and associated tag names
-        stmt = (
-            select(Product)
-            .where(Product.is_active == True)
-            .order_by(Product.created_at.desc())
-            .offset(offset)
-            .limit(limit)
-        )
-        if query:
-            pattern = f"%{query}%"
-            tag_subq = (
-                select(ProductTagLink.product_id)
-                .join(ProductTag, ProductTag.id == ProductTagLink.tag_id)
-                .where(ProductTag.name.ilike(pattern))
-            )
-            stmt = stmt.where(
-                or_(
-                    Product.name.ilike(pattern),
-                    Product.description.ilike(pattern),
-                    Product.id.in_(tag_subq),
-                )
-            )
-        return db.execute(stmt).scalars().all()
-
-    def create_order(self, db: Session, *, user_id: UUID | None, items: list[tuple[UUID, UUID | None, int]]) -> Order:
-        # items: list of (product_id, variant_id, quantity)
+    def search_products(self, db: Session, *, query: str, limit: int = 50, offset: int = 0, cursor: str | None = None) -> tuple[List[Product], str | None]:
+        """Ranked full-text + fuzzy search; returns (page, next cursor)."""
+        from .search import search_products
+        return search_products(db, query=query, limit=limit, cursor=cursor, offset=offset)
+
+    def create_order(self, db: Session, *, user_id: UUID | None, items: list[tuple[UUID, UUID | None, int]], expected_prices: dict[UUID, int] | None = None) -> Order:
+        """Create a pending order and hold stock for its variants.
+
+        ``items`` are (product_id, variant_id, quantity). Raises ValueError
+        for unknown or inactive products and invalid variants, PriceChanged
+        when ``expected_prices`` (product id -> cents, e.g. from a cart) are
+        out of date, and OutOfStock (rolling back) when any variant can't
+        cover its quantity.
+        """
+        # Merge repeated lines so each variant is reserved once
+        wanted: dict[tuple[UUID, UUID | None], int] = {}
+        for product_id, variant_id, quantity in items:
+            if quantity <= 0:
+                raise ValueError("Quantity must be positive")
+            wanted[(product_id, variant_id)] = wanted.get((product_id, variant_id), 0) + quantity
+        if not wanted:
+            raise ValueError("Order has no items")
+
+        # Every product and all of its variants in one round trip
+        product_ids = {pid for pid, _ in wanted}
+        rows = db.execute(
+            select(Product, ProductVariant)
+            .outerjoin(ProductVariant, ProductVariant.product_id == Product.id)
+            .where(Product.id.in_(product_ids), Product.is_active == True)
+        ).all()
+        products: dict[UUID, Product] = {}
+        variants: dict[UUID, ProductVariant] = {}
+        for product, variant in rows:
+            products[product.id] = product
+            if variant is not None:
+                variants[variant.id] = variant
+        for product_id, variant_id in wanted:
+            if product_id not in products:
+                raise ValueError(f"Product {product_id} is not available")
+            if variant_id is None:
+                if any(v.product_id == product_id for v in variants.values()):
+                    raise ValueError(f"Choose a size/color for product {product_id}")
+            elif variant_id not in variants or variants[variant_id].product_id != product_id:
+                raise ValueError(f"Variant {variant_id} does not belong to product {product_id}")
+        if expected_prices is not None:
+            changed = {pid: p.price_cents for pid, p in products.items() if expected_prices.get(pid) != p.price_cents}
+            if changed:
+                raise PriceChanged(changed)
+
         order = Order(user_id=user_id, status="pending", currency="INR")  # Enforce INR currency
         db.add(order)
         db.flush()
+        reserve: dict[UUID, int] = {}
+        for (_, variant_id), quantity in wanted.items():
+            if variant_id is not None:
+                reserve[variant_id] = reserve.get(variant_id, 0) + quantity
+        if reserve:
+            # Held until paid (converted to a stock decrement) or expired
+            inventory.hold(db, order_id=order.id, quantities=reserve)
         total_cents = 0
-        for product_id, variant_id, quantity in items:
-            product = db.get(Product, product_id)
-            if not product:
-                continue
-            unit = product.price_cents
+        for (product_id, variant_id), quantity in wanted.items():
+            unit = products[product_id].price_cents
             line_total = unit * quantity
             total_cents += line_total
             db.add(OrderItem(order_id=order.id, product_id=product_id, variant_id=variant_id, quantity=quantity, unit_price_cents=unit, total_cents=line_total))
@@ -129,3 +201,81 @@ class MarketplaceService:
         db.refresh(order)
         return order
 
+    async def start_checkout(self, db: Session, *, order_id: UUID, user_id: UUID, public_url: str) -> str:
+        """Hosted checkout URL for a pending order.
+
+        Reuses the order's open session when checkout is retried; otherwise
+        the provider is called through ``payment_client`` (off the request
+        threadpool). Raises LookupError for someone else's or a missing
+        order, ValueError when it is not pending, OutOfStock when its holds
+        expired and the stock is gone, and the payments module's errors.
+        """
+        from fastapi.concurrency import run_in_threadpool
+        from .payments import payment_client
+
+        order, line_items = await run_in_threadpool(self._prepare_checkout, db, order_id, user_id)
+        if line_items is None:
+            return order.checkout_url
+        session = await payment_client.create_checkout_session(
+            order_id=str(order.id),
+            line_items=line_items,
+            success_url=f"{public_url}/community?checkout=success",
+            cancel_url=f"{public_url}/community?checkout=cancel",
+            # Concurrent retries get the same session; a new key once the last one expired
+            idempotency_key=f"checkout-{order.id}-{order.checkout_session_id or 'first'}",
+        )
+        await run_in_threadpool(self._store_checkout_session, db, order, session, payment_client.provider.name)
+        return session.url
+
+    def _prepare_checkout(self, db: Session, order_id: UUID, user_id: UUID) -> tuple[Order, list[dict] | None]:
+        from datetime import datetime, timedelta, timezone
+
+        order = db.get(Order, order_id)
+        if not order or order.user_id != user_id:
+            raise LookupError("Order not found")
+        if order.status != "pending":
+            raise ValueError("Order is not awaiting payment")
+        # Keep the stock held while the customer is on the payment page
+        inventory.extend(db, order_id=order.id)
+        db.commit()
+        # Leave the customer time to finish paying on a reused session
+        if order.checkout_url and order.checkout_expires_at and order.checkout_expires_at > datetime.now(timezone.utc) + timedelta(minutes=5):
+            return order, None
+
+        product_ids = {item.product_id for item in order.items if item.product_id}
+        names = dict(db.execute(select(Product.id, Product.name).where(Product.id.in_(product_ids))).all()) if product_ids else {}
+        line_items = [
+            {
+                "quantity": item.quantity,
+                "price_data": {
+                    "currency": "inr",  # Enforce INR currency for all payments
+                    "product_data": {"name": names.get(item.product_id, "Item")},
+                    "unit_amount": item.unit_price_cents,
+                },
+            }
+            for item in order.items
+        ]
+        return order, line_items
+
+    def _store_checkout_session(self, db: Session, order: Order, session, provider: str) -> None:
+        order.payment_provider = provider
+        order.payment_id = session.payment_intent or session.id
+        order.checkout_session_id = session.id
+        order.checkout_url = session.url
+        order.checkout_expires_at = session.expires_at
+        db.commit()
+
+    def set_order_status(self, db: Session, order: Order, status: str) -> None:
+        """Move ``order`` to ``status`` and apply the side effects: sales
+        stats, and converting (paid) or releasing (cancelled) its stock
+        holds. Does not commit; lock the order row first."""
+        from .stats import COUNTED_STATUSES, REVERSED_STATUSES, sales_stats
+
+        previous_status = order.status
+        order.status = status
+        if previous_status not in COUNTED_STATUSES and status in COUNTED_STATUSES:
+            inventory.convert(db, order_id=order.id)
+        elif previous_status not in COUNTED_STATUSES and status in REVERSED_STATUSES:
+            inventory.release(db, order_id=order.id)
+        sales_stats.record_transition(db, order, previous_status)
+
@@ -0,0 +1,135 @@
+"""
+Materialized product sales statistics.
+
+Bestseller sorting and the admin top-products report read
+``shop_product_sales_stats`` instead of aggregating every order item per
+request. Rows are updated in the same transaction as the order status
+change that makes an order count as sold (pending -> paid/shipped/delivered)
+or stops it counting (-> cancelled/refunded).
+
+Units also go into per-day buckets (``shop_product_sales_daily``), from
+which the rolling 7/30 day columns are recomputed periodically so they
+decay for products that stop selling.
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+
+from api.metrics import metrics
+from .models import Order, OrderItem, ProductSalesDaily, ProductSalesStats
+
+
+COUNTED_STATUSES = frozenset({"paid", "shipped", "delivered"})
+REVERSED_STATUSES = frozenset({"cancelled", "refunded"})
+
+
+class SalesStats:
+    def record_transition(self, db: Session, order: Order, previous_status: str | None) -> None:
+        """Apply ``order``'s move from ``previous_status`` to its current
+        status. Does not commit; lock the order row first so concurrent
+        transitions (e.g. webhook retries) are applied once."""
+        if previous_status not in COUNTED_STATUSES and order.status in COUNTED_STATUSES:
+            sign = 1
+            order.paid_at = datetime.now(timezone.utc)
+        elif previous_status in COUNTED_STATUSES and order.status in REVERSED_STATUSES:
+            sign = -1
+        else:
+            return
+        lines = db.execute(
+            select(OrderItem.product_id, func.sum(OrderItem.quantity), func.sum(OrderItem.total_cents))
+            .where(OrderItem.order_id == order.id, OrderItem.product_id.is_not(None))
+            .group_by(OrderItem.product_id)
+        ).all()
+        if not lines:
+            return
+
+        sold_at = order.paid_at or datetime.now(timezone.utc)
+        day = sold_at.date()
+        age = (datetime.now(timezone.utc).date() - day).days
+        now = datetime.now(timezone.utc)
+        daily = insert(ProductSalesDaily).values([
+            {"product_id": pid, "day": day, "units": sign * units, "revenue_cents": sign * revenue}
+            for pid, units, revenue in lines
+        ])
+        db.execute(daily.on_conflict_do_update(
+            index_elements=[ProductSalesDaily.product_id, ProductSalesDaily.day],
+            set_={
+                "units": ProductSalesDaily.units + daily.excluded.units,
+                "revenue_cents": ProductSalesDaily.revenue_cents + daily.excluded.revenue_cents,
+            },
+        ))
+        totals = insert(ProductSalesStats).values([
+            {
+                "product_id": pid,
+                "units_sold": sign * units,
+                "revenue_cents": sign * revenue,
+                "units_7d": sign * units if age < 7 else 0,
+                "units_30d": sign * units if age < 30 else 0,
+                "last_sold_at": sold_at if sign > 0 else None,
+                "updated_at": now,
+            }
+            for pid, units, revenue in lines
+        ])
+        db.execute(totals.on_conflict_do_update(
+            index_elements=[ProductSalesStats.product_id],
+            set_={
+                "units_sold": ProductSalesStats.units_sold + totals.excluded.units_sold,
+                "revenue_cents": ProductSalesStats.revenue_cents + totals.excluded.revenue_cents,
+                "units_7d": ProductSalesStats.units_7d + totals.excluded.units_7d,
+                "units_30d": ProductSalesStats.units_30d + totals.excluded.units_30d,
+                "last_sold_at": func.greatest(ProductSalesStats.last_sold_at, totals.excluded.last_sold_at),
+                "updated_at": now,
+            },
+        ))
+        metrics.incr("sales_stats.orders_recorded" if sign > 0 else "sales_stats.orders_reversed")
+
+    def refresh_windows(self, db: Session, *, today: date | None = None) -> int:
+        """Recompute units_7d/units_30d from the daily buckets. Returns the
+        number of rows that changed."""
+        today = today or datetime.now(timezone.utc).date()
+        stats = aliased(ProductSalesStats)
+        daily = ProductSalesDaily
+        windows = (
+            select(
+                stats.product_id.label("product_id"),
+                func.coalesce(func.sum(daily.units).filter(daily.day > today - timedelta(days=7)), 0).label("u7"),
+                func.coalesce(func.sum(daily.units), 0).label("u30"),
+            )
+            .outerjoin(daily, and_(daily.product_id == stats.product_id, daily.day > today - timedelta(days=30)))
+            .group_by(stats.product_id)
+            .subquery()
+        )
+        result = db.execute(
+            update(ProductSalesStats)
+            .where(
+                ProductSalesStats.product_id == windows.c.product_id,
+                or_(ProductSalesStats.units_7d != windows.c.u7, ProductSalesStats.units_30d != windows.c.u30),
+            )
+            .values(units_7d=windows.c.u7, units_30d=windows.c.u30, updated_at=datetime.now(timezone.utc))
+        )
+        db.commit()
+        return result.rowcount
+
+
+sales_stats = SalesStats()
+
+
+async def run_periodically(interval_seconds: int) -> None:
+    from fastapi.concurrency import run_in_threadpool
+    from database import SessionLocal
+
+    def refresh() -> int:
+        with SessionLocal() as db:
+            return sales_stats.refresh_windows(db)
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            with metrics.timer("sales_stats.refresh"):
+                await run_in_threadpool(refresh)
+        except Exception as e:
+            print(f"Warning: sales stats refresh failed: {e}")
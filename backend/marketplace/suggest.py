@@ -0,0 +1,133 @@
+"""
+Typeahead suggestions for the storefront search box.
+
+Product names, tag names and collection names from the catalog snapshot
+go into a sorted array of normalized keys, one per word start, so "tee"
+finds "Black Tee". A lookup is a binary search for the prefix followed by
+a scan of the matching range. Short prefixes match a large share of the
+catalog, so their top results are precomputed when the index is built.
+
+Entries are ranked by popularity: units sold for products, and the summed
+popularity (plus product count) of the products carrying a tag or
+collection. The index is tied to a catalog version and rebuilt next to
+the snapshot when admins change the catalog.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+from dataclasses import dataclass
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .catalog import CatalogSnapshot, catalog
+from .models import ProductSalesStats
+
+
+# Prefixes up to this length get their results precomputed
+PRECOMPUTED_PREFIX_LENGTH = 3
+MAX_SUGGESTIONS = 20
+
+_WORD_START = re.compile(r"(?:^|\s)(?=\S)")
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+@dataclass(frozen=True, slots=True)
+class Suggestion:
+    text: str
+    kind: str  # product, tag, collection
+    weight: int
+    product_id: UUID | None = None
+
+
+class SuggestIndex:
+    def __init__(self, version: int, suggestions: list[Suggestion]) -> None:
+        self.version = version
+        # Positions double as ranks: the best suggestion for a prefix is the
+        # smallest position among its matches
+        self.suggestions = tuple(sorted(suggestions, key=lambda s: (-s.weight, len(s.text), s.text)))
+        entries: list[tuple[str, int]] = []
+        for pos, s in enumerate(self.suggestions):
+            name = normalize(s.text)
+            for m in _WORD_START.finditer(name):
+                entries.append((name[m.end():], pos))
+        entries.sort()
+        self._keys = [k for k, _ in entries]
+        self._positions = [p for _, p in entries]
+        self._top: dict[str, tuple[int, ...]] = {}
+        for key, pos in entries:
+            for n in range(1, min(len(key), PRECOMPUTED_PREFIX_LENGTH) + 1):
+                self._top.setdefault(key[:n], ())
+        for prefix in self._top:
+            self._top[prefix] = self._rank(self._scan(prefix), MAX_SUGGESTIONS)
+
+    @classmethod
+    def build(cls, snapshot: CatalogSnapshot, sales: dict[UUID, int]) -> "SuggestIndex":
+        suggestions: list[Suggestion] = []
+        groups: dict[tuple[str, str], list[int]] = {}
+        for p in snapshot.products:
+            sold = sales.get(p.id, 0)
+            suggestions.append(Suggestion(text=p.name, kind="product", weight=sold, product_id=p.id))
+            for name in p.tag_names:
+                groups.setdefault(("tag", name), []).append(sold)
+            for name in p.collection_names:
+                groups.setdefault(("collection", name), []).append(sold)
+        for (kind, name), sold in groups.items():
+            suggestions.append(Suggestion(text=name, kind=kind, weight=sum(sold) + len(sold)))
+        return cls(snapshot.version, suggestions)
+
+    def lookup(self, prefix: str, limit: int) -> list[Suggestion]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            ranked = self._top.get(prefix, ())[:limit]
+        else:
+            ranked = self._rank(self._scan(prefix), limit)
+        return [self.suggestions[pos] for pos in ranked]
+
+    def _scan(self, prefix: str) -> list[int]:
+        start = bisect.bisect_left(self._keys, prefix)
+        # Every key starting with ``prefix`` sorts before prefix + U+10FFFF
+        end = bisect.bisect_left(self._keys, prefix + "\U0010ffff", start)
+        return self._positions[start:end]
+
+    def _rank(self, positions: list[int], limit: int) -> tuple[int, ...]:
+        # A suggestion appears once per matching word; dedupe before ranking
+        return tuple(heapq.nsmallest(limit, set(positions)))
+
+
+def load_sales(db: Session) -> dict[UUID, int]:
+    """Units sold per product, from the materialized sales stats."""
+    rows = db.execute(select(ProductSalesStats.product_id, ProductSalesStats.units_sold)).all()
+    return {product_id: units for product_id, units in rows}
+
+
+class SuggestCache:
+    def __init__(self) -> None:
+        self._index: SuggestIndex | None = None
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> SuggestIndex:
+        snapshot = catalog.get(db)
+        index = self._index
+        if index is not None and index.version == snapshot.version:
+            return index
+        with self._lock:
+            index = self._index
+            if index is None or index.version != snapshot.version:
+                with metrics.timer("catalog.suggest.rebuild"):
+                    index = SuggestIndex.build(snapshot, load_sales(db))
+                self._index = index
+        return index
+
+
+suggester = SuggestCache()
@@ -0,0 +1,170 @@
+"""
+Stripe webhook intake and processing.
+
+Receiving a webhook only verifies its signature and inserts the event into
+``shop_payment_events`` keyed by Stripe's event id (``ON CONFLICT DO
+NOTHING``), so the endpoint answers 200 in one short transaction and
+redeliveries are dropped. A worker task started by the API drains
+unprocessed events in batches (``FOR UPDATE SKIP LOCKED``, so several API
+processes can run it) and applies the order transitions; a failing event
+is retried on later passes up to ``PAYMENT_EVENTS_MAX_ATTEMPTS`` times.
+
+``sign_payload`` builds a ``Stripe-Signature`` header for a local payload,
+so the endpoint can be exercised without Stripe.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+from datetime import datetime, timezone
+from uuid import UUID
+
+import stripe
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .models import Order, PaymentEvent
+
+
+# Event type -> order status it moves the order to
+HANDLED_EVENTS = {
+    "checkout.session.completed": "paid",
+    "payment_intent.succeeded": "paid",
+}
+
+
+class InvalidWebhook(ValueError):
+    pass
+
+
+def sign_payload(payload: bytes, secret: str, timestamp: int | None = None) -> str:
+    """``Stripe-Signature`` header value for ``payload`` signed with ``secret``."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f"{timestamp}.".encode() + payload
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def parse_event(payload: bytes, sig_header: str | None, secret: str | None) -> dict:
+    """Verify and decode a webhook body. Unsigned bodies are only accepted
+    when no webhook secret is configured (local development)."""
+    try:
+        if secret:
+            stripe.WebhookSignature.verify_header(payload.decode(), sig_header or "", secret, stripe.Webhook.DEFAULT_TOLERANCE)
+        event = json.loads(payload)
+    except Exception as e:
+        raise InvalidWebhook("Invalid webhook") from e
+    if not isinstance(event, dict) or not event.get("id") or not event.get("type"):
+        raise InvalidWebhook("Invalid webhook")
+    return event
+
+
+class PaymentEvents:
+    def __init__(self, *, batch_size: int, max_attempts: int) -> None:
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._wake: asyncio.Event | None = None
+
+    def record(self, db: Session, event: dict) -> bool:
+        """Store ``event`` for processing and commit. Returns False for
+        events already received and for types nobody handles."""
+        if event["type"] not in HANDLED_EVENTS:
+            return False
+        stmt = (
+            insert(PaymentEvent)
+            .values(id=event["id"], provider="stripe", type=event["type"], payload=event, attempts=0, received_at=datetime.now(timezone.utc))
+            .on_conflict_do_nothing(index_elements=[PaymentEvent.id])
+            .returning(PaymentEvent.id)
+        )
+        inserted = db.execute(stmt).scalar_one_or_none() is not None
+        db.commit()
+        metrics.incr("payments.events.received" if inserted else "payments.events.duplicate")
+        return inserted
+
+    def notify(self) -> None:
+        """Wake the worker now instead of at its next poll. Call from the event loop."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def process_pending(self, db: Session) -> int:
+        """Apply one batch of unprocessed events. Returns the batch size."""
+        from .service import MarketplaceService
+
+        service = MarketplaceService()
+        events = db.execute(
+            select(PaymentEvent)
+            .where(PaymentEvent.processed_at.is_(None), PaymentEvent.attempts < self.max_attempts)
+            .order_by(PaymentEvent.received_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        for event in events:
+            try:
+                # A bad event rolls back only its own changes
+                with db.begin_nested():
+                    self._apply(db, service, event)
+                event.processed_at = datetime.now(timezone.utc)
+                metrics.incr("payments.events.processed")
+            except Exception as e:
+                event.attempts += 1
+                event.last_error = str(e)[:1000]
+                metrics.incr("payments.events.failed")
+                print(f"Warning: payment event {event.id} failed: {e}")
+        db.commit()
+        return len(events)
+
+    def _apply(self, db: Session, service, event: PaymentEvent) -> None:
+        from .stats import COUNTED_STATUSES
+
+        data = (event.payload.get("data") or {}).get("object") or {}
+        order_id = (data.get("metadata") or {}).get("order_id")
+        if not order_id:
+            return
+        # Lock the order so concurrent events for it are applied one at a time
+        order = db.get(Order, UUID(order_id), with_for_update=True)
+        if order is None:
+            return
+        status = HANDLED_EVENTS[event.type]
+        # Both success events arrive for one payment, and the order may have shipped meanwhile
+        if order.status not in COUNTED_STATUSES:
+            service.set_order_status(db, order, status)
+        order.payment_provider = "stripe"
+        payment_id = data.get("payment_intent") if event.type == "checkout.session.completed" else data.get("id")
+        if payment_id:
+            order.payment_id = payment_id
+
+
+payment_events = PaymentEvents(
+    batch_size=int(os.getenv("PAYMENT_EVENTS_BATCH_SIZE", "100")),
+    max_attempts=int(os.getenv("PAYMENT_EVENTS_MAX_ATTEMPTS", "10")),
+)
+
+
+async def run_worker(poll_seconds: int) -> None:
+    """Drain events whenever a webhook arrives, and every ``poll_seconds``
+    to pick up retries and events received by other processes."""
+    from fastapi.concurrency import run_in_threadpool
+    from database import SessionLocal
+
+    def drain() -> int:
+        with SessionLocal() as db:
+            return payment_events.process_pending(db)
+
+    payment_events._wake = wake = asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        wake.clear()
+        try:
+            with metrics.timer("payments.events.drain"):
+                while await run_in_threadpool(drain) >= payment_events.batch_size:
+                    pass
+        except Exception as e:
+            print(f"Warning: payment event processing failed: {e}")
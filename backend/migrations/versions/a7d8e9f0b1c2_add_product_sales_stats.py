@@ -0,0 +1,73 @@
+"""add product sales stats
+
+Revision ID: a7d8e9f0b1c2
+Revises: f2c3d4e5a6b7
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d8e9f0b1c2'
+down_revision: Union[str, Sequence[str], None] = 'f2c3d4e5a6b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create sales stats tables and backfill them from existing orders."""
+    op.add_column('shop_orders', sa.Column('paid_at', sa.DateTime(timezone=True), nullable=True))
+    # Orders had no paid-at timestamp; updated_at is the closest record of it
+    op.execute("UPDATE shop_orders SET paid_at = updated_at WHERE status IN ('paid', 'shipped', 'delivered')")
+    op.create_table('shop_product_sales_stats',
+        sa.Column('product_id', sa.UUID(), nullable=False),
+        sa.Column('units_sold', sa.Integer(), nullable=False),
+        sa.Column('revenue_cents', sa.BigInteger(), nullable=False),
+        sa.Column('units_7d', sa.Integer(), nullable=False),
+        sa.Column('units_30d', sa.Integer(), nullable=False),
+        sa.Column('last_sold_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['shop_products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index(op.f('ix_shop_product_sales_stats_units_7d'), 'shop_product_sales_stats', ['units_7d'], unique=False)
+    op.create_index(op.f('ix_shop_product_sales_stats_units_30d'), 'shop_product_sales_stats', ['units_30d'], unique=False)
+    op.create_table('shop_product_sales_daily',
+        sa.Column('product_id', sa.UUID(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue_cents', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['shop_products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id', 'day')
+    )
+
+    op.execute("""
+        INSERT INTO shop_product_sales_daily (product_id, day, units, revenue_cents)
+        SELECT i.product_id, (o.paid_at AT TIME ZONE 'UTC')::date, sum(i.quantity), sum(i.total_cents)
+        FROM shop_order_items i JOIN shop_orders o ON o.id = i.order_id
+        WHERE o.status IN ('paid', 'shipped', 'delivered') AND i.product_id IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    op.execute("""
+        INSERT INTO shop_product_sales_stats
+            (product_id, units_sold, revenue_cents, units_7d, units_30d, last_sold_at, updated_at)
+        SELECT product_id, sum(units), sum(revenue_cents),
+               coalesce(sum(units) FILTER (WHERE day > (now() AT TIME ZONE 'UTC')::date - 7), 0),
+               coalesce(sum(units) FILTER (WHERE day > (now() AT TIME ZONE 'UTC')::date - 30), 0),
+               max(day)::timestamptz, now()
+        FROM shop_product_sales_daily
+        GROUP BY product_id
+    """)
+
+
+def downgrade() -> None:
+    """Drop sales stats tables."""
+    op.drop_table('shop_product_sales_daily')
+    op.drop_index(op.f('ix_shop_product_sales_stats_units_30d'), table_name='shop_product_sales_stats')
+    op.drop_index(op.f('ix_shop_product_sales_stats_units_7d'), table_name='shop_product_sales_stats')
+    op.drop_table('shop_product_sales_stats')
+    op.drop_column('shop_orders', 'paid_at')
@@ -0,0 +1,31 @@
+"""add image derivatives
+
+Revision ID: b3f1c2d4e5a6
+Revises: a1115c7b7af3
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f1c2d4e5a6'
+down_revision: Union[str, Sequence[str], None] = 'a1115c7b7af3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Store generated image derivatives alongside media and product images."""
+    op.add_column('community_media', sa.Column('derivatives', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('shop_product_images', sa.Column('derivatives', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop image derivative columns."""
+    op.drop_column('shop_product_images', 'derivatives')
+    op.drop_column('community_media', 'derivatives')
@@ -0,0 +1,45 @@
+"""add inventory holds
+
+Revision ID: b8e9f0a1c2d3
+Revises: a7d8e9f0b1c2
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e9f0a1c2d3'
+down_revision: Union[str, Sequence[str], None] = 'a7d8e9f0b1c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create inventory holds and the per-variant held counter."""
+    op.add_column('shop_product_variants', sa.Column('held_quantity', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('shop_inventory_holds',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('order_id', sa.UUID(), nullable=False),
+        sa.Column('variant_id', sa.UUID(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['shop_orders.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['variant_id'], ['shop_product_variants.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('order_id', 'variant_id', name='uq_inventory_hold_order_variant')
+    )
+    op.create_index(op.f('ix_shop_inventory_holds_expires_at'), 'shop_inventory_holds', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_shop_inventory_holds_variant_id'), 'shop_inventory_holds', ['variant_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop inventory holds."""
+    op.drop_index(op.f('ix_shop_inventory_holds_variant_id'), table_name='shop_inventory_holds')
+    op.drop_index(op.f('ix_shop_inventory_holds_expires_at'), table_name='shop_inventory_holds')
+    op.drop_table('shop_inventory_holds')
+    op.drop_column('shop_product_variants', 'held_quantity')
@@ -0,0 +1,40 @@
+"""add storage blobs dedup index
+
+Revision ID: c8d2e4f6a1b3
+Revises: b3f1c2d4e5a6
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8d2e4f6a1b3'
+down_revision: Union[str, Sequence[str], None] = 'b3f1c2d4e5a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the content-addressed blob index."""
+    op.create_table('storage_blobs',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('bucket', sa.String(length=63), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('object_key', sa.String(length=512), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('bucket', 'sha256', name='uq_storage_blob_hash'),
+        sa.UniqueConstraint('bucket', 'object_key', name='uq_storage_blob_key'),
+    )
+
+
+def downgrade() -> None:
+    """Drop the content-addressed blob index."""
+    op.drop_table('storage_blobs')
@@ -0,0 +1,41 @@
+"""add payment events
+
+Revision ID: c9f0a1b2d3e4
+Revises: b8e9f0a1c2d3
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9f0a1b2d3e4'
+down_revision: Union[str, Sequence[str], None] = 'b8e9f0a1c2d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the payment webhook event log."""
+    op.create_table('shop_payment_events',
+        sa.Column('id', sa.String(length=255), nullable=False),
+        sa.Column('provider', sa.String(length=32), nullable=False),
+        sa.Column('type', sa.String(length=64), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_shop_payment_events_pending', 'shop_payment_events', ['received_at'], unique=False, postgresql_where=sa.text('processed_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Drop the payment webhook event log."""
+    op.drop_index('ix_shop_payment_events_pending', table_name='shop_payment_events', postgresql_where=sa.text('processed_at IS NULL'))
+    op.drop_table('shop_payment_events')
@@ -0,0 +1,32 @@
+"""add order checkout session
+
+Revision ID: d0b1c2e3f4a5
+Revises: c9f0a1b2d3e4
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0b1c2e3f4a5'
+down_revision: Union[str, Sequence[str], None] = 'c9f0a1b2d3e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Remember each order's open checkout session."""
+    op.add_column('shop_orders', sa.Column('checkout_session_id', sa.String(length=255), nullable=True))
+    op.add_column('shop_orders', sa.Column('checkout_url', sa.Text(), nullable=True))
+    op.add_column('shop_orders', sa.Column('checkout_expires_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop the checkout session columns."""
+    op.drop_column('shop_orders', 'checkout_expires_at')
+    op.drop_column('shop_orders', 'checkout_url')
+    op.drop_column('shop_orders', 'checkout_session_id')
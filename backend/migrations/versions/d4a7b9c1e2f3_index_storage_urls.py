@@ -0,0 +1,32 @@
+"""index storage urls
+
+Revision ID: d4a7b9c1e2f3
+Revises: c8d2e4f6a1b3
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7b9c1e2f3'
+down_revision: Union[str, Sequence[str], None] = 'c8d2e4f6a1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Index URL columns so the storage sweeper can check references in batches."""
+    op.create_index(op.f('ix_community_media_url'), 'community_media', ['url'], unique=False)
+    op.create_index(op.f('ix_shop_product_images_url'), 'shop_product_images', ['url'], unique=False)
+    op.create_index(op.f('ix_community_users_avatar_url'), 'community_users', ['avatar_url'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop storage URL indexes."""
+    op.drop_index(op.f('ix_community_users_avatar_url'), table_name='community_users')
+    op.drop_index(op.f('ix_shop_product_images_url'), table_name='shop_product_images')
+    op.drop_index(op.f('ix_community_media_url'), table_name='community_media')
@@ -0,0 +1,34 @@
+"""add catalog version counter
+
+Revision ID: e1b2c3d4f5a6
+Revises: d4a7b9c1e2f3
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b2c3d4f5a6'
+down_revision: Union[str, Sequence[str], None] = 'd4a7b9c1e2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the single-row catalog version counter."""
+    op.create_table('shop_catalog_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO shop_catalog_version (id, version, updated_at) VALUES (1, 0, now())")
+
+
+def downgrade() -> None:
+    """Drop the catalog version counter."""
+    op.drop_table('shop_catalog_version')
@@ -0,0 +1,28 @@
+"""add catalog stock version
+
+Revision ID: e5f6a7b8c9d0
+Revises: d0b1c2e3f4a5
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f6a7b8c9d0'
+down_revision: Union[str, Sequence[str], None] = 'd0b1c2e3f4a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Count stock changes (holds, payments, releases) next to the catalog version."""
+    op.add_column('shop_catalog_version', sa.Column('stock_version', sa.BigInteger(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Drop the stock version counter."""
+    op.drop_column('shop_catalog_version', 'stock_version')
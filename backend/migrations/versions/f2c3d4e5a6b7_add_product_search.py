@@ -0,0 +1,103 @@
+"""add product full-text and trigram search
+
+Revision ID: f2c3d4e5a6b7
+Revises: e1b2c3d4f5a6
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c3d4e5a6b7'
+down_revision: Union[str, Sequence[str], None] = 'e1b2c3d4f5a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the weighted product search vector, its triggers, and trigram indexes."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('shop_products', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # name (A), tag names (B), description (C)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION shop_products_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce((
+                    SELECT string_agg(t.name, ' ')
+                    FROM shop_product_tags pt JOIN shop_tags t ON t.id = pt.tag_id
+                    WHERE pt.product_id = NEW.id
+                ), '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    # Only writes to the indexed text recompute it, so price and stock updates
+    # stay cheap; search_vector is listed so "SET search_vector = NULL" (below)
+    # forces a recompute
+    op.execute("""
+        CREATE TRIGGER shop_products_search_vector_trg
+        BEFORE INSERT OR UPDATE OF name, description, search_vector ON shop_products
+        FOR EACH ROW EXECUTE FUNCTION shop_products_search_vector()
+    """)
+    # Tag links and tag renames touch the product row so the trigger above recomputes it
+    op.execute("""
+        CREATE OR REPLACE FUNCTION shop_product_tags_touch_product() RETURNS trigger AS $$
+        BEGIN
+            UPDATE shop_products SET search_vector = NULL
+            WHERE id = CASE WHEN TG_OP = 'DELETE' THEN OLD.product_id ELSE NEW.product_id END;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER shop_product_tags_search_trg
+        AFTER INSERT OR DELETE ON shop_product_tags
+        FOR EACH ROW EXECUTE FUNCTION shop_product_tags_touch_product()
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION shop_tags_touch_products() RETURNS trigger AS $$
+        BEGIN
+            UPDATE shop_products SET search_vector = NULL
+            WHERE id IN (SELECT product_id FROM shop_product_tags WHERE tag_id = NEW.id);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER shop_tags_search_trg
+        AFTER UPDATE OF name ON shop_tags
+        FOR EACH ROW EXECUTE FUNCTION shop_tags_touch_products()
+    """)
+    # Backfill through the trigger
+    op.execute("UPDATE shop_products SET search_vector = NULL")
+
+    op.create_index('ix_shop_products_search_vector', 'shop_products', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_shop_products_name_trgm', 'shop_products', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_community_users_username_trgm', 'community_users', ['username'], unique=False, postgresql_using='gin', postgresql_ops={'username': 'gin_trgm_ops'})
+    op.create_index('ix_community_users_email_trgm', 'community_users', ['email'], unique=False, postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'})
+    op.create_index('ix_community_users_display_name_trgm', 'community_users', ['display_name'], unique=False, postgresql_using='gin', postgresql_ops={'display_name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Drop product search and trigram indexes."""
+    op.drop_index('ix_community_users_display_name_trgm', table_name='community_users')
+    op.drop_index('ix_community_users_email_trgm', table_name='community_users')
+    op.drop_index('ix_community_users_username_trgm', table_name='community_users')
+    op.drop_index('ix_shop_products_name_trgm', table_name='shop_products')
+    op.drop_index('ix_shop_products_search_vector', table_name='shop_products')
+    op.execute("DROP TRIGGER IF EXISTS shop_tags_search_trg ON shop_tags")
+    op.execute("DROP TRIGGER IF EXISTS shop_product_tags_search_trg ON shop_product_tags")
+    op.execute("DROP TRIGGER IF EXISTS shop_products_search_vector_trg ON shop_products")
+    op.execute("DROP FUNCTION IF EXISTS shop_tags_touch_products()")
+    op.execute("DROP FUNCTION IF EXISTS shop_product_tags_touch_product()")
+    op.execute("DROP FUNCTION IF EXISTS shop_products_search_vector()")
+    op.drop_column('shop_products', 'search_vector')
@@ -0,0 +1,152 @@
+"""
+Content-addressed storage with deduplication.
+
+Uploads are hashed (SHA-256) in chunks while being read from their spooled
+temp file, then stored under ``cas/<h[:2]>/<h>.<ext>``. The
+``storage_blobs`` index maps each hash to its object and a reference
+count, so uploading the same bytes again skips the storage write and
+reuses the existing URL.
+"""
+
+import hashlib
+from dataclasses import dataclass, replace
+from typing import BinaryIO
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from .models import StoredBlob
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_stream(stream: BinaryIO) -> tuple[str, int]:
+    """Return (sha256 hex, size) of ``stream`` and rewind it for upload."""
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    while True:
+        chunk = stream.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+def content_key(sha256: str, ext: str) -> str:
+    return f"cas/{sha256[:2]}/{sha256}.{ext}"
+
+
+def content_sha(object_key: str) -> str | None:
+    """Hash behind a content-addressed key (original or derivative)."""
+    if not object_key.startswith("cas/"):
+        return None
+    sha256 = object_key.rsplit("/", 1)[-1][:64]
+    return sha256 if len(sha256) == 64 else None
+
+
+@dataclass(frozen=True, slots=True)
+class Blob:
+    sha256: str
+    object_key: str
+    size_bytes: int
+    content_type: str | None
+    references: int = 1
+
+
+class BlobIndex:
+    """Reference-counted lookup of content-addressed objects.
+
+    Methods do not commit; the caller's transaction decides whether the
+    references are kept, so a failed product insert does not leak counts.
+
+    A row stays (at ``ref_count`` 0) after its last reference is released
+    until the purge worker or the sweeper has removed the object; both lock
+    the row and re-check the count in the transaction that deletes it, and
+    ``acquire`` takes the same row lock, so an object is never reused and
+    removed at the same time.
+    """
+
+    def acquire(self, db: Session, *, bucket: str, blobs: list[Blob]) -> dict[str, tuple[str, bool]]:
+        """Add ``references`` to each blob's count, creating rows as needed,
+        in one upsert (rows are locked until the caller's transaction ends).
+
+        Returns sha256 -> (object key, must upload). The key is the existing
+        one when the content is already indexed; the bytes must be uploaded
+        when the row is new or had no references left, since its object may
+        already be purged.
+        """
+        merged: dict[str, Blob] = {}
+        for blob in blobs:
+            seen = merged.get(blob.sha256)
+            merged[blob.sha256] = blob if seen is None else replace(seen, references=seen.references + blob.references)
+        if not merged:
+            return {}
+        stmt = insert(StoredBlob).values([
+            {
+                "bucket": bucket,
+                "sha256": blob.sha256,
+                "object_key": blob.object_key,
+                "size_bytes": blob.size_bytes,
+                "content_type": blob.content_type,
+                "ref_count": blob.references,
+            }
+            # Hash order, so concurrent uploads of overlapping content lock rows in the same order
+            for blob in sorted(merged.values(), key=lambda b: b.sha256)
+        ])
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_storage_blob_hash",
+            set_={"ref_count": StoredBlob.ref_count + stmt.excluded.ref_count},
+        ).returning(StoredBlob.sha256, StoredBlob.object_key, StoredBlob.ref_count)
+        return {
+            sha256: (object_key, ref_count == merged[sha256].references)
+            for sha256, object_key, ref_count in db.execute(stmt).all()
+        }
+
+    def release(self, db: Session, *, bucket: str, object_key: str) -> int | None:
+        """Drop one reference. Returns the remaining count, or None if the
+        object is not content-addressed (and so owned by a single row).
+
+        At 0 the row is kept for whoever removes the object (see
+        ``lock_for_removal``).
+        """
+        return db.execute(
+            update(StoredBlob)
+            .where(StoredBlob.bucket == bucket, StoredBlob.object_key == object_key)
+            .values(ref_count=func.greatest(StoredBlob.ref_count - 1, 0))
+            .returning(StoredBlob.ref_count)
+        ).scalar_one_or_none()
+
+    def lock_for_removal(self, db: Session, *, bucket: str, object_keys: list[str]) -> dict[str, int]:
+        """Lock the index rows behind ``object_keys`` (originals and their
+        derivatives, by hash, in hash order) and return key -> current
+        ``ref_count`` for keys whose content is indexed. Remove only objects
+        at 0 and ``forget`` them before committing."""
+        shas = {content_sha(k): k for k in object_keys}
+        shas.pop(None, None)
+        if not shas:
+            return {}
+        counts = dict(db.execute(
+            select(StoredBlob.sha256, StoredBlob.ref_count)
+            .where(StoredBlob.bucket == bucket, StoredBlob.sha256.in_(list(shas)))
+            .order_by(StoredBlob.sha256)
+            .with_for_update()
+        ).all())
+        return {k: counts[content_sha(k)] for k in object_keys if content_sha(k) in counts}
+
+    def forget(self, db: Session, *, bucket: str, object_keys: list[str]) -> None:
+        """Delete the rows of removed objects, unless they were referenced again."""
+        shas = {content_sha(k) for k in object_keys} - {None}
+        if shas:
+            db.execute(delete(StoredBlob).where(
+                StoredBlob.bucket == bucket,
+                StoredBlob.sha256.in_(list(shas)),
+                StoredBlob.ref_count <= 0,
+            ))
+
+
+blob_index = BlobIndex()
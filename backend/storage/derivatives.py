@@ -0,0 +1,197 @@
+"""
+Responsive image derivatives.
+
+After thread media or product images are attached, the original is resized
+to the configured widths and re-encoded (WebP by default, AVIF optionally).
+Derivatives are written next to the original in the same bucket, e.g.
+``uploads/ab12.jpg`` -> ``uploads/ab12.w640.webp``, and recorded on the
+row's ``derivatives`` column so responses can expose a ``srcset``.
+
+Work runs off-request: a small thread pool handles storage and DB I/O and
+hands decoding/encoding to a process pool so it never competes with
+request handling for the GIL.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .minio_service import get_minio_service
+
+try:
+    from PIL import Image, ImageOps  # type: ignore
+except Exception:  # pragma: no cover - Pillow is required only for derivatives
+    Image = None  # type: ignore
+    ImageOps = None  # type: ignore
+
+
+def render_derivatives(data: bytes, widths: tuple[int, ...], formats: tuple[str, ...], quality: int) -> list[tuple[int, str, bytes]]:
+    """Resize ``data`` to each width narrower than the original and encode it.
+
+    Runs inside the process pool, so it must stay a picklable top-level
+    function. Returns (width, format, encoded bytes) tuples.
+    """
+    rendered: list[tuple[int, str, bytes]] = []
+    with Image.open(BytesIO(data)) as source:
+        img = ImageOps.exif_transpose(source)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        for width in sorted(set(widths)):
+            # Never upscale: the original already serves larger viewports
+            if width >= img.width:
+                continue
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                buf = BytesIO()
+                resized.save(buf, format=fmt.upper(), quality=quality)
+                rendered.append((width, fmt, buf.getvalue()))
+    return rendered
+
+
+def derivative_key(object_key: str, width: int, fmt: str) -> str:
+    stem = object_key.rsplit(".", 1)[0] if "." in object_key.rsplit("/", 1)[-1] else object_key
+    return f"{stem}.w{width}.{fmt}"
+
+
+def _parse_csv(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+class _Batch:
+    """Rows of one ``enqueue`` call; reports when the last one finishes."""
+
+    def __init__(self, size: int, on_update: Callable[[Session], None]) -> None:
+        self.on_update = on_update
+        self._pending = size
+        self._changed = False
+        self._lock = threading.Lock()
+
+    def finish(self, changed: bool) -> bool:
+        """Record one finished row; True once all are done and any changed."""
+        with self._lock:
+            self._changed |= changed
+            self._pending -= 1
+            return self._pending == 0 and self._changed
+
+
+class DerivativePipeline:
+    def __init__(self, *, widths: list[int], formats: list[str], quality: int, workers: int) -> None:
+        self.widths = tuple(widths)
+        self.formats = tuple(f.lower() for f in formats)
+        self.quality = quality
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._dispatch: ThreadPoolExecutor | None = None
+        self._encoders: ProcessPoolExecutor | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and bool(self.widths) and bool(self.formats) and self.workers > 0
+
+    def enqueue(self, model, row_ids: list[UUID], on_update: Callable[[Session], None] | None = None) -> None:
+        """Schedule derivative generation for ``model`` rows (Media or ProductImage).
+
+        ``on_update`` runs once, in its own transaction, after the last of
+        ``row_ids`` is done and if any row got derivatives, e.g. to
+        invalidate caches built from those rows without one rebuild per row.
+        """
+        if not self.enabled or not row_ids:
+            return
+        dispatch = self._ensure_pools()
+        batch = _Batch(len(row_ids), on_update) if on_update is not None else None
+        for row_id in row_ids:
+            metrics.incr("image_derivatives.enqueued")
+            dispatch.submit(self._run, model, row_id, batch)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._dispatch is not None:
+                self._dispatch.shutdown(wait=False, cancel_futures=True)
+            if self._encoders is not None:
+                self._encoders.shutdown(wait=False, cancel_futures=True)
+            self._dispatch = self._encoders = None
+
+    def _ensure_pools(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._dispatch is None:
+                self._dispatch = ThreadPoolExecutor(max_workers=self.workers * 2, thread_name_prefix="derivatives")
+                # spawn: never fork a process that is running request threads
+                self._encoders = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._dispatch
+
+    def _run(self, model, row_id: UUID, batch: _Batch | None) -> None:
+        changed = False
+        try:
+            changed = self._process(model, row_id)
+        finally:
+            if batch is not None and batch.finish(changed):
+                self._notify(batch.on_update)
+
+    def _notify(self, on_update: Callable[[Session], None]) -> None:
+        from database import SessionLocal
+
+        try:
+            with SessionLocal() as db:
+                on_update(db)
+                db.commit()
+        except Exception as e:
+            print(f"Warning: derivative update callback failed: {e}")
+
+    def _process(self, model, row_id: UUID) -> bool:
+        """Generate (or reuse) derivatives for one row; True if it changed."""
+        from database import SessionLocal
+
+        storage = get_minio_service()
+        try:
+            with metrics.timer("image_derivatives.job"), SessionLocal() as db:
+                row = db.get(model, row_id)
+                if row is None or row.derivatives:
+                    return False
+                # Deduplicated uploads share one object: reuse its derivatives
+                shared = db.execute(
+                    select(model.derivatives).where(model.url == row.url, model.derivatives.is_not(None)).limit(1)
+                ).scalar_one_or_none()
+                if shared:
+                    row.derivatives = shared
+                    db.commit()
+                    return True
+                located = storage.parse_public_url(row.url)
+                if located is None:
+                    return False
+                bucket, object_key = located
+                data = storage.get_object_bytes(bucket=bucket, object_key=object_key)
+                rendered = self._encoders.submit(render_derivatives, data, self.widths, self.formats, self.quality).result()
+                derivatives = []
+                for width, fmt, blob in rendered:
+                    key = derivative_key(object_key, width, fmt)
+                    storage.put_object_from_bytes(bucket=bucket, object_key=key, data=blob, content_type=f"image/{fmt}")
+                    derivatives.append({
+                        "url": storage.build_public_url(bucket=bucket, object_key=key),
+                        "width": width,
+                        "format": fmt,
+                    })
+                row.derivatives = derivatives
+                db.commit()
+            metrics.incr("image_derivatives.generated", len(derivatives))
+            return True
+        except Exception as e:
+            metrics.incr("image_derivatives.failed")
+            print(f"Warning: could not generate derivatives for {model.__name__} {row_id}: {e}")
+            return False
+
+
+image_pipeline = DerivativePipeline(
+    widths=[int(w) for w in _parse_csv(os.getenv("IMAGE_DERIVATIVE_WIDTHS", "320,640,1080"))],
+    formats=_parse_csv(os.getenv("IMAGE_DERIVATIVE_FORMATS", "webp")),
+    quality=int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80")),
+    workers=int(os.getenv("IMAGE_DERIVATIVE_WORKERS", "2")),
+)
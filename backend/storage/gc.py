@@ -0,0 +1,218 @@
+"""
+Garbage collection of orphaned storage objects.
+
+Clients upload thread media and avatars straight to MinIO and only then
+attach them, so abandoned posts and replaced avatars leave objects that no
+row points at. The sweeper walks each upload prefix with ``list_objects``
+(paged by the client), checks keys in batches against the objects that
+``Media.url``, ``ProductImage.url`` and ``User.avatar_url`` point at, and
+bulk-deletes objects that are unreferenced and older than a grace period.
+
+Stored URLs are matched by (bucket, object key) taken from their path, not
+by the full URL, so rows written under an older public base URL or host
+still keep their objects alive.
+
+Sweeps only report by default. Run one with ``python -m storage.gc
+[--delete]``; the API sweeps every ``STORAGE_GC_INTERVAL_SECONDS`` and
+deletes only with ``STORAGE_GC_DELETE=true``.
+"""
+
+import asyncio
+import os
+import re
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .dedup import blob_index, content_sha
+from .minio_service import MinioService, get_minio_service
+from .models import StoredBlob
+
+
+# Derivatives (``<stem>.w<width>.<fmt>``) live as long as their original
+DERIVATIVE_RE = re.compile(r"^(?P<stem>.+)\.w\d+\.(webp|avif)$")
+ORIGINAL_EXTENSIONS = ("jpg", "jpeg", "png", "webp")
+
+# Arbitrary constant identifying the sweeper's Postgres advisory lock
+GC_LOCK_ID = 0x6F6E6574
+
+
+def object_ref(url: str | None, buckets) -> tuple[str, str] | None:
+    """(bucket, object key) a stored URL points at, whatever host or base
+    path it was built with; None when its path is in none of ``buckets``."""
+    if not url:
+        return None
+    path = urlparse(url).path
+    for bucket in buckets:
+        start = path.find(f"/{bucket}/")
+        if start != -1 and len(path) > start + len(bucket) + 2:
+            return bucket, path[start + len(bucket) + 2:]
+    return None
+
+
+@dataclass
+class SweepReport:
+    scanned: int = 0
+    too_recent: int = 0
+    referenced: int = 0
+    removed: int = 0
+    removed_bytes: int = 0
+    errors: int = 0
+    dry_run: bool = False
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class OrphanSweeper:
+    def __init__(self, storage: MinioService, *, grace_seconds: int, batch_size: int = 500) -> None:
+        self.storage = storage
+        self.grace = timedelta(seconds=grace_seconds)
+        self.batch_size = batch_size
+
+    def targets(self) -> list[tuple[str, str]]:
+        s = self.storage
+        return [
+            (s.bucket_threads, "uploads/"),
+            (s.bucket_avatars, "avatars/"),
+            (s.bucket_products, "products/"),
+            (s.bucket_products, "cas/"),
+        ]
+
+    def sweep(self, db: Session, *, dry_run: bool = True) -> SweepReport:
+        report = SweepReport(dry_run=dry_run)
+        # Loaded once per sweep; uploads attached while it runs are younger than the grace period
+        cutoff = datetime.now(timezone.utc) - self.grace
+        referenced = self._referenced_keys(db)
+        for bucket, prefix in self.targets():
+            batch = []
+            for obj in self.storage.client.list_objects(bucket, prefix=prefix, recursive=True):
+                if obj.is_dir:
+                    continue
+                report.scanned += 1
+                if obj.last_modified is None or obj.last_modified > cutoff:
+                    report.too_recent += 1
+                    continue
+                batch.append(obj)
+                if len(batch) >= self.batch_size:
+                    self._collect(db, bucket, batch, referenced, report, dry_run)
+                    batch = []
+            if batch:
+                self._collect(db, bucket, batch, referenced, report, dry_run)
+        return report
+
+    def _collect(self, db: Session, bucket: str, objects: list, referenced: set[tuple[str, str]], report: SweepReport, dry_run: bool) -> None:
+        # Keys whose presence keeps each object alive: itself, or its original
+        owners: dict[str, list[str]] = {}
+        for obj in objects:
+            m = DERIVATIVE_RE.match(obj.object_name)
+            owners[obj.object_name] = [f"{m['stem']}.{ext}" for ext in ORIGINAL_EXTENSIONS] if m else [obj.object_name]
+        candidate_keys = {k for keys in owners.values() for k in keys}
+
+        live_keys = {k for k in candidate_keys if (bucket, k) in referenced}
+        live_keys.update(db.execute(
+            select(StoredBlob.object_key).where(
+                StoredBlob.bucket == bucket,
+                StoredBlob.object_key.in_(candidate_keys),
+                StoredBlob.ref_count > 0,
+            )
+        ).scalars())
+
+        orphans = [obj for obj in objects if not live_keys.intersection(owners[obj.object_name])]
+        report.referenced += len(objects) - len(orphans)
+        if not orphans:
+            return
+        failed: set[str] = set()
+        if not dry_run:
+            # Re-check content-addressed orphans under their index row locks, held until the removal is recorded
+            counts = blob_index.lock_for_removal(db, bucket=bucket, object_keys=[obj.object_name for obj in orphans])
+            reused = [obj for obj in orphans if counts.get(obj.object_name, 0) > 0]
+            report.referenced += len(reused)
+            orphans = [obj for obj in orphans if counts.get(obj.object_name, 0) <= 0]
+            keys = [obj.object_name for obj in orphans]
+            errors = self.storage.remove_objects(bucket, keys) if keys else []
+            failed = {e.name for e in errors}
+            report.errors += len(failed)
+            kept = {content_sha(k) for k in failed}
+            blob_index.forget(db, bucket=bucket, object_keys=[k for k in keys if content_sha(k) not in kept])
+            db.commit()
+        for obj in orphans:
+            if obj.object_name not in failed:
+                report.removed += 1
+                report.removed_bytes += obj.size or 0
+
+    def _referenced_keys(self, db: Session) -> set[tuple[str, str]]:
+        """Every (bucket, object key) a row points at, in one streamed pass."""
+        from community.models import Media, User
+        from marketplace.models import ProductImage
+
+        buckets = {bucket for bucket, _ in self.targets()}
+        stmt = union(
+            select(Media.url),
+            select(ProductImage.url),
+            select(User.avatar_url).where(User.avatar_url.is_not(None)),
+        )
+        keys = set()
+        for url in db.execute(stmt.execution_options(yield_per=5000)).scalars():
+            ref = object_ref(url, buckets)
+            if ref is not None:
+                keys.add(ref)
+        return keys
+
+
+def run_sweep(*, dry_run: bool = True) -> SweepReport | None:
+    """One sweep under a Postgres advisory lock; returns None if another
+    process is already sweeping."""
+    from database import engine
+
+    sweeper = OrphanSweeper(
+        get_minio_service(),
+        grace_seconds=int(os.getenv("STORAGE_GC_GRACE_SECONDS", str(24 * 3600))),
+        batch_size=int(os.getenv("STORAGE_GC_BATCH_SIZE", "500")),
+    )
+    # Advisory locks belong to a connection, so hold one for the whole sweep
+    with engine.connect() as conn:
+        locked = conn.execute(select(func.pg_try_advisory_lock(GC_LOCK_ID))).scalar()
+        conn.commit()
+        if not locked:
+            return None
+        try:
+            with metrics.timer("storage.gc.sweep"), Session(bind=conn) as db:
+                report = sweeper.sweep(db, dry_run=dry_run)
+        finally:
+            conn.execute(select(func.pg_advisory_unlock(GC_LOCK_ID)))
+            conn.commit()
+    if not dry_run:
+        metrics.incr("storage.gc.removed", report.removed)
+        metrics.incr("storage.gc.removed_bytes", report.removed_bytes)
+    return report
+
+
+async def run_periodically(interval_seconds: int) -> None:
+    from fastapi.concurrency import run_in_threadpool
+
+    delete = os.getenv("STORAGE_GC_DELETE", "false").lower() in {"1", "true", "yes"}
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            report = await run_in_threadpool(run_sweep, dry_run=not delete)
+            if report is not None:
+                print(f"Storage GC: {report.as_dict()}")
+        except Exception as e:
+            print(f"Warning: storage GC failed: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Remove unreferenced objects from storage buckets.")
+    parser.add_argument("--delete", action="store_true", help="delete orphans (default: only report what would be removed)")
+    args = parser.parse_args()
+    result = run_sweep(dry_run=not args.delete)
+    print(json.dumps(result.as_dict() if result else {"skipped": "another sweep is running"}, indent=2))
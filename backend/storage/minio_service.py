@@ -1,15 +1,46 @@
 import os
-from datetime import timedelta
-from typing import Literal
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, BinaryIO, Literal
 
+import certifi
+import urllib3
+from functools import lru_cache
 from minio import Minio
+from minio.datatypes import PostPolicy
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
 from uuid import uuid4
+
+from api.metrics import metrics
 from typing import Optional
 try:
     # Optional import for convenience functions that accept UploadFile
     from fastapi import UploadFile  # type: ignore
 except Exception:  # pragma: no cover - FastAPI not always available at import time
     UploadFile = None  # type: ignore
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
+
+
+# Multipart part size for streamed uploads (minimum allowed by S3 is 5 MiB)
+UPLOAD_PART_SIZE = 10 * 1024 * 1024
+
+# Thread media uploads (presigned): content type -> stored extension
+MEDIA_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "video/mp4": "mp4",
+    "video/webm": "webm",
+    "video/quicktime": "mov",
+}
+
+# Bucket bootstrap state is per process, shared by every MinioService instance
+_buckets_ready = threading.Event()
+_buckets_lock = threading.Lock()
 
 
 class MinioService:
@@ -27,15 +58,26 @@ class MinioService:
         secret_key = os.getenv("MINIO_ROOT_PASSWORD", "minioadmin")
         secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
         region = os.getenv("MINIO_REGION", "ap-south-1")
-        self.client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure, region=region)
+        self.endpoint_url = f"{'https' if secure else 'http'}://{endpoint}"
+        self.client = Minio(
+            endpoint,
+            access_key=access_key,
+            secret_key=secret_key,
+            secure=secure,
+            region=region,
+            http_client=build_http_client(),
+        )
 
         self.bucket_avatars = os.getenv("MINIO_BUCKET_AVATARS", "onetee-avatars")
         self.bucket_threads = os.getenv("MINIO_BUCKET_THREADS", "onetee-threads")
         self.bucket_products = os.getenv("MINIO_BUCKET_PRODUCTS", "onetee-products")
 
     def ensure_bucket(self, bucket: str) -> None:
-        if not self.client.bucket_exists(bucket):
-            self.client.make_bucket(bucket)
+        with metrics.timer("storage.bucket_exists"):
+            exists = self.client.bucket_exists(bucket)
+        if not exists:
+            with metrics.timer("storage.make_bucket"):
+                self.client.make_bucket(bucket)
 
     def ensure_all_buckets(self) -> None:
         for b in (self.bucket_avatars, self.bucket_threads, self.bucket_products):
@@ -44,6 +86,20 @@ class MinioService:
         # Set public read policy for avatar bucket
         self.set_avatar_bucket_public()
 
+    def ensure_ready(self) -> None:
+        """Create buckets and public policies once per process.
+
+        Called at application startup; afterwards this is a flag check, so
+        request paths can call it without any network round-trips.
+        """
+        if _buckets_ready.is_set():
+            return
+        with _buckets_lock:
+            if _buckets_ready.is_set():
+                return
+            self.ensure_all_buckets()
+            _buckets_ready.set()
+
     def set_avatar_bucket_public(self) -> None:
         """Set the avatar bucket to allow public read access."""
         try:
@@ -59,7 +115,8 @@ class MinioService:
                 ]
             }
             import json
-            self.client.set_bucket_policy(self.bucket_avatars, json.dumps(policy))
+            with metrics.timer("storage.set_bucket_policy"):
+                self.client.set_bucket_policy(self.bucket_avatars, json.dumps(policy))
             
             # Also set public read access for thread bucket
             thread_policy = {
@@ -73,7 +130,8 @@ class MinioService:
                     }
                 ]
             }
-            self.client.set_bucket_policy(self.bucket_threads, json.dumps(thread_policy))
+            with metrics.timer("storage.set_bucket_policy"):
+                self.client.set_bucket_policy(self.bucket_threads, json.dumps(thread_policy))
 
             # Also set public read access for product bucket
             product_policy = {
@@ -87,7 +145,8 @@ class MinioService:
                     }
                 ]
             }
-            self.client.set_bucket_policy(self.bucket_products, json.dumps(product_policy))
+            with metrics.timer("storage.set_bucket_policy"):
+                self.client.set_bucket_policy(self.bucket_products, json.dumps(product_policy))
         except Exception as e:
             # Log but don't fail if policy setting fails
             print(f"Warning: Could not set public policy for buckets: {e}")
@@ -100,23 +159,57 @@ class MinioService:
         return self.bucket_products
 
     def presign_put(self, bucket: str, object_key: str, expires_seconds: int = 900) -> str:
-        return self.client.presigned_put_object(
-            bucket, object_key, expires=timedelta(seconds=expires_seconds)
-        )
+        with metrics.timer("storage.presign_put"):
+            return self.client.presigned_put_object(
+                bucket, object_key, expires=timedelta(seconds=expires_seconds)
+            )
 
     def presign_get(self, bucket: str, object_key: str, expires_seconds: int = 3600) -> str:
-        return self.client.presigned_get_object(
-            bucket, object_key, expires=timedelta(seconds=expires_seconds)
-        )
+        with metrics.timer("storage.presign_get"):
+            return self.client.presigned_get_object(
+                bucket, object_key, expires=timedelta(seconds=expires_seconds)
+            )
+
+    def presign_post(self, bucket: str, object_key: str, *, content_type: str, max_size_bytes: int, expires_seconds: int = 900) -> tuple[str, dict[str, str]]:
+        """Presigned POST policy pinning the key, content type and size range.
+
+        Returns (url, form fields); the client posts the fields plus ``file``.
+        Signing is local, like presign_put.
+        """
+        policy = PostPolicy(bucket, datetime.now(timezone.utc) + timedelta(seconds=expires_seconds))
+        policy.add_equals_condition("key", object_key)
+        policy.add_equals_condition("Content-Type", content_type)
+        policy.add_content_length_range_condition(1, max_size_bytes)
+        with metrics.timer("storage.presign_post"):
+            fields = self.client.presigned_post_policy(policy)
+        fields = {**fields, "key": object_key, "Content-Type": content_type}
+        return f"{self.endpoint_url}/{bucket}", fields
 
     def put_object_from_bytes(self, *, bucket: str, object_key: str, data: bytes, content_type: str | None = None) -> None:
-        self.client.put_object(
-            bucket,
-            object_key,
-            data=bytes_to_stream(data),
-            length=len(data),
-            content_type=content_type,
-        )
+        with metrics.timer("storage.put_object"):
+            self.client.put_object(
+                bucket,
+                object_key,
+                data=bytes_to_stream(data),
+                length=len(data),
+                content_type=content_type,
+            )
+
+    def put_object_stream(self, *, bucket: str, object_key: str, stream: BinaryIO, length: int = -1, content_type: str | None = None) -> None:
+        """Upload from a file-like object without buffering it whole.
+
+        With an unknown length the client switches to multipart upload and
+        holds at most one part in memory at a time.
+        """
+        with metrics.timer("storage.put_object"):
+            self.client.put_object(
+                bucket,
+                object_key,
+                data=stream,
+                length=length,
+                part_size=UPLOAD_PART_SIZE,
+                content_type=content_type or "application/octet-stream",
+            )
 
     # ---------- Image helpers ----------
     def pick_image_extension(self, filename: str | None, content_type: Optional[str]) -> str:
@@ -131,41 +224,183 @@ class MinioService:
             return "jpg"
         return ext
 
-    def build_public_url(self, *, bucket: str, object_key: str) -> str:
+    def new_object_key(self, prefix: str, filename: str | None, content_type: Optional[str]) -> str:
+        """Collision-free key under ``prefix``; the client filename only picks the extension."""
+        return f"{prefix}{uuid4().hex}.{self.pick_image_extension(filename, content_type)}"
+
+    def pick_media_extension(self, filename: str | None, content_type: Optional[str]) -> str:
+        """Extension for a thread media upload, from its content type or, when
+        none is given, its filename. Raises ValueError for anything outside
+        MEDIA_EXTENSIONS (the upload is stored with the client's type)."""
+        media_type = (content_type or "").split(";", 1)[0].strip().lower()
+        ext = MEDIA_EXTENSIONS.get(media_type)
+        if not media_type and filename and "." in filename:
+            ext = filename.rsplit(".", 1)[1].lower()
+            ext = "jpg" if ext == "jpeg" else ext
+        if ext not in MEDIA_EXTENSIONS.values():
+            raise ValueError(f"Unsupported media type: {content_type or filename}")
+        return ext
+
+    def new_media_key(self, prefix: str, filename: str | None, content_type: Optional[str]) -> str:
+        """Like ``new_object_key`` for thread media, which may also be gif or video."""
+        return f"{prefix}{uuid4().hex}.{self.pick_media_extension(filename, content_type)}"
+
+    def public_base_url(self) -> str:
         public = os.getenv("PUBLIC_FILE_BASE_URL") or os.getenv("MINIO_PUBLIC_ENDPOINT")
         if not public:
             # Fallback for development - use localhost:9000
             public = "http://localhost:9000"
-        return f"{public}/{bucket}/{object_key}"
+        return public.rstrip("/")
+
+    def build_public_url(self, *, bucket: str, object_key: str) -> str:
+        return f"{self.public_base_url()}/{bucket}/{object_key}"
+
+    def parse_public_url(self, url: str) -> tuple[str, str] | None:
+        """Inverse of build_public_url: return (bucket, object_key) for our own URLs."""
+        base = self.public_base_url() + "/"
+        if not url or not url.startswith(base):
+            return None
+        bucket, _, object_key = url[len(base):].partition("/")
+        if bucket not in (self.bucket_avatars, self.bucket_threads, self.bucket_products) or not object_key:
+            return None
+        return bucket, object_key
+
+    def stat_object(self, *, bucket: str, object_key: str):
+        """HEAD an object; returns its metadata, or None if it does not exist."""
+        with metrics.timer("storage.stat_object"):
+            try:
+                return self.client.stat_object(bucket, object_key)
+            except S3Error as e:
+                if e.code in ("NoSuchKey", "NoSuchObject", "NotFound"):
+                    return None
+                raise
+
+    def remove_objects(self, bucket: str, object_keys: list[str]) -> list:
+        """Bulk delete (the client sends up to 1000 keys per request). Returns per-key errors."""
+        with metrics.timer("storage.remove_objects"):
+            return list(self.client.remove_objects(bucket, (DeleteObject(k) for k in object_keys)))
+
+    def get_object_bytes(self, *, bucket: str, object_key: str) -> bytes:
+        with metrics.timer("storage.get_object"):
+            response = self.client.get_object(bucket, object_key)
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
 
     def save_image_bytes(self, *, kind: Literal["avatar", "post", "product"], prefix: str, original_filename: Optional[str], data: bytes, content_type: Optional[str]) -> str:
-        self.ensure_all_buckets()
+        self.ensure_ready()
         bucket = self.get_bucket_for(kind)
         ext = self.pick_image_extension(original_filename, content_type)
         object_key = f"{prefix}{uuid4().hex}.{ext}"
         self.put_object_from_bytes(bucket=bucket, object_key=object_key, data=data, content_type=content_type)
         return self.build_public_url(bucket=bucket, object_key=object_key)
 
-    def upload_product_uploadfiles(self, sku: str, files: list["UploadFile"]) -> list[str]:  # type: ignore[name-defined]
-        # Convenience for admin product create endpoint
-        urls: list[str] = []
+    def save_image_stream(self, *, kind: Literal["avatar", "post", "product"], prefix: str, original_filename: Optional[str], stream: BinaryIO, length: int, content_type: Optional[str]) -> str:
+        self.ensure_ready()
+        bucket = self.get_bucket_for(kind)
+        ext = self.pick_image_extension(original_filename, content_type)
+        object_key = f"{prefix}{uuid4().hex}.{ext}"
+        self.put_object_stream(bucket=bucket, object_key=object_key, stream=stream, length=length, content_type=content_type)
+        return self.build_public_url(bucket=bucket, object_key=object_key)
+
+    def upload_product_uploadfiles(self, sku: str, files: list["UploadFile"], db: "Session | None" = None) -> list[str]:  # type: ignore[name-defined]
+        # Convenience for admin product create endpoint. Files are streamed
+        # from their spooled temp files and uploaded concurrently; the
+        # returned URLs keep the order of ``files`` so positions are stable.
+        # With a session, uploads are content-addressed and deduplicated.
         if not files:
-            return urls
+            return []
+        if db is not None:
+            return self._upload_deduplicated(db, files)
         prefix = f"products/{sku}/"
-        for f in files:
-            try:
-                data = f.file.read()
-            except Exception:
-                continue
-            url = self.save_image_bytes(
+
+        def upload(f) -> str:
+            f.file.seek(0)
+            size = getattr(f, "size", None)
+            return self.save_image_stream(
                 kind="product",
                 prefix=prefix,
                 original_filename=getattr(f, "filename", None),
-                data=data,
+                stream=f.file,
+                length=size if size is not None else -1,
                 content_type=getattr(f, "content_type", None),
             )
-            urls.append(url)
-        return urls
+
+        if len(files) == 1:
+            return [upload(files[0])]
+        return list(get_upload_executor().map(upload, files))
+
+    def _upload_deduplicated(self, db: "Session", files: list["UploadFile"]) -> list[str]:  # type: ignore[name-defined]
+        from .dedup import Blob, blob_index, content_key, hash_stream
+
+        self.ensure_ready()
+        bucket = self.get_bucket_for("product")
+        # Hash locally first so known content never leaves the API server
+        blobs = []
+        for f in files:
+            sha256, size = hash_stream(f.file)
+            content_type = getattr(f, "content_type", None)
+            ext = self.pick_image_extension(getattr(f, "filename", None), content_type)
+            blobs.append((Blob(sha256=sha256, object_key=content_key(sha256, ext), size_bytes=size, content_type=content_type), f))
+        # Reference and lock the index rows before uploading, so a concurrent purge can't remove what we reuse
+        stored = blob_index.acquire(db, bucket=bucket, blobs=[blob for blob, _ in blobs])
+
+        pending: dict[str, tuple] = {}
+        for blob, f in blobs:
+            object_key, must_upload = stored[blob.sha256]
+            if must_upload:
+                pending.setdefault(object_key, (object_key, f, blob.size_bytes, blob.content_type))
+        metrics.incr("storage.dedup.hit", len(stored) - len(pending))
+
+        def upload(job) -> None:
+            object_key, f, size, content_type = job
+            self.put_object_stream(bucket=bucket, object_key=object_key, stream=f.file, length=size, content_type=content_type)
+
+        if pending:
+            metrics.incr("storage.dedup.miss", len(pending))
+            list(get_upload_executor().map(upload, pending.values()))
+        return [self.build_public_url(bucket=bucket, object_key=stored[blob.sha256][0]) for blob, _ in blobs]
+
+
+def build_http_client() -> urllib3.PoolManager:
+    """HTTP pool shared by every storage call in this process.
+
+    Sized for concurrent uploads from the request threadpool, with short
+    connect timeouts and bounded retries with backoff on transient errors.
+    """
+    return urllib3.PoolManager(
+        num_pools=4,
+        maxsize=int(os.getenv("MINIO_HTTP_POOL_SIZE", "32")),
+        block=False,
+        timeout=urllib3.Timeout(
+            connect=float(os.getenv("MINIO_CONNECT_TIMEOUT", "3")),
+            read=float(os.getenv("MINIO_READ_TIMEOUT", "60")),
+        ),
+        retries=urllib3.Retry(
+            total=int(os.getenv("MINIO_MAX_RETRIES", "3")),
+            backoff_factor=float(os.getenv("MINIO_RETRY_BACKOFF", "0.2")),
+            status_forcelist=[500, 502, 503, 504],
+        ),
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.getenv("SSL_CERT_FILE") or certifi.where(),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_upload_executor() -> ThreadPoolExecutor:
+    """Bounded pool for concurrent uploads; shares the client's HTTP pool."""
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("MINIO_UPLOAD_CONCURRENCY", "4")),
+        thread_name_prefix="storage-upload",
+    )
+
+
+@lru_cache(maxsize=1)
+def get_minio_service() -> MinioService:
+    """Process-wide MinioService; also usable as a FastAPI dependency."""
+    return MinioService()
 
 
 def bytes_to_stream(data: bytes):
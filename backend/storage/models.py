@@ -0,0 +1,32 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+
+from database import Base
+
+
+class StoredBlob(Base):
+    """Content-addressed object in a storage bucket.
+
+    One row per distinct (bucket, sha256). ``ref_count`` counts the rows
+    (product images, media) that point at the object; it may only be
+    removed from storage once the count drops to zero.
+    """
+
+    __tablename__ = "storage_blobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    bucket = Column(String(63), nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    object_key = Column(String(512), nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    content_type = Column(String(100), nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("bucket", "sha256", name="uq_storage_blob_hash"),
+        UniqueConstraint("bucket", "object_key", name="uq_storage_blob_key"),
+    )
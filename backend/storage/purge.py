@@ -0,0 +1,147 @@
+"""
+Background removal of storage objects whose rows were deleted.
+
+Deleting a thread, product or user only touches the database inside the
+request. The handler collects the affected objects first (originals plus
+their derivatives), commits the delete, then hands the keys to the purge
+queue; a worker thread drains it and deletes them with batched
+``remove_objects`` calls per bucket.
+
+Content-addressed product images are shared between rows, so they are
+released through the blob index in the same transaction as the delete
+and only queued once no reference is left; the worker re-checks the count
+under the index row's lock before removing them. Anything lost here (a crash
+with keys still queued, a failed batch) is an orphan that ``storage.gc``
+picks up later.
+"""
+
+import os
+import queue
+import threading
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from api.metrics import metrics
+from .dedup import blob_index, content_sha
+from .minio_service import get_minio_service
+
+
+CAS_PREFIX = "cas/"
+
+# Queued item that tells the worker to exit
+_STOP = object()
+
+
+class PurgeQueue:
+    def __init__(self, *, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+
+    def release(self, db: Session, assets: Iterable[tuple[Optional[str], Optional[list]]]) -> list[tuple[str, str]]:
+        """Resolve (url, derivatives) pairs of rows about to be deleted into
+        the (bucket, object_key) pairs that may be removed once the delete
+        commits. Does not commit.
+        """
+        storage = get_minio_service()
+        objects: dict[tuple[str, str], None] = {}
+        for url, derivatives in assets:
+            located = storage.parse_public_url(url) if url else None
+            if located is None:
+                continue
+            bucket, object_key = located
+            if object_key.startswith(CAS_PREFIX):
+                remaining = blob_index.release(db, bucket=bucket, object_key=object_key)
+                if remaining:
+                    # Still referenced by another row: keep it and its derivatives
+                    continue
+            objects[located] = None
+            for d in derivatives or []:
+                derived = storage.parse_public_url(d.get("url", ""))
+                if derived is not None:
+                    objects[derived] = None
+        return list(objects)
+
+    def enqueue(self, objects: list[tuple[str, str]]) -> None:
+        if not objects:
+            return
+        self._ensure_worker()
+        for obj in objects:
+            self._queue.put(obj)
+        metrics.incr("storage.purge.enqueued", len(objects))
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the worker after it has drained what is already queued."""
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(_STOP)
+            worker.join(timeout)
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="storage-purge", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._purge(batch)
+            if stop:
+                return
+
+    def _purge(self, batch: list[tuple[str, str]]) -> None:
+        by_bucket: dict[str, list[str]] = {}
+        for bucket, object_key in batch:
+            by_bucket.setdefault(bucket, []).append(object_key)
+        for bucket, keys in by_bucket.items():
+            try:
+                self._purge_bucket(bucket, keys)
+            except Exception as e:
+                metrics.incr("storage.purge.failed", len(keys))
+                print(f"Warning: storage purge failed for {bucket}: {e}")
+
+    def _purge_bucket(self, bucket: str, keys: list[str]) -> None:
+        from database import SessionLocal
+
+        storage = get_minio_service()
+        cas_keys = [k for k in keys if k.startswith(CAS_PREFIX)]
+        with SessionLocal() as db:
+            # Identical bytes may have been uploaded again since the delete. The
+            # index rows stay locked until the removal is recorded, so an
+            # upload can't start reusing one of these objects meanwhile.
+            counts = blob_index.lock_for_removal(db, bucket=bucket, object_keys=cas_keys)
+            # CAS keys without a row were already removed (or never indexed); the sweeper owns those
+            keys = [k for k in keys if not k.startswith(CAS_PREFIX) or counts.get(k, 1) <= 0]
+            if not keys:
+                return
+            with metrics.timer("storage.purge.batch"):
+                errors = storage.remove_objects(bucket, keys)
+            failed = {e.name for e in errors}
+            # Keep the row while any of its objects (original or derivative) is left
+            kept = {content_sha(k) for k in failed}
+            blob_index.forget(db, bucket=bucket, object_keys=[k for k in keys if k in counts and content_sha(k) not in kept])
+            db.commit()
+        metrics.incr("storage.purge.removed", len(keys) - len(failed))
+        if errors:
+            metrics.incr("storage.purge.failed", len(errors))
+            print(f"Warning: could not purge {len(errors)} objects from {bucket}: {errors[0]}")
+
+
+purge_queue = PurgeQueue(batch_size=int(os.getenv("STORAGE_PURGE_BATCH_SIZE", "500")))
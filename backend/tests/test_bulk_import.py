@@ -0,0 +1,62 @@
+import base64
+
+import pytest
+from sqlalchemy import select
+
+from marketplace.bulk_import import CatalogImporter, ImageFetcher, ImportReport, parse_record, public_address
+from marketplace.models import ProductVariant
+from marketplace.service import MarketplaceService
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "10.1.2.3", "192.168.0.10", "169.254.169.254", "100.64.0.1", "0.0.0.0", "224.0.0.1", "::1", "fe80::1", "::ffff:127.0.0.1"])
+def test_internal_addresses_are_refused(host):
+    with pytest.raises(ValueError, match="internal address"):
+        public_address(host, 80)
+
+
+def test_public_addresses_are_returned():
+    assert public_address("93.184.216.34", 443) == "93.184.216.34"
+
+
+def test_fetcher_refuses_internal_hosts_before_connecting():
+    fetcher = ImageFetcher(concurrency=1, max_bytes=1024)
+    try:
+        error = fetcher._fetch("http://169.254.169.254/latest/meta-data/")
+    finally:
+        fetcher.shutdown()
+    assert error.startswith("fetch failed") and "internal address" in error
+
+
+def test_restock_below_held_is_reported_and_skipped(db, make_product):
+    product = make_product(stock=(("M", "black", 5), ("L", "black", 5)))
+    held_id = next(v.id for v in product.variants if v.size == "M")
+    MarketplaceService().create_order(db, user_id=None, items=[(product.id, held_id, 3)])
+
+    row = parse_record(7, {"sku": product.sku, "name": "Plain Tee", "gender": "men", "price_cents": "99900", "sizes": "M|L", "colors": "black", "stock": "2"})
+    report = ImportReport()
+    fetcher = ImageFetcher(concurrency=1, max_bytes=1024)
+    try:
+        CatalogImporter()._import_batch(db, [row], fetcher, report)
+    finally:
+        fetcher.shutdown()
+
+    stock = dict(db.execute(select(ProductVariant.size, ProductVariant.stock_quantity)).all())
+    assert stock == {"M": 5, "L": 2}
+    assert (report.variants_restocked, report.variants_below_held, report.rows_failed) == (1, 1, 0)
+    assert report.errors == [{"line": 7, "sku": product.sku, "error": "stock 2 for M/black is below held quantity (3)"}]
+
+
+def test_admin_stock_update_below_held_is_rejected(db, client, make_product, monkeypatch):
+    monkeypatch.setenv("ADMIN_USERNAME", "admin")
+    monkeypatch.setenv("ADMIN_PASSWORD", "secret")
+    client.cookies.set("admin_token", base64.b64encode(b"admin:secret").decode())
+    product = make_product(stock=(("M", "black", 5),))
+    variant_id = product.variants[0].id
+    MarketplaceService().create_order(db, user_id=None, items=[(product.id, variant_id, 3)])
+    url = f"/marketplace/admin/products/{product.id}/variants/{variant_id}/stock"
+
+    assert client.put(url, params={"stock_quantity": 2}).status_code == 409
+    assert db.get(ProductVariant, variant_id).stock_quantity == 5
+    assert client.put(url, params={"stock_quantity": 3}).status_code == 200
+    db.expire_all()
+    assert db.get(ProductVariant, variant_id).stock_quantity == 3
@@ -0,0 +1,40 @@
+import asyncio
+
+from sqlalchemy import select
+
+from marketplace.bulk_update import BulkUpdater, Change
+from marketplace.models import Product, ProductVariant
+from marketplace.service import MarketplaceService
+
+
+def test_stock_below_held_rejects_the_whole_line(db, make_product):
+    product = make_product(price_cents=99900, stock=(("M", "black", 5),))
+    other = make_product(price_cents=99900, stock=(("L", "white", 5),))
+    variant_id, other_variant_id = product.variants[0].id, other.variants[0].id
+    MarketplaceService().create_order(db, user_id=None, items=[(product.id, variant_id, 3)])
+
+    results = BulkUpdater(batch_size=100, max_line_bytes=1024).apply(db, [
+        Change(line=1, variant_id=variant_id, stock_quantity=2, price_cents=79900),
+        Change(line=2, variant_id=other_variant_id, stock_quantity=2, price_cents=79900),
+    ])
+    db.commit()
+
+    assert results == [(1, "invalid", "below held quantity"), (2, "updated", None)]
+    prices = dict(db.execute(select(Product.id, Product.price_cents)).all())
+    stock = dict(db.execute(select(ProductVariant.id, ProductVariant.stock_quantity)).all())
+    assert (prices[product.id], stock[variant_id]) == (99900, 5)
+    assert (prices[other.id], stock[other_variant_id]) == (79900, 2)
+
+
+def test_overlong_lines_are_reported_and_skipped():
+    from marketplace.bulk_update import _lines
+
+    async def chunks():
+        yield b'{"a": 1}\n' + b"x" * 10
+        yield b"y" * 10
+        yield b'z\n{"b": 2}\n'
+
+    async def collect():
+        return [item async for item in _lines(chunks(), 16)]
+
+    assert asyncio.run(collect()) == [(1, b'{"a": 1}'), (2, None), (3, b'{"b": 2}')]
@@ -0,0 +1,62 @@
+import uuid
+
+import pytest
+
+from marketplace.cart import cart_service
+from marketplace.inventory import OutOfStock
+from marketplace.service import MarketplaceService
+
+
+def _variant(payload: dict, variant_id) -> dict:
+    return next(v for v in payload["variants"] if v["id"] == str(variant_id))
+
+
+def test_listings_show_held_stock_without_a_catalog_change(db, client, make_product):
+    product = make_product(stock=(("M", "black", 5),))
+    variant_id = product.variants[0].id
+
+    # Build the snapshot before the order, as a running API would have
+    listed = client.get("/marketplace/marketplace/products").json()
+    assert _variant(listed[0], variant_id)["available_quantity"] == 5
+
+    MarketplaceService().create_order(db, user_id=None, items=[(product.id, variant_id, 2)])
+
+    for items in (
+        client.get("/marketplace/marketplace/products").json(),
+        client.get("/marketplace/marketplace/products/browse").json()["items"],
+    ):
+        variant = _variant(items[0], variant_id)
+        assert variant["stock_quantity"] == 5
+        assert variant["available_quantity"] == 3
+
+
+def test_listings_reload_only_stock_and_only_when_it_moved(db, client, make_product, count_statements):
+    product = make_product(stock=(("M", "black", 5),))
+    client.get("/marketplace/marketplace/products")
+
+    with count_statements() as statements:
+        client.get("/marketplace/marketplace/products")
+        client.get("/marketplace/marketplace/products/browse")
+    assert statements == []
+
+    MarketplaceService().create_order(db, user_id=None, items=[(product.id, product.variants[0].id, 1)])
+    with count_statements() as statements:
+        client.get("/marketplace/marketplace/products")
+        client.get("/marketplace/marketplace/products/browse")
+    # The version check and the stock map, no catalog rebuild
+    assert len(statements) == 2
+
+
+def test_cart_follows_availability(db, make_product):
+    product = make_product(stock=(("M", "black", 5),))
+    variant_id = product.variants[0].id
+    user_id = uuid.uuid4()
+    cart = cart_service.set_item(db, user_id=user_id, product_id=product.id, variant_id=variant_id, quantity=1)
+    assert cart.lines[0].available_quantity == 5
+
+    MarketplaceService().create_order(db, user_id=None, items=[(product.id, variant_id, 4)])
+
+    assert cart_service.get(db, user_id=user_id).lines[0].available_quantity == 1
+    with pytest.raises(OutOfStock):
+        cart_service.set_item(db, user_id=user_id, product_id=product.id, variant_id=variant_id, quantity=2)
+    cart_service.clear(user_id=user_id)
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from marketplace.payments import FakeProvider, PaymentClient, PaymentProviderBusy, PaymentProviderError, payment_client
+from marketplace.service import MarketplaceService
+
+CHECKOUT = {"order_id": "o-1", "line_items": [], "success_url": "http://shop/ok", "cancel_url": "http://shop/cancel"}
+
+
+def _client(provider: FakeProvider, *, max_pending: int, timeout: float) -> PaymentClient:
+    return PaymentClient(max_workers=2, max_pending=max_pending, timeout=timeout, provider=provider)
+
+
+def test_repeated_idempotency_key_returns_the_same_session():
+    client = _client(FakeProvider(), max_pending=2, timeout=1)
+
+    async def twice():
+        return [await client.create_checkout_session(**CHECKOUT, idempotency_key="k") for _ in range(2)]
+
+    try:
+        first, second = asyncio.run(twice())
+    finally:
+        client.shutdown()
+    assert first == second
+    assert client.provider.calls == 2
+
+
+def test_timed_out_call_keeps_its_slot_until_it_finishes():
+    provider = FakeProvider(latency=0.3)
+    client = _client(provider, max_pending=1, timeout=0.05)
+
+    async def scenario():
+        concurrent = await asyncio.gather(
+            client.create_checkout_session(**CHECKOUT, idempotency_key="a"),
+            client.create_checkout_session(**CHECKOUT, idempotency_key="b"),
+            return_exceptions=True,
+        )
+        # The first call is still running on the provider, so there is no slot yet
+        with pytest.raises(PaymentProviderBusy):
+            await client.create_checkout_session(**CHECKOUT, idempotency_key="c")
+        # Past the provider's latency the slot is free again
+        await asyncio.sleep(0.4)
+        client.timeout = 1
+        return concurrent, await client.create_checkout_session(**CHECKOUT, idempotency_key="d")
+
+    try:
+        concurrent, session = asyncio.run(scenario())
+    finally:
+        client.shutdown()
+    assert sorted(type(r).__name__ for r in concurrent) == ["PaymentProviderBusy", "PaymentProviderError"]
+    assert "timed out" in str(next(r for r in concurrent if isinstance(r, PaymentProviderError)))
+    assert session.id.startswith("cs_fake_")
+    assert provider.calls == 2
+
+
+def test_start_checkout_reuses_the_open_session(db, make_product, monkeypatch):
+    from community.models.user import User
+
+    provider = FakeProvider()
+    monkeypatch.setattr(payment_client, "_provider", provider)
+    user = User(username="buyer")
+    db.add(user)
+    db.commit()
+    product = make_product(stock=(("M", "black", 5),))
+    order = MarketplaceService().create_order(db, user_id=user.id, items=[(product.id, product.variants[0].id, 1)])
+
+    async def checkout_twice():
+        service = MarketplaceService()
+        return [await service.start_checkout(db, order_id=order.id, user_id=user.id, public_url="http://shop") for _ in range(2)]
+
+    first, second = asyncio.run(checkout_twice())
+
+    assert first == second
+    assert provider.calls == 1
+    db.refresh(order)
+    assert (order.payment_provider, order.checkout_url) == ("fake", first)
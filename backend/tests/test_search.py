@@ -0,0 +1,82 @@
+import uuid
+
+import pytest
+from sqlalchemy import text, update
+
+from marketplace.models import Product, ProductTag, ProductTagLink
+from marketplace.pagination import InvalidCursor
+from marketplace.search import decode_cursor, encode_cursor, search_products
+
+
+def test_cursor_round_trip():
+    product_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(0.1234567890123, product_id)) == (0.1234567890123, product_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(1.0, uuid.uuid4())[:-4]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def _names(products) -> list[str]:
+    return [p.name for p in products]
+
+
+def test_name_matches_outrank_description_matches(db, make_product):
+    make_product("Plain Hoodie", description="Pairs well with a black tee")
+    make_product("Black Tee")
+    make_product("Denim Jacket")
+
+    products, next_cursor = search_products(db, query="black tee", limit=10)
+
+    assert _names(products) == ["Black Tee", "Plain Hoodie"]
+    assert next_cursor is None
+
+
+def test_misspelled_name_still_matches(db, make_product):
+    make_product("Black Tee")
+    make_product("Denim Jacket")
+
+    products, _ = search_products(db, query="blak tee", limit=10)
+
+    assert _names(products) == ["Black Tee"]
+
+
+def test_cursor_pages_continue_the_ranking(db, make_product):
+    # Same words everywhere, so most scores tie and the id decides
+    for i in range(7):
+        make_product(f"Black Tee {i}")
+    make_product("Black Tee")
+    make_product("Relaxed Hoodie", description="Goes with any black tee")
+
+    everything, _ = search_products(db, query="black tee", limit=100)
+    paged, cursor = search_products(db, query="black tee", limit=2)
+    pages = 1
+    while cursor:
+        page, cursor = search_products(db, query="black tee", limit=2, cursor=cursor)
+        paged += page
+        pages += 1
+
+    assert len(everything) == 9
+    assert [p.id for p in paged] == [p.id for p in everything]
+    assert pages == 5
+    assert everything[0].name == "Black Tee"
+    assert everything[-1].name == "Relaxed Hoodie"
+
+
+def test_text_edits_reindex_but_price_updates_do_not_fire_the_trigger(db, make_product):
+    product = make_product("Plain Hoodie")
+    product.name = "Linen Overshirt"
+    db.add(ProductTagLink(product_id=product.id, tag=ProductTag(name="festival")))
+    db.commit()
+    assert _names(search_products(db, query="linen overshirt", limit=10)[0]) == ["Linen Overshirt"]
+    assert _names(search_products(db, query="festival", limit=10)[0]) == ["Linen Overshirt"]
+
+    # A trigger that fired would replace this marker with the computed vector
+    db.execute(text("ALTER TABLE shop_products DISABLE TRIGGER shop_products_search_vector_trg"))
+    db.execute(update(Product).values(search_vector=text("'marker'::tsvector")))
+    db.execute(text("ALTER TABLE shop_products ENABLE TRIGGER shop_products_search_vector_trg"))
+    db.execute(update(Product).values(price_cents=Product.price_cents + 100, updated_at=text("now()")))
+    assert db.execute(text("SELECT search_vector::text FROM shop_products")).scalar_one() == "'marker'"
+    db.rollback()
@@ -0,0 +1,41 @@
+from sqlalchemy import select
+
+from marketplace.catalog import product_out
+from marketplace.models import Collection, Product, ProductCollectionLink, ProductTag, ProductTagLink
+from marketplace.schemas import ProductOut
+from marketplace.service import MarketplaceService, catalog_loaders
+
+
+def _add_products(db, make_product, n: int) -> None:
+    tag, collection = ProductTag(name=f"tag-{n}"), Collection(name=f"collection-{n}")
+    db.add_all([tag, collection])
+    for i in range(n):
+        product = make_product(f"Tee {n}-{i}", stock=(("S", "black", 1), ("M", "white", 2)), images=2)
+        db.add_all([ProductTagLink(product_id=product.id, tag=tag), ProductCollectionLink(product_id=product.id, collection=collection)])
+    db.commit()
+
+
+def _listing_statements(db, count_statements) -> int:
+    db.expunge_all()
+    with count_statements() as statements:
+        products = db.execute(select(Product).options(*catalog_loaders())).scalars().all()
+        [ProductOut.model_validate(product_out(p)) for p in products]
+    return len(statements)
+
+
+def test_catalog_loaders_use_a_fixed_number_of_queries(db, make_product, count_statements):
+    _add_products(db, make_product, 2)
+    few = _listing_statements(db, count_statements)
+    _add_products(db, make_product, 20)
+    many = _listing_statements(db, count_statements)
+    # products, images, variants, tag links + tags, collection links + collections
+    assert few == many == 7
+
+
+def test_product_detail_uses_a_fixed_number_of_queries(db, make_product, count_statements):
+    _add_products(db, make_product, 1)
+    product_id = db.execute(select(Product.id)).scalar_one()
+    db.expunge_all()
+    with count_statements() as statements:
+        ProductOut.model_validate(product_out(MarketplaceService().get_product(db, product_id=product_id)))
+    assert len(statements) == 7
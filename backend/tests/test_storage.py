@@ -0,0 +1,33 @@
+import pytest
+
+from storage.minio_service import MinioService
+
+
+@pytest.fixture
+def storage():
+    # Key helpers don't talk to MinIO
+    return MinioService.__new__(MinioService)
+
+
+@pytest.mark.parametrize("filename, content_type, ext", [
+    ("party.gif", "image/gif", "gif"),
+    ("clip.mov", "video/quicktime", "mov"),
+    ("clip.bin", "video/mp4", "mp4"),
+    ("photo.JPEG", "", "jpg"),
+    ("photo.webp", None, "webp"),
+    ("photo", "image/png; charset=binary", "png"),
+])
+def test_media_keys_keep_the_uploaded_type(storage, filename, content_type, ext):
+    key = storage.new_media_key("uploads/", filename, content_type)
+    assert key.startswith("uploads/") and key.endswith(f".{ext}")
+
+
+@pytest.mark.parametrize("filename, content_type", [
+    ("page.html", "text/html"),
+    ("photo.jpg", "text/html"),
+    ("icon.svg", "image/svg+xml"),
+    ("notes", None),
+])
+def test_unsupported_media_is_rejected(storage, filename, content_type):
+    with pytest.raises(ValueError):
+        storage.new_media_key("uploads/", filename, content_type)
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from marketplace.models import PaymentEvent, ProductSalesStats, ProductVariant
+from marketplace.service import MarketplaceService
+from marketplace.webhooks import InvalidWebhook, PaymentEvents, parse_event, sign_payload
+
+SECRET = "whsec_test"
+
+
+def _event(event_id: str, event_type: str, order_id, obj: dict) -> dict:
+    return {"id": event_id, "type": event_type, "data": {"object": {**obj, "metadata": {"order_id": str(order_id)}}}}
+
+
+def test_signed_payload_is_parsed():
+    payload = json.dumps({"id": "evt_1", "type": "payment_intent.succeeded"}).encode()
+    assert parse_event(payload, sign_payload(payload, SECRET), SECRET)["id"] == "evt_1"
+
+
+def test_payload_signed_with_another_secret_is_rejected():
+    payload = json.dumps({"id": "evt_1", "type": "payment_intent.succeeded"}).encode()
+    with pytest.raises(InvalidWebhook):
+        parse_event(payload, sign_payload(payload, "whsec_other"), SECRET)
+
+
+def test_unsigned_payload_is_rejected_when_a_secret_is_set():
+    payload = json.dumps({"id": "evt_1", "type": "payment_intent.succeeded"}).encode()
+    with pytest.raises(InvalidWebhook):
+        parse_event(payload, None, SECRET)
+
+
+def test_unsigned_payload_is_accepted_without_a_secret():
+    payload = json.dumps({"id": "evt_1", "type": "payment_intent.succeeded"}).encode()
+    assert parse_event(payload, None, None)["type"] == "payment_intent.succeeded"
+
+
+def test_redelivered_and_unhandled_events_are_not_recorded_twice(db):
+    events = PaymentEvents(batch_size=10, max_attempts=3)
+    event = {"id": "evt_1", "type": "payment_intent.succeeded", "data": {"object": {}}}
+
+    assert events.record(db, event) is True
+    assert events.record(db, event) is False
+    assert events.record(db, {"id": "evt_2", "type": "charge.refunded"}) is False
+    assert db.query(PaymentEvent).count() == 1
+
+
+def test_both_success_events_pay_the_order_once(db, make_product):
+    product = make_product(price_cents=99900, stock=(("M", "black", 5),))
+    variant_id = product.variants[0].id
+    order = MarketplaceService().create_order(db, user_id=None, items=[(product.id, variant_id, 2)])
+    events = PaymentEvents(batch_size=10, max_attempts=3)
+    events.record(db, _event("evt_session", "checkout.session.completed", order.id, {"id": "cs_1", "payment_intent": "pi_1"}))
+    events.record(db, _event("evt_intent", "payment_intent.succeeded", order.id, {"id": "pi_1"}))
+
+    assert events.process_pending(db) == 2
+    assert events.process_pending(db) == 0
+
+    db.expire_all()
+    assert (order.status, order.payment_id) == ("paid", "pi_1")
+    variant = db.get(ProductVariant, variant_id)
+    assert (variant.stock_quantity, variant.held_quantity) == (3, 0)
+    stats = db.get(ProductSalesStats, product.id)
+    assert (stats.units_sold, stats.revenue_cents) == (2, 199800)
+    assert db.query(PaymentEvent).filter(PaymentEvent.processed_at.is_(None)).count() == 0
@@ -29,11 +29,13 @@ export const CommunityAPI = {
   presignMedia: (data: PresignRequest) => api.post(`/community/media/presign`, data).then((r) => r.data),
   attachMedia: (data: { thread_id: string; object_key: string; media_type: string; alt_text?: string | null }) => api.post(`/community/media/attach`, data).then((r) => r.data),
   uploadAvatar: async (file: File) => {
-    // 1) Presign upload for avatar
-    const form = new FormData();
-    form.append("file", file);
+    // 1) Presign upload for avatar (metadata only; the file goes straight to storage)
     const presign = await api
-      .post(`/community/profiles/me/avatar/presign`, form, { headers: { "Content-Type": "multipart/form-data" } })
+      .post(`/community/profiles/me/avatar/presign`, {
+        filename: file.name,
+        content_type: file.type || "image/jpeg",
+        size_bytes: file.size,
+      })
       .then((r) => r.data as { url: string; object_key: string });
 
     // 2) Upload the file to storage using the presigned URL
@@ -44,15 +46,9 @@ export const CommunityAPI = {
       // Remove Content-Type header - presigned URLs are pre-signed with specific headers
     });
 
-    // 3) Attach the uploaded object to the user's profile (backend expects AttachMediaRequest shape)
-    const attachPayload = {
-      thread_id: "00000000-0000-0000-0000-000000000000", // ignored by backend for avatar attach
-      object_key: presign.object_key,
-      media_type: "image",
-      alt_text: null as string | null,
-    };
+    // 3) Attach the uploaded object to the user's profile (backend verifies it exists)
     return api
-      .post(`/community/profiles/me/avatar/attach`, attachPayload)
+      .post(`/community/profiles/me/avatar/attach`, { object_key: presign.object_key })
       .then((r) => r.data as { avatar_url: string });
   },
 };